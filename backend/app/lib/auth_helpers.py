@@ -1,6 +1,25 @@
+import os
+import threading
 from app.lib.supabase import supabase
 from datetime import datetime
 
+# User ids whose public.users row is known to exist, so ensure_user_exists can skip
+# its lookup. Filled by signup, OAuth and the first check. The app never deletes
+# users rows, so entries don't go stale; the set is simply cleared when it reaches
+# KNOWN_USERS_MAX to bound memory.
+KNOWN_USERS_MAX = int(os.getenv("KNOWN_USERS_MAX", "100000"))
+_known_users: set = set()
+_known_users_lock = threading.Lock()
+
+def is_known_user(user_id: str) -> bool:
+    return user_id in _known_users
+
+def mark_user_known(user_id: str):
+    with _known_users_lock:
+        if len(_known_users) >= KNOWN_USERS_MAX:
+            _known_users.clear()
+        _known_users.add(user_id)
+
 def check_username_availability(username: str) -> bool:
     """Check if username is available"""
     try:
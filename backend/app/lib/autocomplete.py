@@ -0,0 +1,205 @@
+import asyncio
+import bisect
+import heapq
+import logging
+import os
+import re
+import threading
+import unicodedata
+from app.lib.supabase import supabase
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, strip accents and collapse whitespace so "  José  Díaz" matches "jose diaz"."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _WHITESPACE.sub(" ", stripped).strip().lower()
+
+
+class PrefixIndex:
+    """In-memory typeahead index: a sorted array of (normalized key, entry id) pairs.
+
+    A lookup is a binary search to the first key >= prefix followed by a forward scan
+    while keys still start with the prefix. Each entry carries a popularity weight;
+    the best `limit` entries among the first MAX_SCAN prefix matches are returned.
+    All methods are thread-safe.
+    """
+
+    MAX_SCAN = 200
+
+    def __init__(self):
+        self._keys: list = []
+        self._entries: dict = {}
+        self._lock = threading.Lock()
+        self.ready = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def bulk_load(self, items):
+        """Replace the whole index with (entry_id, keys, payload, weight) tuples and mark it ready."""
+        keys = []
+        entries = {}
+        for entry_id, entry_keys, payload, weight in items:
+            normalized = {normalize_text(k) for k in entry_keys if k}
+            normalized.discard("")
+            if not normalized:
+                continue
+            entries[entry_id] = (normalized, payload, weight)
+            keys.extend((k, entry_id) for k in normalized)
+        keys.sort()
+        with self._lock:
+            self._keys = keys
+            self._entries = entries
+            self.ready = True
+
+    def upsert(self, entry_id: str, keys, payload: dict, weight: float = 0):
+        normalized = {normalize_text(k) for k in keys if k}
+        normalized.discard("")
+        with self._lock:
+            self._remove_locked(entry_id)
+            if not normalized:
+                return
+            self._entries[entry_id] = (normalized, payload, weight)
+            for key in normalized:
+                bisect.insort(self._keys, (key, entry_id))
+
+    def remove(self, entry_id: str):
+        with self._lock:
+            self._remove_locked(entry_id)
+
+    def weight(self, entry_id: str) -> float:
+        """Current weight of an entry, 0 if it isn't indexed."""
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            return entry[2] if entry else 0
+
+    def _remove_locked(self, entry_id: str):
+        existing = self._entries.pop(entry_id, None)
+        if not existing:
+            return
+        for key in existing[0]:
+            pos = bisect.bisect_left(self._keys, (key, entry_id))
+            if pos < len(self._keys) and self._keys[pos] == (key, entry_id):
+                del self._keys[pos]
+
+    def search(self, prefix: str, limit: int = 5) -> list:
+        """Return up to `limit` payloads whose keys start with `prefix`, most popular first."""
+        prefix = normalize_text(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            pos = bisect.bisect_left(self._keys, (prefix,))
+            seen = {}
+            while pos < len(self._keys) and len(seen) < self.MAX_SCAN:
+                key, entry_id = self._keys[pos]
+                if not key.startswith(prefix):
+                    break
+                if entry_id not in seen:
+                    # Earlier (shorter / alphabetically closer) keys win ties on weight.
+                    seen[entry_id] = (self._entries[entry_id][2], -len(seen))
+                pos += 1
+            best = heapq.nlargest(limit, seen.items(), key=lambda item: item[1])
+            return [dict(self._entries[entry_id][1]) for entry_id, _ in best]
+
+
+# ==================== USER SUGGESTIONS ====================
+
+USER_FIELDS = "id, username, first_name, last_name, is_active, connections_count, followers_count"
+LOAD_PAGE_SIZE = 1000
+REFRESH_SECONDS = int(os.getenv("SUGGESTIONS_REFRESH_SECONDS", "900"))
+
+user_suggestions = PrefixIndex()
+
+
+def _user_entry(user: dict):
+    first = (user.get("first_name") or "").strip()
+    last = (user.get("last_name") or "").strip()
+    username = user.get("username")
+    full_name = f"{first} {last}".strip()
+    payload = {"type": "user", "text": full_name or username, "username": username}
+    weight = (user.get("connections_count") or 0) + (user.get("followers_count") or 0)
+    return user["id"], [username, full_name, last], payload, weight
+
+
+def index_user(user: dict):
+    """Add or refresh one user in the suggestion index (called from signup and profile writes)."""
+    try:
+        if not user or not user.get("id"):
+            return
+        if user.get("is_active") is False:
+            user_suggestions.remove(user["id"])
+            return
+        user_suggestions.upsert(*_user_entry(user))
+    except Exception as e:
+        logging.warning(f"Failed to index user for suggestions (non-fatal): {e}")
+
+
+def load_user_suggestions():
+    """Rebuild the suggestion index from all active users, paging through the table."""
+    items = []
+    offset = 0
+    while True:
+        page = supabase.table("users").select(USER_FIELDS).eq("is_active", True) \
+            .order("id").range(offset, offset + LOAD_PAGE_SIZE - 1).execute()
+        rows = page.data or []
+        items.extend(_user_entry(u) for u in rows if u.get("username") or u.get("first_name") or u.get("last_name"))
+        if len(rows) < LOAD_PAGE_SIZE:
+            break
+        offset += LOAD_PAGE_SIZE
+    user_suggestions.bulk_load(items)
+
+
+# ==================== SKILL SUGGESTIONS ====================
+# Keyed by the normalized skill string; weight is the number of users with the skill
+# (the skills table, migration 16).
+
+skill_suggestions = PrefixIndex()
+
+
+def _skill_entry(skill: str, user_count: int):
+    return skill, [skill], {"type": "skill", "text": skill, "user_count": user_count}, user_count
+
+
+def count_skill(skill: str, delta: int):
+    """Apply a +1/-1 from add_skill/delete_skill so autocomplete counts track writes."""
+    try:
+        if not skill:
+            return
+        user_count = skill_suggestions.weight(skill) + delta
+        if user_count <= 0:
+            skill_suggestions.remove(skill)
+        else:
+            skill_suggestions.upsert(*_skill_entry(skill, user_count))
+    except Exception as e:
+        logging.warning(f"Failed to update skill suggestions (non-fatal): {e}")
+
+
+def load_skill_suggestions():
+    """Rebuild the skill index from the skills count table."""
+    items = []
+    offset = 0
+    while True:
+        page = supabase.table("skills").select("skill, user_count").gt("user_count", 0) \
+            .order("skill").range(offset, offset + LOAD_PAGE_SIZE - 1).execute()
+        rows = page.data or []
+        items.extend(_skill_entry(r["skill"], r["user_count"]) for r in rows if r.get("skill"))
+        if len(rows) < LOAD_PAGE_SIZE:
+            break
+        offset += LOAD_PAGE_SIZE
+    skill_suggestions.bulk_load(items)
+
+
+async def keep_suggestions_fresh(interval: int = REFRESH_SECONDS):
+    """Build the indexes at startup, then rebuild periodically so other workers' writes converge."""
+    while True:
+        for load in (load_user_suggestions, load_skill_suggestions):
+            try:
+                await asyncio.to_thread(load)
+            except Exception as e:
+                logging.warning(f"Failed to load {load.__name__[5:]} index (non-fatal): {e}")
+        await asyncio.sleep(interval)
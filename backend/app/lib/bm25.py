@@ -0,0 +1,247 @@
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+from array import array
+from collections import Counter, defaultdict
+from app.lib.autocomplete import normalize_text
+
+TOKEN_PATTERN = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its of on or "
+    "that the this to was we were will with you".split()
+)
+
+
+def tokenize(text: str) -> list:
+    """Lowercased, accent-folded word tokens with common English stopwords removed."""
+    return [t for t in TOKEN_PATTERN.findall(normalize_text(text)) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """In-process inverted index with Okapi BM25 scoring.
+
+    Postings are compact parallel arrays per term (uint32 doc numbers, uint16 term
+    frequencies). Documents get an internal doc number on add; updating a document
+    tombstones its old number and appends a new one, and compact() drops tombstones.
+
+    snapshot() writes the index to a single file whose postings are loaded back with
+    mmap (load()), so a restart only parses the JSON header instead of re-tokenizing
+    the corpus. Postings stay backed by the mapped file until a term is next written.
+    """
+
+    MAGIC = b"STBM25\x00\x01"
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.taken_at = None
+        self.ready = False
+        self._lock = threading.RLock()
+        self._keys: list = []
+        self._docnos: dict = {}
+        self._meta: list = []
+        self._lengths = array("I")
+        self._postings: dict = {}
+        self._live_count = 0
+        self._live_length = 0
+        self._mmap = None
+
+    def __len__(self):
+        return self._live_count
+
+    def __contains__(self, key):
+        return key in self._docnos
+
+    @property
+    def dead_ratio(self) -> float:
+        return 1 - self._live_count / len(self._keys) if self._keys else 0.0
+
+    # ==================== WRITES ====================
+
+    def add(self, key: str, text: str, meta: dict = None):
+        """Index (or re-index) a document under `key`. `meta` is returned with search hits."""
+        terms = tokenize(text)
+        with self._lock:
+            self._remove_locked(key)
+            if not terms:
+                return
+            docno = len(self._keys)
+            self._keys.append(key)
+            self._docnos[key] = docno
+            self._meta.append(meta or {})
+            self._lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = [array("I"), array("H")]
+                elif not isinstance(postings[0], array):
+                    # Copy-on-write: detach this term from the snapshot mmap
+                    postings[0] = array("I", postings[0])
+                    postings[1] = array("H", postings[1])
+                postings[0].append(docno)
+                postings[1].append(min(tf, 0xFFFF))
+            self._live_count += 1
+            self._live_length += len(terms)
+
+    def remove(self, key: str):
+        with self._lock:
+            self._remove_locked(key)
+
+    def _remove_locked(self, key: str):
+        docno = self._docnos.pop(key, None)
+        if docno is None:
+            return
+        self._keys[docno] = None
+        self._meta[docno] = None
+        self._live_count -= 1
+        self._live_length -= self._lengths[docno]
+
+    def compact(self):
+        """Renumber live documents and drop tombstoned postings."""
+        with self._lock:
+            remap = {}
+            keys, meta, lengths = [], [], array("I")
+            for docno, key in enumerate(self._keys):
+                if key is None:
+                    continue
+                remap[docno] = len(keys)
+                keys.append(key)
+                meta.append(self._meta[docno])
+                lengths.append(self._lengths[docno])
+            postings = {}
+            for term, (docnos, tfs) in self._postings.items():
+                new_docnos, new_tfs = array("I"), array("H")
+                for docno, tf in zip(docnos, tfs):
+                    new_docno = remap.get(docno)
+                    if new_docno is not None:
+                        new_docnos.append(new_docno)
+                        new_tfs.append(tf)
+                if new_docnos:
+                    postings[term] = [new_docnos, new_tfs]
+            self._keys, self._meta, self._lengths, self._postings = keys, meta, lengths, postings
+            self._docnos = {key: docno for docno, key in enumerate(keys)}
+            self._mmap = None
+
+    # ==================== READS ====================
+
+    def search(self, query: str, limit: int = 20, after=None, predicate=None) -> list:
+        """Return up to `limit` (score, key, meta) hits, best first.
+
+        after:     (score, key) of the last hit of the previous page, for keyset paging
+        predicate: optional filter called with each candidate's meta dict
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            total = self._live_count
+            if not total or not terms:
+                return []
+            avgdl = self._live_length / total
+            k1, b = self.k1, self.b
+            keys, lengths = self._keys, self._lengths
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                docnos, tfs = postings
+                # df includes tombstones until the next compact(); close enough for ranking
+                df = len(docnos)
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                for docno, tf in zip(docnos, tfs):
+                    if keys[docno] is None:
+                        continue
+                    norm = k1 * (1 - b + b * lengths[docno] / avgdl)
+                    scores[docno] += idf * tf * (k1 + 1) / (tf + norm)
+
+            hits = []
+            after = tuple(after) if after else None
+            for docno, score in scores.items():
+                key, meta = keys[docno], self._meta[docno]
+                if after and (score, key) >= after:
+                    continue
+                if predicate and not predicate(meta):
+                    continue
+                hits.append((score, key, meta))
+        return heapq.nlargest(limit, hits, key=lambda hit: (hit[0], hit[1]))
+
+    # ==================== SNAPSHOTS ====================
+
+    def snapshot(self, path: str, taken_at: str = None):
+        """Write a compacted copy of the index to `path` atomically."""
+        if self.dead_ratio > 0:
+            self.compact()
+        with self._lock:
+            terms = {}
+            offset = 0
+            for term, (docnos, _) in self._postings.items():
+                terms[term] = [offset, len(docnos)]
+                offset += len(docnos)
+            header = json.dumps({
+                "byteorder": sys.byteorder,
+                "k1": self.k1,
+                "b": self.b,
+                "taken_at": taken_at,
+                "keys": self._keys,
+                "meta": self._meta,
+                "terms": terms,
+                "postings": offset,
+            }, separators=(",", ":")).encode("utf-8")
+            padding = b"\x00" * (-(len(self.MAGIC) + 8 + len(header)) % 8)
+
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(self.MAGIC)
+                f.write(struct.pack("<Q", len(header) + len(padding)))
+                f.write(header)
+                f.write(padding)
+                f.write(self._lengths.tobytes())
+                for docnos, _ in self._postings.values():
+                    f.write(array("I", docnos).tobytes())
+                for _, tfs in self._postings.values():
+                    f.write(array("H", tfs).tobytes())
+            os.replace(tmp_path, path)
+        self.taken_at = taken_at
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Map a snapshot written by snapshot(). Raises ValueError if the file isn't one."""
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[:len(cls.MAGIC)] != cls.MAGIC:
+            raise ValueError("Not a BM25 snapshot")
+        start = len(cls.MAGIC) + 8
+        (header_size,) = struct.unpack("<Q", mm[len(cls.MAGIC):start])
+        header = json.loads(bytes(mm[start:start + header_size]).rstrip(b"\x00").decode("utf-8"))
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError("Snapshot was written on a machine with a different byte order")
+
+        index = cls(k1=header["k1"], b=header["b"])
+        view = memoryview(mm)
+        pos = start + header_size
+        ndocs = len(header["keys"])
+        index._lengths = array("I", view[pos:pos + 4 * ndocs].cast("I"))
+        pos += 4 * ndocs
+        total = header["postings"]
+        all_docnos = view[pos:pos + 4 * total].cast("I")
+        pos += 4 * total
+        all_tfs = view[pos:pos + 2 * total].cast("H")
+        index._postings = {
+            term: [all_docnos[offset:offset + count], all_tfs[offset:offset + count]]
+            for term, (offset, count) in header["terms"].items()
+        }
+
+        index._keys = header["keys"]
+        index._meta = header["meta"]
+        index._docnos = {key: docno for docno, key in enumerate(index._keys)}
+        index._live_count = ndocs
+        index._live_length = sum(index._lengths)
+        index._mmap = mm
+        index.taken_at = header.get("taken_at")
+        index.ready = True
+        return index
@@ -0,0 +1,60 @@
+import os
+import re
+from typing import Optional
+from app.lib.supabase import supabase
+from app.lib.cache import TTLCache
+
+UUID_PATTERN = re.compile(
+    r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$',
+    re.IGNORECASE
+)
+
+# username -> user id. Only hits are cached (a free username may be claimed at any
+# moment). update_my_profile drops a renamed user's old entry in this process; other
+# workers can keep serving it for up to the TTL.
+username_cache = TTLCache(
+    maxsize=int(os.getenv("USERNAME_CACHE_MAX_ENTRIES", "10000")),
+    ttl=float(os.getenv("USERNAME_CACHE_TTL_SECONDS", "300")),
+    copy_values=False,
+)
+
+
+def is_uuid(value: str) -> bool:
+    return bool(value) and bool(UUID_PATTERN.match(value))
+
+
+def resolve_user_id(identifier: str) -> Optional[str]:
+    """Map a username or user UUID to a user id; None if no user has that username.
+
+    UUIDs are returned as-is without checking that the user exists.
+    """
+    if not identifier:
+        return None
+    if is_uuid(identifier):
+        return identifier
+    user_id = username_cache.get(identifier)
+    if user_id is None:
+        rows = supabase.table("users").select("id").eq("username", identifier).limit(1).execute().data
+        if not rows:
+            return None
+        user_id = rows[0]["id"]
+        username_cache.set(identifier, user_id)
+    return user_id
+
+
+def peek_user_id(identifier: str) -> Optional[str]:
+    """Like resolve_user_id but never queries: the UUID itself, a cached id, or None."""
+    if is_uuid(identifier):
+        return identifier
+    return username_cache.get(identifier)
+
+
+def remember_username(username: str, user_id: str):
+    """Record a mapping learned from a query that already fetched the user row."""
+    if username and user_id:
+        username_cache.set(username, user_id)
+
+
+def forget_username(username: Optional[str]):
+    if username:
+        username_cache.delete(username)
@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Optional
+from fastapi import BackgroundTasks, UploadFile
+from app.lib.supabase import supabase
+from app.lib.profile_cache import invalidate_profile
+
+CHUNK_SIZE = 64 * 1024
+
+# Square WebP sizes for avatars, widths for covers (height follows the aspect ratio)
+AVATAR_SIZES = (64, 128, 256)
+COVER_WIDTHS = (640, 1280)
+WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+
+# A few MB of compressed PNG can declare a huge canvas, so the declared size is
+# checked before any pixels are decoded. 40 MP is about 160 MB decoded as RGBA.
+MAX_IMAGE_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(40_000_000)))
+
+# Stored objects are keyed by a hash of their bytes, so the bytes behind a URL never
+# change and CDNs/browsers may cache them for a year. Storage turns this into
+# Cache-Control: max-age=31536000.
+IMMUTABLE_CACHE_SECONDS = "31536000"
+
+# Decoding and resizing is CPU-bound, so it runs in worker processes rather than
+# on the event loop or in threads (which would still hold the GIL). Workers start
+# from a forkserver, not fork(): the API process is multi-threaded and a forked
+# child can inherit a lock some other thread was holding.
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+async def read_limited(file: UploadFile, max_bytes: int) -> bytes:
+    """Read an upload in chunks, stopping as soon as it exceeds `max_bytes`.
+
+    Starlette spools large multipart parts to disk, so an oversized file is rejected
+    after at most max_bytes + one chunk has been pulled into memory.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise ImageTooLarge()
+    buffer = bytearray()
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise ImageTooLarge()
+    return bytes(buffer)
+
+
+def render_variants(data: bytes, kind: str) -> Dict[int, bytes]:
+    """Decode `data` and return {size: webp bytes}. Runs inside a worker process.
+
+    Raises ValueError if the bytes are not a readable image or declare more than
+    MAX_IMAGE_PIXELS pixels.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            image = Image.open(io.BytesIO(data))
+            # open() only parses the header; nothing has been decoded yet
+            width, height = image.size
+            if width * height > MAX_IMAGE_PIXELS:
+                raise ValueError(f"Image is too large ({width}x{height})")
+            image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+        raise ValueError(f"Could not read image: {e}")
+
+    # Honour camera rotation, keep only the first frame of animations
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+    variants = {}
+    if kind == "avatar":
+        for size in AVATAR_SIZES:
+            resized = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            variants[size] = _encode_webp(resized)
+    else:
+        for width in COVER_WIDTHS:
+            if width >= image.width:
+                resized = image
+            else:
+                resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            variants[width] = _encode_webp(resized)
+    return variants
+
+
+def _encode_webp(image) -> bytes:
+    out = io.BytesIO()
+    image.save(out, "WEBP", quality=WEBP_QUALITY, method=4)
+    return out.getvalue()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("forkserver"))
+    return _pool
+
+
+async def make_variants(data: bytes, kind: str) -> Dict[int, bytes]:
+    """Render WebP variants for an "avatar" or "cover" off the event loop."""
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    try:
+        return await loop.run_in_executor(pool, render_variants, data, kind)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed) and the executor refuses all further work;
+        # replace it so only this upload fails.
+        _discard_pool(pool)
+        raise
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    global _pool
+    if _pool is pool:
+        _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_image_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def content_path(user_id: str, data: bytes, ext: str) -> str:
+    return f"{user_id}/{hashlib.sha256(data).hexdigest()}.{ext}"
+
+
+def variant_path(path: str, size: int) -> str:
+    return f"{path.rsplit('.', 1)[0]}_{size}.webp"
+
+
+def variant_sizes(kind: str):
+    return AVATAR_SIZES if kind == "avatar" else COVER_WIDTHS
+
+
+def put_immutable(storage, path: str, data: bytes, content_type: str) -> bool:
+    """Upload `data` to a content-addressed `path` unless it is already there.
+
+    Returns False when an identical object was already stored (nothing uploaded).
+    Two identical uploads can both pass the exists() check; the upload upserts so the
+    second one rewrites the same bytes instead of failing with "already exists".
+    """
+    if storage.exists(path):
+        return False
+    storage.upload(path, data, {
+        "content-type": content_type, "cache-control": IMMUTABLE_CACHE_SECONDS, "upsert": "true",
+    })
+    return True
+
+
+def has_variants(storage, path: str, kind: str) -> bool:
+    """True if every variant of the image at `path` was already rendered by an earlier upload."""
+    try:
+        return all(storage.exists(variant_path(path, size)) for size in variant_sizes(kind))
+    except Exception:
+        return False
+
+
+def storage_path(url: Optional[str], bucket: str) -> Optional[str]:
+    """The object path behind one of our public Storage URLs, or None for other URLs."""
+    marker = f"/object/public/{bucket}/"
+    if not url or marker not in url:
+        return None
+    return url.split(marker, 1)[1].split("?", 1)[0]
+
+
+def delete_objects(bucket: str, paths: List[str]):
+    """Remove objects no row points at any more. Runs as a background task."""
+    try:
+        supabase.storage.from_(bucket).remove(paths)
+    except Exception as e:
+        logging.warning(f"Failed to remove orphaned {bucket} objects (non-fatal): {e}")
+
+
+def publish_profile_image(
+    user_id: str,
+    kind: str,
+    path: str,
+    variants: Optional[Dict[int, bytes]],
+    background_tasks: BackgroundTasks,
+) -> dict:
+    """Point the user row at the avatar/cover stored at `path`.
+
+    Uploads `variants` (None = they already exist from an identical earlier upload),
+    writes {kind}_url and {kind}_variants ({size: url}) and returns them. The objects
+    of the image being replaced are deleted in the background.
+    """
+    bucket = f"{kind}s"
+    storage = supabase.storage.from_(bucket)
+    for size, data in (variants or {}).items():
+        put_immutable(storage, variant_path(path, size), data, "image/webp")
+
+    sizes = variant_sizes(kind)
+    fields = {
+        f"{kind}_url": storage.get_public_url(path),
+        f"{kind}_variants": {str(size): storage.get_public_url(variant_path(path, size)) for size in sizes},
+    }
+    previous = supabase.table("users").select(f"{kind}_url, {kind}_variants").eq("id", user_id).execute().data
+    supabase.table("users").update(fields).eq("id", user_id).execute()
+    invalidate_profile(user_id)
+
+    if previous:
+        old_urls = [previous[0].get(f"{kind}_url"), *(previous[0].get(f"{kind}_variants") or {}).values()]
+        orphans = orphaned_paths(user_id, bucket, old_urls, [path, *(variant_path(path, size) for size in sizes)])
+        if orphans:
+            background_tasks.add_task(delete_unreferenced, user_id, kind, orphans)
+    return fields
+
+
+def delete_unreferenced(user_id: str, kind: str, paths: List[str]):
+    """Delete the user's old avatar/cover objects unless the row points at them again.
+
+    Runs as a background task. A concurrent upload of the same image may have switched
+    the row back to these (content-addressed) paths since they were picked as orphans.
+    """
+    bucket = f"{kind}s"
+    try:
+        rows = supabase.table("users").select(f"{kind}_url, {kind}_variants").eq("id", user_id).execute().data
+    except Exception as e:
+        logging.warning(f"Skipped removing orphaned {bucket} objects (non-fatal): {e}")
+        return
+    current = {
+        storage_path(url, bucket)
+        for row in rows
+        for url in (row.get(f"{kind}_url"), *(row.get(f"{kind}_variants") or {}).values())
+    }
+    paths = [p for p in paths if p not in current]
+    if paths:
+        delete_objects(bucket, paths)
+
+
+def orphaned_paths(user_id: str, bucket: str, old_urls: Iterable[Optional[str]], current: List[str]) -> List[str]:
+    """Paths of the user's own objects among `old_urls` that are not in `current`."""
+    paths = {storage_path(url, bucket) for url in old_urls}
+    return sorted(p for p in paths if p and p.startswith(f"{user_id}/") and p not in current)
@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+import threading
+from app.lib.cache import TTLCache
+
+# Profile bundles (users row + work_experience + education + skills) keyed by user id.
+# Bundles are read-only once cached, so values aren't copied on every hit.
+profile_cache = TTLCache(
+    maxsize=int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "2048")),
+    ttl=float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "120")),
+    copy_values=False,
+)
+
+# Per-user version, bumped by every profile mutation in this process. A load that
+# started before a bump is not cached, so a slow read can't resurrect stale data.
+# Versions (and the cache) are per process: a write handled by another worker is
+# only seen here once the entry's TTL expires.
+_versions: dict = {}
+_versions_lock = threading.Lock()
+
+
+def make_etag(value) -> str:
+    raw = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """True if an If-None-Match header value matches `etag` (weak comparison)."""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or etag in (c[2:] if c.startswith("W/") else c for c in candidates)
+
+
+def invalidate_profile(user_id: str):
+    """Call after any write to a user's row, work experience, education or skills.
+
+    That includes writes that only touch login- or trigger-maintained columns
+    (last_active_at, connections_count), since they are part of the bundle and its ETag.
+    Only this process's entry is dropped; other workers keep theirs until the TTL.
+    """
+    with _versions_lock:
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+        profile_cache.delete(user_id)
+
+
+def cached_profile_bundle(user_id: str, loader):
+    """Return (bundle, etag) for `user_id`, calling `loader()` on a miss.
+
+    The ETag is a hash of the bundle itself, so every worker derives the same tag
+    for the same data. Returns (None, None) when the loader finds no profile.
+    """
+    with _versions_lock:
+        version = _versions.get(user_id, 0)
+    entry = profile_cache.get(user_id)
+    if entry is not None and entry[2] == version:
+        return entry[0], entry[1]
+
+    bundle = loader()
+    if bundle is None:
+        return None, None
+    etag = make_etag(bundle)
+    with _versions_lock:
+        if _versions.get(user_id, 0) == version:
+            profile_cache.set(user_id, (bundle, etag, version))
+    return bundle, etag
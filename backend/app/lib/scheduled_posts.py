@@ -0,0 +1,39 @@
+import asyncio
+import logging
+import os
+from app.lib.supabase import supabase
+from app.lib.search_backends import on_post_saved
+
+# Scheduled posts are published by the publish_due_posts RPC (migration 21), which
+# claims due rows with SKIP LOCKED, so every API worker can run the loop safely.
+# Set RUN_SCHEDULED_PUBLISHER=false on the web service to leave it to the standalone
+# worker instead:  python -m app.lib.scheduled_posts
+PUBLISH_BATCH_SIZE = int(os.getenv("PUBLISH_BATCH_SIZE", "100"))
+PUBLISH_INTERVAL_SECONDS = float(os.getenv("PUBLISH_INTERVAL_SECONDS", "30"))
+
+
+def publisher_enabled() -> bool:
+    return os.getenv("RUN_SCHEDULED_PUBLISHER", "true").lower() != "false"
+
+
+def publish_due_posts(batch_size: int = PUBLISH_BATCH_SIZE) -> list:
+    """Publish one batch of due scheduled posts and index them; returns the published rows."""
+    posts = supabase.rpc("publish_due_posts", {"batch_size": batch_size}).execute().data or []
+    for post in posts:
+        on_post_saved(post)
+    return posts
+
+
+async def keep_publishing_scheduled_posts(interval: float = PUBLISH_INTERVAL_SECONDS):
+    """Publish due posts every `interval` seconds, draining full batches back to back."""
+    while True:
+        try:
+            while len(await asyncio.to_thread(publish_due_posts)) >= PUBLISH_BATCH_SIZE:
+                pass
+        except Exception as e:
+            logging.warning(f"Failed to publish scheduled posts (non-fatal): {e}")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    asyncio.run(keep_publishing_scheduled_posts())
@@ -0,0 +1,406 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from app.lib.supabase import supabase
+from app.lib.cursors import encode_cursor, decode_cursor
+from app.lib.bm25 import BM25Index, tokenize
+from app.lib.autocomplete import index_user as index_user_suggestion
+from app.lib.tags import index_post_tags
+
+FILTER_SAMPLE = 500  # rows scanned by the ilike fallback for filtered search
+
+USER_RESULT_FIELDS = "id, username, first_name, last_name, avatar_url, headline, current_position, current_company, industry"
+
+
+def is_searchable_post(post: dict) -> bool:
+    return bool(post.get("is_published")) and not post.get("is_draft") and post.get("visibility") == "public"
+
+
+class IlikeSearchBackend:
+    """Unranked substring scan. Works on any schema; also the fallback for the other backends.
+
+    Every backend exposes the same read methods (search_users, search_posts) and write
+    hooks (index_post, remove_post, index_user). Hooks are no-ops for backends that read
+    the database directly.
+    """
+
+    name = "ilike"
+
+    def search_users(self, q: str, limit: int) -> list:
+        search_term = f"%{q}%"
+        results = supabase.table("users").select(USER_RESULT_FIELDS).or_(
+            f"username.ilike.{search_term},first_name.ilike.{search_term},last_name.ilike.{search_term},headline.ilike.{search_term}"
+        ).eq("is_active", True).limit(limit).execute()
+        return results.data or []
+
+    def search_posts(self, q: str, limit: int, cursor: Optional[str] = None):
+        """Return (posts, next_cursor). No ranking, so only the first page is served."""
+        if cursor:
+            return [], None
+        search_term = f"%{q}%"
+        posts = supabase.table("posts").select("*").ilike("content", search_term).eq("is_published", True).eq("is_draft", False).eq("visibility", "public").order("created_at", desc=True).limit(limit).execute().data or []
+        return posts, None
+
+    def search_posts_filtered(self, q: str, limit: int, cursor: Optional[str], filters: dict):
+        """Return (posts, next_cursor, type_counts) for a filtered search.
+
+        filters may hold post_type, author_id, since, until (ISO strings) and has_media.
+        type_counts cover the matches with every filter except post_type. Here they are
+        computed over a bounded sample, and only the first page is served.
+        """
+        if cursor:
+            return [], None, {}
+        has_media = filters.get("has_media")
+        query = supabase.table("posts").select("*" if has_media is None else "*, post_media(id)") \
+            .ilike("content", f"%{q}%").eq("is_published", True).eq("is_draft", False).eq("visibility", "public")
+        if filters.get("author_id"):
+            query = query.eq("author_id", filters["author_id"])
+        if filters.get("since"):
+            query = query.gte("created_at", filters["since"])
+        if filters.get("until"):
+            query = query.lte("created_at", filters["until"])
+        rows = query.order("created_at", desc=True).limit(FILTER_SAMPLE).execute().data or []
+        if has_media is not None:
+            rows = [r for r in rows if bool(r.pop("post_media", None)) == has_media]
+        type_counts = dict(Counter(r["post_type"] for r in rows if r.get("post_type")))
+        if filters.get("post_type"):
+            rows = [r for r in rows if r.get("post_type") == filters["post_type"]]
+        return rows[:limit], None, type_counts
+
+    def index_post(self, post: dict):
+        pass
+
+    def remove_post(self, post_id: str):
+        pass
+
+    def index_user(self, user: dict):
+        pass
+
+    async def run(self):
+        """Background maintenance for the lifetime of the app (nothing to do here)."""
+
+
+class PostgresSearchBackend(IlikeSearchBackend):
+    """Ranked search inside Postgres: FTS for posts (migration 11), pg_trgm for users (migration 12)."""
+
+    name = "postgres"
+
+    def search_users(self, q: str, limit: int) -> list:
+        try:
+            return supabase.rpc("search_users_fuzzy", {"search_query": q, "result_limit": limit}).execute().data or []
+        except Exception as e:
+            print(f"search_users_fuzzy RPC failed, falling back to ilike: {e}")
+            return super().search_users(q, limit)
+
+    def search_posts(self, q: str, limit: int, cursor: Optional[str] = None):
+        params = {"search_query": q, "result_limit": limit}
+        if cursor:
+            params["cursor_rank"], params["cursor_id"] = decode_cursor(cursor, 2)
+        try:
+            posts = supabase.rpc("search_posts_fts", params).execute().data or []
+        except Exception as e:
+            print(f"search_posts_fts RPC failed, falling back to ilike: {e}")
+            return super().search_posts(q, limit, cursor)
+
+        next_cursor = None
+        if len(posts) == limit:
+            last = posts[-1]
+            next_cursor = encode_cursor(last["rank"], last["id"])
+        return posts, next_cursor
+
+    def search_posts_filtered(self, q: str, limit: int, cursor: Optional[str], filters: dict):
+        """Filters and per-type counts in one query (search_posts_filtered RPC, migration 17)."""
+        params = {
+            "search_query": q,
+            "result_limit": limit,
+            "post_type_filter": filters.get("post_type"),
+            "author_filter": filters.get("author_id"),
+            "since_ts": filters.get("since"),
+            "until_ts": filters.get("until"),
+            "has_media": filters.get("has_media"),
+        }
+        if cursor:
+            params["cursor_rank"], params["cursor_id"] = decode_cursor(cursor, 2)
+        try:
+            data = supabase.rpc("search_posts_filtered", params).execute().data or {}
+        except Exception as e:
+            print(f"search_posts_filtered RPC failed, falling back to ilike: {e}")
+            return super().search_posts_filtered(q, limit, cursor, filters)
+
+        posts = data.get("results") or []
+        next_cursor = encode_cursor(posts[-1]["rank"], posts[-1]["id"]) if len(posts) == limit else None
+        return posts, next_cursor, data.get("type_counts") or {}
+
+
+# ==================== IN-PROCESS BM25 ====================
+
+LOAD_PAGE_SIZE = 1000
+SNAPSHOT_DIR = os.getenv("SEARCH_SNAPSHOT_DIR", "")
+SYNC_SECONDS = int(os.getenv("SEARCH_SYNC_SECONDS", "60"))
+SNAPSHOT_EVERY = int(os.getenv("SEARCH_SNAPSHOT_EVERY", "10"))  # sync cycles between snapshots
+SYNC_OVERLAP = timedelta(seconds=30)  # re-read a little before the watermark to cover clock skew
+SNIPPET_WORDS = 30
+FACET_SCAN = 10000  # top hits considered for type_counts
+
+
+def make_snippet(content: str, query: str) -> str:
+    """~SNIPPET_WORDS words around the first query match, matches wrapped in <mark> like ts_headline."""
+    words = (content or "").split()
+    terms = set(tokenize(query))
+    marked = [bool(terms.intersection(tokenize(w))) for w in words]
+    first = marked.index(True) if True in marked else 0
+    start = max(0, min(first - SNIPPET_WORDS // 3, len(words) - SNIPPET_WORDS))
+    window = range(start, min(start + SNIPPET_WORDS, len(words)))
+    return " ".join(f"<mark>{words[i]}</mark>" if marked[i] else words[i] for i in window)
+
+
+def _user_document(user: dict) -> str:
+    # Names count twice so a name match outranks a passing mention in a headline
+    name = f"{user.get('first_name') or ''} {user.get('last_name') or ''}"
+    return " ".join([user.get("username") or "", name, name, user.get("headline") or ""])
+
+
+def _post_meta(post: dict) -> dict:
+    return {"author_id": post.get("author_id"), "post_type": post.get("post_type"), "created_at": post.get("created_at")}
+
+
+class MemorySearchBackend(IlikeSearchBackend):
+    """BM25 over in-process inverted indexes (app.lib.bm25), for deployments without the
+    FTS/trigram migrations or where search load should stay off the database.
+
+    The indexes answer "which ids, in what order"; rows are then read with one
+    `in_("id", ...)` query, which also drops posts deleted or hidden since they were
+    indexed. Writes in this worker update the index immediately via the hooks; run()
+    pulls rows changed by other workers every SEARCH_SYNC_SECONDS and, when
+    SEARCH_SNAPSHOT_DIR is set, snapshots both indexes so a restart maps them back in
+    instead of re-reading every post. Until the first load finishes, searches use ilike.
+    """
+
+    name = "memory"
+
+    def __init__(self, snapshot_dir: str = SNAPSHOT_DIR):
+        self.snapshot_dir = snapshot_dir
+        self.posts = BM25Index()
+        self.users = BM25Index()
+        self.synced_at: Optional[datetime] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.posts.ready and self.users.ready
+
+    # ---------- reads ----------
+
+    def search_users(self, q: str, limit: int) -> list:
+        if not self.ready:
+            return super().search_users(q, limit)
+        hits = self.users.search(q, limit)
+        ids = [key for _, key, _ in hits]
+        if not ids:
+            return []
+        rows = supabase.table("users").select(USER_RESULT_FIELDS + ", is_active").in_("id", ids).execute().data or []
+        by_id = {r["id"]: r for r in rows if r.pop("is_active", True) is not False}
+        return [{**by_id[key], "score": score} for score, key, _ in hits if key in by_id]
+
+    def search_posts(self, q: str, limit: int, cursor: Optional[str] = None):
+        if not self.ready:
+            return super().search_posts(q, limit, cursor)
+        after = decode_cursor(cursor, 2) if cursor else None
+        hits = self.posts.search(q, limit, after=after)
+        if not hits:
+            return [], None
+        rows = supabase.table("posts").select("*").in_("id", [key for _, key, _ in hits]) \
+            .eq("is_published", True).eq("is_draft", False).eq("visibility", "public").execute().data or []
+        by_id = {r["id"]: r for r in rows}
+        posts = [
+            {**by_id[key], "rank": score, "snippet": make_snippet(by_id[key].get("content"), q)}
+            for score, key, _ in hits if key in by_id
+        ]
+        # Page on the index hits, not the hydrated rows, so a stale hit doesn't end paging early
+        next_cursor = encode_cursor(hits[-1][0], hits[-1][1]) if len(hits) == limit else None
+        return posts, next_cursor
+
+    def search_posts_filtered(self, q: str, limit: int, cursor: Optional[str], filters: dict):
+        """post_type / author / date filters run against the index meta; has_media is
+        checked while hydrating, so a page can come back short."""
+        if not self.ready:
+            return super().search_posts_filtered(q, limit, cursor, filters)
+
+        def matches(meta):
+            created_at = meta.get("created_at") or ""
+            return (
+                (not filters.get("author_id") or meta.get("author_id") == filters["author_id"])
+                and (not filters.get("since") or created_at >= filters["since"])
+                and (not filters.get("until") or created_at <= filters["until"])
+            )
+
+        post_type = filters.get("post_type")
+        after = decode_cursor(cursor, 2) if cursor else None
+        hits = self.posts.search(
+            q, limit, after=after,
+            predicate=lambda meta: matches(meta) and (not post_type or meta.get("post_type") == post_type),
+        )
+        type_counts = dict(Counter(
+            meta.get("post_type") for _, _, meta in self.posts.search(q, FACET_SCAN, predicate=matches)
+            if meta.get("post_type")
+        ))
+        if not hits:
+            return [], None, type_counts
+
+        has_media = filters.get("has_media")
+        rows = supabase.table("posts").select("*, post_media(id)").in_("id", [key for _, key, _ in hits]) \
+            .eq("is_published", True).eq("is_draft", False).eq("visibility", "public").execute().data or []
+        by_id = {}
+        for row in rows:
+            if has_media is None or bool(row.get("post_media")) == has_media:
+                row.pop("post_media", None)
+                by_id[row["id"]] = row
+        posts = [
+            {**by_id[key], "rank": score, "snippet": make_snippet(by_id[key].get("content"), q)}
+            for score, key, _ in hits if key in by_id
+        ]
+        next_cursor = encode_cursor(hits[-1][0], hits[-1][1]) if len(hits) == limit else None
+        return posts, next_cursor, type_counts
+
+    # ---------- write hooks ----------
+
+    def index_post(self, post: dict):
+        if not post.get("id"):
+            return
+        if is_searchable_post(post):
+            self.posts.add(post["id"], post.get("content") or "", _post_meta(post))
+        else:
+            self.posts.remove(post["id"])
+
+    def remove_post(self, post_id: str):
+        self.posts.remove(post_id)
+
+    def index_user(self, user: dict):
+        if not user.get("id"):
+            return
+        if user.get("is_active") is False:
+            self.users.remove(user["id"])
+        else:
+            self.users.add(user["id"], _user_document(user))
+
+    # ---------- loading, sync and snapshots ----------
+
+    def _snapshot_path(self, name: str) -> str:
+        return os.path.join(self.snapshot_dir, f"{name}.bm25")
+
+    def _page(self, table: str, fields: str, since: Optional[datetime], since_filter: str):
+        offset = 0
+        while True:
+            query = supabase.table(table).select(fields)
+            if since is not None:
+                query = query.or_(since_filter.format(since=since.isoformat()))
+            rows = query.order("id").range(offset, offset + LOAD_PAGE_SIZE - 1).execute().data or []
+            yield from rows
+            if len(rows) < LOAD_PAGE_SIZE:
+                break
+            offset += LOAD_PAGE_SIZE
+
+    def sync(self, since: Optional[datetime] = None):
+        """Index every post/user changed since `since` (everything when None)."""
+        started = datetime.now(timezone.utc).replace(tzinfo=None)
+        for post in self._page(
+            "posts", "id, author_id, content, post_type, visibility, is_published, is_draft, created_at",
+            since, "created_at.gte.{since},edited_at.gte.{since}",
+        ):
+            self.index_post(post)
+        for user in self._page(
+            "users", "id, username, first_name, last_name, headline, is_active",
+            since, "created_at.gte.{since},updated_at.gte.{since}",
+        ):
+            self.index_user(user)
+        self.synced_at = started - SYNC_OVERLAP
+
+    def load(self):
+        """Map the last snapshot if there is one and catch up from it; otherwise index everything."""
+        since = None
+        if self.snapshot_dir:
+            try:
+                posts = BM25Index.load(self._snapshot_path("posts"))
+                users = BM25Index.load(self._snapshot_path("users"))
+                if posts.taken_at and users.taken_at:
+                    self.posts, self.users = posts, users
+                    since = datetime.fromisoformat(min(posts.taken_at, users.taken_at))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable search snapshot (non-fatal): {e}")
+        self.sync(since)
+        self.posts.ready = self.users.ready = True
+
+    def snapshot(self):
+        if not self.snapshot_dir or self.synced_at is None:
+            return
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        taken_at = self.synced_at.isoformat()
+        self.posts.snapshot(self._snapshot_path("posts"), taken_at)
+        self.users.snapshot(self._snapshot_path("users"), taken_at)
+
+    async def run(self, interval: int = SYNC_SECONDS):
+        cycle = 0
+        while True:
+            try:
+                if not self.ready:
+                    await asyncio.to_thread(self.load)
+                else:
+                    await asyncio.to_thread(self.sync, self.synced_at)
+                if cycle % SNAPSHOT_EVERY == 0:
+                    await asyncio.to_thread(self.snapshot)
+                cycle += 1
+            except Exception as e:
+                logging.warning(f"Failed to refresh in-memory search index (non-fatal): {e}")
+            await asyncio.sleep(interval)
+
+
+SEARCH_BACKENDS = {
+    "ilike": IlikeSearchBackend,
+    "postgres": PostgresSearchBackend,
+    "memory": MemorySearchBackend,
+}
+
+
+def create_search_backend(name: str):
+    backend = SEARCH_BACKENDS.get((name or "").strip().lower())
+    if backend is None:
+        logging.warning(f"Unknown SEARCH_BACKEND {name!r}, using postgres")
+        backend = PostgresSearchBackend
+    return backend()
+
+
+# Selected once per process: SEARCH_BACKEND=postgres (default) | memory | ilike
+search_backend = create_search_backend(os.getenv("SEARCH_BACKEND", "postgres"))
+
+
+# ==================== WRITE HOOKS ====================
+# Route handlers call these after a successful write; every index that mirrors
+# posts or users is updated from here. All of them are non-fatal.
+
+def on_post_saved(post: dict):
+    index_post_tags(post)
+    try:
+        search_backend.index_post(post)
+    except Exception as e:
+        logging.warning(f"Failed to index post {post.get('id')} for search (non-fatal): {e}")
+
+
+def on_post_deleted(post_id: str):
+    try:
+        search_backend.remove_post(post_id)
+    except Exception as e:
+        logging.warning(f"Failed to drop post {post_id} from search (non-fatal): {e}")
+
+
+def on_user_saved(user: dict):
+    if not user or not user.get("id"):
+        return
+    index_user_suggestion(user)
+    try:
+        search_backend.index_user(user)
+    except Exception as e:
+        logging.warning(f"Failed to index user {user.get('id')} for search (non-fatal): {e}")
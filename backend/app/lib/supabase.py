@@ -59,3 +59,9 @@ try:
         )
 except Exception:
     pass  # If manipulation fails, continue with default (will still have HTTP/1.1 postgrest via ClientOptions)
+
+
+def is_missing_rpc(error: Exception) -> bool:
+    """True if a PostgREST error means the called function isn't deployed (migration not applied)."""
+    message = str(error)
+    return "PGRST202" in message or "Could not find the function" in message
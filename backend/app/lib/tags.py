@@ -0,0 +1,42 @@
+import logging
+import re
+from app.lib.supabase import supabase
+
+# "#fundraising", "#AI2026" — must contain a letter so "#1" isn't a topic.
+# The lookbehind skips anchors like "page#section" and "##".
+HASHTAG_PATTERN = re.compile(r"(?<![\w#])#(\w*[^\W\d_]\w*)")
+# "@jane_doe" — same charset as usernames; the lookbehind skips email addresses.
+MENTION_PATTERN = re.compile(r"(?<![\w@])@([A-Za-z0-9_-]{3,30})(?![\w-])")
+
+MAX_TAG_LENGTH = 50
+
+
+def normalize_tag(tag: str) -> str:
+    return tag.strip().lstrip("#@").lower()
+
+
+def extract_tags(content: str):
+    """Return (hashtags, mentions) found in `content`, lowercased and de-duplicated in order."""
+    if not content:
+        return [], []
+    hashtags = [t.lower() for t in HASHTAG_PATTERN.findall(content) if len(t) <= MAX_TAG_LENGTH]
+    mentions = [m.lower() for m in MENTION_PATTERN.findall(content)]
+    return list(dict.fromkeys(hashtags)), list(dict.fromkeys(mentions))
+
+
+def index_post_tags(post: dict):
+    """Sync a post's hashtags/mentions into the post_tags inverted index (migration 14).
+
+    Only public, published posts are indexed; anything else has its tags cleared so a
+    post switched to connections-only or back to draft drops out of topic counts.
+    """
+    try:
+        searchable = post.get("is_published") and not post.get("is_draft") and post.get("visibility") == "public"
+        hashtags, mentions = extract_tags(post.get("content")) if searchable else ([], [])
+        supabase.rpc("sync_post_tags", {
+            "target_post_id": post["id"],
+            "hashtags": hashtags,
+            "mentions": mentions,
+        }).execute()
+    except Exception as e:
+        logging.warning(f"Failed to index tags for post {post.get('id')} (non-fatal): {e}")
@@ -0,0 +1,267 @@
+import asyncio
+import codecs
+import contextlib
+import ipaddress
+import logging
+import os
+import socket
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+import httpcore
+import httpx
+from app.lib.supabase import supabase
+from app.lib.cache import TTLCache
+
+# Link previews are fetched once on the server and stored on post_media, so every
+# client renders the same preview without fetching third-party pages itself.
+UNFURL_TIMEOUT_SECONDS = float(os.getenv("UNFURL_TIMEOUT_SECONDS", "5"))
+UNFURL_MAX_BYTES = int(os.getenv("UNFURL_MAX_BYTES", str(512 * 1024)))  # OpenGraph tags live in <head>
+UNFURL_PER_HOST = int(os.getenv("UNFURL_PER_HOST", "2"))
+UNFURL_MAX_REDIRECTS = 3
+USER_AGENT = "StonetBot/1.0 (+link preview)"
+
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid")
+
+
+def normalize_url(url: str) -> str:
+    """Cache key for a link: lowercase scheme/host, no fragment, default port or tracking params."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    query = urlencode([
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAMS)
+    ])
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address)
+    return not (
+        ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved
+        or ip.is_multicast or ip.is_unspecified
+    )
+
+
+class PublicOnlyBackend(httpcore.AsyncNetworkBackend):
+    """Network backend that resolves each host itself and connects to the address it vetted.
+
+    Checking a hostname and then letting the HTTP client resolve it again leaves a
+    window for DNS rebinding (public answer for the check, 127.0.0.1 or the metadata
+    address for the connection). Vetting here covers redirects too; TLS still uses the
+    original hostname for SNI and certificate checks.
+    """
+
+    def __init__(self, allow_private: bool = False):
+        self.allow_private = allow_private
+        self._backend = httpcore.AnyIOBackend()
+
+    async def resolve(self, host: str, port: int) -> str:
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise httpcore.ConnectError(f"Could not resolve {host}: {e}")
+        addresses = [info[4][0] for info in infos]
+        if not addresses:
+            raise httpcore.ConnectError(f"Could not resolve {host}")
+        if not self.allow_private and not all(is_public_address(a) for a in addresses):
+            raise httpcore.ConnectError(f"Refusing non-public address for {host}")
+        return addresses[0]
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        address = await self.resolve(host, port)
+        return await self._backend.connect_tcp(address, port, timeout, local_address, socket_options)
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        raise httpcore.ConnectError("Unix sockets are not allowed")
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+
+class PublicOnlyTransport(httpx.AsyncHTTPTransport):
+    """httpx transport whose connections go through PublicOnlyBackend."""
+
+    def __init__(self, limits: httpx.Limits, allow_private: bool = False):
+        super().__init__(limits=limits, trust_env=False)
+        # httpx has no public hook for the network backend, so swap in an equivalent pool
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=PublicOnlyBackend(allow_private),
+        )
+
+
+class OpenGraphParser(HTMLParser):
+    """Collects og:/twitter: meta tags, the description and <title> from a page head."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta: Dict[str, str] = {}
+        self.title = ""
+        self.done = False
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "meta":
+            attrs = dict(attrs)
+            key = (attrs.get("property") or attrs.get("name") or "").lower()
+            content = attrs.get("content")
+            if key and content and key not in self.meta:
+                self.meta[key] = content.strip()
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "body":
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        elif tag == "head":
+            self.done = True
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+
+    def preview(self, page_url: str) -> Optional[dict]:
+        meta = self.meta
+        title = meta.get("og:title") or meta.get("twitter:title") or self.title.strip()
+        description = meta.get("og:description") or meta.get("twitter:description") or meta.get("description")
+        image = meta.get("og:image") or meta.get("og:image:url") or meta.get("twitter:image")
+        if not (title or description or image):
+            return None
+        return {
+            "url": meta.get("og:url") or page_url,
+            "title": title[:300] if title else None,
+            "description": description[:1000] if description else None,
+            "image": urljoin(page_url, image) if image else None,
+            "site_name": meta.get("og:site_name"),
+        }
+
+
+class Unfurler:
+    """Fetches OpenGraph previews through one shared async HTTP client.
+
+    Requests are bounded by a timeout, a byte cap and a per-host concurrency limit,
+    and results (including failures) are cached by normalized URL. Connections to
+    private, loopback, link-local, multicast or unspecified addresses are refused
+    unless allow_private is set (see PublicOnlyBackend).
+    """
+
+    def __init__(self, allow_private: bool = False, cache: Optional[TTLCache] = None):
+        self.allow_private = allow_private
+        self.cache = cache or TTLCache(
+            maxsize=int(os.getenv("UNFURL_CACHE_MAX_ENTRIES", "5000")),
+            ttl=float(os.getenv("UNFURL_CACHE_TTL_SECONDS", "86400")),
+        )
+        self.failure_ttl = float(os.getenv("UNFURL_FAILURE_TTL_SECONDS", "900"))
+        self._client: Optional[httpx.AsyncClient] = None
+        # host -> [semaphore, requests holding or waiting for it]; dropped when idle
+        self._host_limits: Dict[str, list] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(UNFURL_TIMEOUT_SECONDS),
+                transport=PublicOnlyTransport(
+                    httpx.Limits(max_connections=50, max_keepalive_connections=10), self.allow_private
+                ),
+                headers={"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml"},
+                follow_redirects=False,
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @contextlib.asynccontextmanager
+    async def _host_slot(self, host: str):
+        entry = self._host_limits.get(host)
+        if entry is None:
+            entry = self._host_limits[host] = [asyncio.Semaphore(UNFURL_PER_HOST), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._host_limits[host]
+
+    async def unfurl(self, url: str) -> Optional[dict]:
+        """Preview dict (url, title, description, image, site_name) for `url`, or None."""
+        key = normalize_url(url)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached or None
+        try:
+            preview = await asyncio.wait_for(self._fetch(key), UNFURL_TIMEOUT_SECONDS * 2)
+        except Exception as e:
+            logging.warning(f"Link preview failed for {key} (non-fatal): {e}")
+            preview = None
+        # Failures are cached as {} for a shorter time so a broken link isn't retried per post
+        self.cache.set(key, preview or {}, ttl=None if preview else self.failure_ttl)
+        return preview
+
+    async def _fetch(self, url: str) -> Optional[dict]:
+        for _ in range(UNFURL_MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            if parts.scheme not in ("http", "https") or not parts.hostname:
+                return None
+            async with self._host_slot(parts.hostname):
+                async with self._get_client().stream("GET", url) as response:
+                    if response.is_redirect:
+                        url = urljoin(url, response.headers.get("location", ""))
+                        continue
+                    if response.status_code != 200:
+                        return None
+                    if "html" not in response.headers.get("content-type", ""):
+                        return None
+                    return await self._parse(response, url)
+        return None
+
+    async def _parse(self, response: httpx.Response, url: str) -> Optional[dict]:
+        parser = OpenGraphParser()
+        try:
+            decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        received = 0
+        async for chunk in response.aiter_bytes():
+            chunk = chunk[:UNFURL_MAX_BYTES - received]
+            received += len(chunk)
+            parser.feed(decoder.decode(chunk))
+            if parser.done or received >= UNFURL_MAX_BYTES:
+                break
+        return parser.preview(url)
+
+
+unfurler = Unfurler(allow_private=os.getenv("UNFURL_ALLOW_PRIVATE", "").lower() == "true")
+
+
+async def unfurl_post_links(post_id: str, links: List[dict]):
+    """Fill title/description/thumbnail on a post's link media. Runs as a background task.
+
+    `links` are the link media entries as submitted; a thumbnail the client supplied is kept.
+    """
+    for link in links:
+        preview = await unfurler.unfurl(link["url"])
+        if not preview:
+            continue
+        fields = {"title": preview["title"], "description": preview["description"]}
+        if not link.get("thumbnail_url") and preview["image"]:
+            fields["thumbnail_url"] = preview["image"]
+        query = supabase.table("post_media").update(fields) \
+            .eq("post_id", post_id).eq("media_type", "link").eq("url", link["url"])
+        try:
+            await asyncio.to_thread(query.execute)
+        except Exception as e:
+            logging.warning(f"Failed to store link preview (non-fatal): {e}")
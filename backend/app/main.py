@@ -1,3 +1,5 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes.auth import router as auth_router
@@ -7,10 +9,36 @@ from app.routes.posts import router as posts_router
 from app.routes.connections import router as connections_router
 from app.routes.messages import router as messages_router
 from app.routes.notifications import router as notifications_router
-from app.routes.search import router as search_router
+from app.routes.search import router as search_router, keep_trending_fresh
+from app.routes.media import router as media_router
+from app.lib.autocomplete import keep_suggestions_fresh
+from app.lib.search_backends import search_backend
+from app.lib.images import shutdown_image_pool
+from app.lib.unfurl import unfurler
+from app.lib.scheduled_posts import keep_publishing_scheduled_posts, publisher_enabled
+
+# Background tasks that live for the lifetime of the app
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the in-memory user/skill autocomplete indexes off the request path
+    suggestions_task = asyncio.create_task(keep_suggestions_fresh())
+    # Keep the trending cache warm so /search/trending never waits on the RPC
+    trending_task = asyncio.create_task(keep_trending_fresh())
+    # Load/sync/snapshot the configured search backend (no-op unless SEARCH_BACKEND=memory)
+    search_task = asyncio.create_task(search_backend.run())
+    # Publish scheduled posts as they come due (safe on every worker; see scheduled_posts.py)
+    publisher_task = asyncio.create_task(keep_publishing_scheduled_posts()) if publisher_enabled() else None
+    yield
+    suggestions_task.cancel()
+    trending_task.cancel()
+    search_task.cancel()
+    if publisher_task:
+        publisher_task.cancel()
+    shutdown_image_pool()
+    await unfurler.aclose()
 
 # FastAPI application
-app = FastAPI(title="Stonet Backend API")
+app = FastAPI(title="Stonet Backend API", lifespan=lifespan)
 
 # CORS settings - allow frontend development and production hosts
 import os
@@ -68,4 +96,5 @@ app.include_router(connections_router)
 app.include_router(messages_router)
 app.include_router(notifications_router)
 app.include_router(search_router)
+app.include_router(media_router)
 
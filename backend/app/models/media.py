@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import Optional
+from enum import Enum
+
+class UploadKind(str, Enum):
+    AVATAR = "avatar"
+    COVER = "cover"
+    POST = "post"
+
+class SignedUploadRequest(BaseModel):
+    kind: UploadKind
+    content_type: str
+    size: int
+    filename: Optional[str] = None
+
+class FinalizeUploadRequest(BaseModel):
+    kind: UploadKind
+    path: str
+    post_id: Optional[str] = None  # attach post media to an existing post
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator, EmailStr
-from typing import Optional
+from typing import List, Optional
 from datetime import date, datetime
 import re
 
@@ -69,6 +69,8 @@ class ProfileResponse(BaseModel):
     account_type: Optional[str]
     avatar_url: Optional[str]
     cover_url: Optional[str]
+    avatar_variants: Optional[dict]
+    cover_variants: Optional[dict]
     email_visible: bool
     phone_visible: bool
     birthday_visible: bool
@@ -173,3 +175,31 @@ class SkillResponse(BaseModel):
     user_id: str
     skill: str
     endorsement_count: int
+
+# Bulk Profile Change Models (POST /profile/bulk and per-collection /bulk)
+MAX_BULK_ITEMS = 50
+
+class WorkExperienceBulkUpdate(WorkExperienceUpdate):
+    id: str
+
+class EducationBulkUpdate(EducationUpdate):
+    id: str
+
+class WorkExperienceBulk(BaseModel):
+    create: List[WorkExperienceCreate] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+    update: List[WorkExperienceBulkUpdate] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+    delete: List[str] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+
+class EducationBulk(BaseModel):
+    create: List[EducationCreate] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+    update: List[EducationBulkUpdate] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+    delete: List[str] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+
+class SkillsBulk(BaseModel):
+    create: List[SkillCreate] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+    delete: List[str] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+
+class ProfileBulkChanges(BaseModel):
+    work_experience: Optional[WorkExperienceBulk] = None
+    education: Optional[EducationBulk] = None
+    skills: Optional[SkillsBulk] = None
@@ -5,7 +5,9 @@ from app.models.auth import (
     SignupRequest, LoginRequest, LogoutRequest, 
     RefreshRequest, ForgotPasswordRequest, ResetPasswordRequest
 )
-from app.lib.auth_helpers import check_username_availability, track_login_activity, deactivate_session
+from app.lib.auth_helpers import check_username_availability, track_login_activity, deactivate_session, mark_user_known
+from app.lib.search_backends import on_user_saved
+from app.lib.profile_cache import invalidate_profile
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
@@ -75,7 +77,13 @@ def signup(payload: SignupRequest, request: Request):
             "last_name": payload.last_name,
             "is_verified": False
         }).execute()
-        pass  # User profile created successfully
+        mark_user_known(user_id)
+        on_user_saved({
+            "id": user_id,
+            "username": payload.username,
+            "first_name": payload.first_name,
+            "last_name": payload.last_name
+        })
     except Exception as e:
         # Log profile creation failure
         pass
@@ -149,6 +157,7 @@ def login(payload: LoginRequest, request: Request):
         supabase.table("users").update({
             "last_active_at": "now()"
         }).eq("id", auth_res.user.id).execute()
+        invalidate_profile(auth_res.user.id)
     except Exception:
         pass  # Non-critical, don't block login
     
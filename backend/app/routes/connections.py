@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
 from app.lib.supabase import supabase
 from app.middleware.auth import require_auth
+from app.lib.identifiers import resolve_user_id
+from app.lib.profile_cache import invalidate_profile
 from app.models.connection import ConnectionRequest, ConnectionUpdate, ConnectionResponse
 from typing import List
 
@@ -120,6 +122,9 @@ def update_connection(connection_id: str, payload: ConnectionUpdate, user_id: st
         }
         
         response = supabase.table("connections").update(update_data).eq("id", connection_id).execute()
+        # connections_count on both users rows may have changed
+        invalidate_profile(connection.data["requester_id"])
+        invalidate_profile(connection.data["receiver_id"])
         enriched = enrich_connection(response.data[0])
         
         # TODO: Create notification for requester
@@ -145,6 +150,8 @@ def delete_connection(connection_id: str, user_id: str = Depends(require_auth)):
             raise HTTPException(status_code=403, detail="Not authorized")
         
         supabase.table("connections").delete().eq("id", connection_id).execute()
+        invalidate_profile(connection.data["requester_id"])
+        invalidate_profile(connection.data["receiver_id"])
         
         return {"message": "Connection removed"}
     except HTTPException:
@@ -184,13 +191,10 @@ def check_connection_status_by_id(other_user_id: str, user_id: str = Depends(req
 def check_connection_status(username: str, user_id: str = Depends(require_auth)):
     """Check connection status with a specific user"""
     try:
-        # Get user ID from username
-        user = supabase.table("users").select("id").eq("username", username).single().execute()
-        if not user.data:
+        other_user_id = resolve_user_id(username)
+        if not other_user_id:
             raise HTTPException(status_code=404, detail="User not found")
         
-        other_user_id = user.data["id"]
-        
         # Check if connection exists
         connection = supabase.table("connections").select("*").or_(
             f"and(requester_id.eq.{user_id},receiver_id.eq.{other_user_id}),and(requester_id.eq.{other_user_id},receiver_id.eq.{user_id})"
@@ -215,13 +219,10 @@ def check_connection_status(username: str, user_id: str = Depends(require_auth))
 def get_mutual_connections(username: str, user_id: str = Depends(require_auth)):
     """Get mutual connections with another user"""
     try:
-        # Get other user ID
-        user = supabase.table("users").select("id").eq("username", username).single().execute()
-        if not user.data:
+        other_user_id = resolve_user_id(username)
+        if not other_user_id:
             raise HTTPException(status_code=404, detail="User not found")
         
-        other_user_id = user.data["id"]
-        
         # Get current user's connections
         my_connections = supabase.table("connections").select("requester_id, receiver_id").or_(
             f"requester_id.eq.{user_id},receiver_id.eq.{user_id}"
@@ -0,0 +1,131 @@
+import asyncio
+import re
+import uuid
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from app.lib.supabase import supabase
+from app.lib.images import (
+    make_variants, content_path, has_variants, put_immutable, delete_objects, publish_profile_image
+)
+from app.middleware.auth import require_auth
+from app.models.media import UploadKind, SignedUploadRequest, FinalizeUploadRequest
+from app.routes.profile import ALLOWED_IMAGE_TYPES, MAX_IMAGE_SIZE
+
+router = APIRouter(prefix="/media", tags=["Media"])
+
+# Direct-to-storage uploads: the client asks for a signed upload URL, PUTs the
+# bytes straight to Supabase Storage, then calls /media/finalize so we can check
+# the stored object and record it. Only the (small) finalize step touches the API.
+# Supabase signed upload URLs are valid for two hours; the expiry isn't configurable.
+# Avatars/covers move to content-addressed keys on finalize. Post media keeps its
+# one-off UUID key (we never read those bytes back), which is just as immutable.
+
+BUCKETS = {
+    UploadKind.AVATAR: "avatars",
+    UploadKind.COVER: "covers",
+    UploadKind.POST: "post-media",
+}
+
+ALLOWED_POST_MEDIA_TYPES = ALLOWED_IMAGE_TYPES | {"video/mp4", "video/webm", "video/quicktime"}
+MAX_POST_MEDIA_SIZE = 50 * 1024 * 1024  # 50 MB
+
+EXTENSIONS = {
+    "image/jpeg": "jpg", "image/png": "png", "image/webp": "webp", "image/gif": "gif",
+    "video/mp4": "mp4", "video/webm": "webm", "video/quicktime": "mov",
+}
+
+
+def upload_limits(kind: UploadKind):
+    if kind == UploadKind.POST:
+        return ALLOWED_POST_MEDIA_TYPES, MAX_POST_MEDIA_SIZE
+    return ALLOWED_IMAGE_TYPES, MAX_IMAGE_SIZE
+
+
+def object_metadata(info: dict):
+    """(size, content type) from a Storage object info response."""
+    metadata = info.get("metadata") or {}
+    size = info.get("size", metadata.get("size"))
+    content_type = info.get("content_type") or metadata.get("mimetype")
+    return size, content_type
+
+
+@router.post("/upload-url")
+def create_upload_url(payload: SignedUploadRequest, user_id: str = Depends(require_auth)):
+    """Issue a signed URL the client can upload one file to directly"""
+    allowed_types, max_size = upload_limits(payload.kind)
+    if payload.content_type not in allowed_types:
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+    if payload.size <= 0 or payload.size > max_size:
+        raise HTTPException(status_code=400, detail=f"File must be smaller than {max_size // (1024 * 1024)} MB")
+    bucket = BUCKETS[payload.kind]
+    path = f"{user_id}/{uuid.uuid4()}.{EXTENSIONS[payload.content_type]}"
+    try:
+        signed = supabase.storage.from_(bucket).create_signed_upload_url(path)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not create upload URL: {str(e)}")
+    return {
+        "bucket": bucket,
+        "path": path,
+        "signed_url": signed["signed_url"],
+        "token": signed["token"],
+    }
+
+
+@router.post("/finalize")
+async def finalize_upload(payload: FinalizeUploadRequest, background_tasks: BackgroundTasks, user_id: str = Depends(require_auth)):
+    """Validate an object uploaded through a signed URL and record it"""
+    # supabase-py is blocking: every Storage/table call below goes through a thread
+    # so only make_variants (the process pool) is awaited on the loop.
+    if not re.fullmatch(rf"{re.escape(user_id)}/[0-9a-f-]{{36}}\.[a-z0-9]+", payload.path):
+        raise HTTPException(status_code=400, detail="Invalid upload path")
+    allowed_types, max_size = upload_limits(payload.kind)
+    storage = supabase.storage.from_(BUCKETS[payload.kind])
+    try:
+        size, content_type = object_metadata(await asyncio.to_thread(storage.info, payload.path))
+    except Exception:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    if content_type not in allowed_types or size is None or int(size) > max_size:
+        await asyncio.to_thread(storage.remove, [payload.path])
+        raise HTTPException(status_code=400, detail="Uploaded file is not an allowed type or is too large")
+
+    if payload.kind == UploadKind.POST:
+        url = storage.get_public_url(payload.path)
+        return await asyncio.to_thread(finalize_post_media, payload, user_id, content_type, url)
+
+    # Avatars/covers: re-key the upload by content hash (like the multipart endpoints)
+    # and build its variants. This reads at most MAX_IMAGE_SIZE back from Storage;
+    # the client's upload itself never went through us.
+    kind = payload.kind.value
+    try:
+        data = await asyncio.to_thread(storage.download, payload.path)
+        path = content_path(user_id, data, payload.path.rsplit(".", 1)[-1])
+        cached = await asyncio.to_thread(has_variants, storage, path, kind)
+        variants = None if cached else await make_variants(data, kind)
+        await asyncio.to_thread(put_immutable, storage, path, data, content_type)
+    except ValueError:
+        await asyncio.to_thread(storage.remove, [payload.path])
+        raise HTTPException(status_code=400, detail="File is not a readable image")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not process image: {str(e)}")
+    background_tasks.add_task(delete_objects, BUCKETS[payload.kind], [payload.path])
+    try:
+        return await asyncio.to_thread(publish_profile_image, user_id, kind, path, variants, background_tasks)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save {kind} URL: {str(e)}")
+
+
+def finalize_post_media(payload: FinalizeUploadRequest, user_id: str, content_type: str, url: str) -> dict:
+    """Return the media entry for create_post, or attach it to `post_id` when given."""
+    media = {"url": url, "media_type": "video" if content_type.startswith("video/") else "image", "thumbnail_url": None}
+    if not payload.post_id:
+        return {"media": media}
+    try:
+        check = supabase.table("posts").select("author_id").eq("id", payload.post_id).single().execute()
+        if not check.data or check.data["author_id"] != user_id:
+            raise HTTPException(status_code=403, detail="Not authorized")
+        response = supabase.table("post_media").insert({"post_id": payload.post_id, **media}).execute()
+        return {"media": response.data[0] if response.data else media}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
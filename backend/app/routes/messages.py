@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
-from app.lib.supabase import supabase
+from app.lib.supabase import supabase, is_missing_rpc
 from app.middleware.auth import require_auth
 from app.models.message import MessageCreate, MessageSend, MessageResponse, ConversationResponse
 from typing import List
@@ -65,6 +65,41 @@ def enrich_conversation(conv: dict, user_id: str):
         print(f"Error enriching conversation: {e}")
         return conv
 
+def insert_message(conversation_id: str, user_id: str, content: str) -> dict:
+    """Insert a message and return it with its sender card (send_message RPC, migration 24).
+
+    The RPC also checks that the sender is a participant; falls back to separate
+    queries if it isn't deployed.
+    """
+    try:
+        return supabase.rpc("send_message", {
+            "target_conversation_id": conversation_id,
+            "sender": user_id,
+            "body": content,
+        }).execute().data
+    except Exception as e:
+        if "not a participant" in str(e).lower():
+            raise HTTPException(status_code=403, detail="Not a participant in this conversation")
+        if not is_missing_rpc(e):
+            raise
+        print(f"send_message RPC missing, falling back to separate queries: {e}")
+
+    participant = supabase.table("conversation_participants").select("*").eq("conversation_id", conversation_id).eq("user_id", user_id).execute()
+    if not participant.data:
+        raise HTTPException(status_code=403, detail="Not a participant in this conversation")
+
+    message_data = {
+        "conversation_id": conversation_id,
+        "sender_id": user_id,
+        "content": content,
+        "is_read": False
+    }
+    message = supabase.table("messages").insert(message_data).execute()
+
+    sender = supabase.table("users").select("id, username, first_name, last_name, avatar_url").eq("id", user_id).single().execute()
+    message.data[0]["sender"] = sender.data
+    return message.data[0]
+
 @router.post("")
 def send_message(payload: MessageCreate, user_id: str = Depends(require_auth)):
     """Send a new message (creates conversation if needed)"""
@@ -72,24 +107,14 @@ def send_message(payload: MessageCreate, user_id: str = Depends(require_auth)):
         # Get or create conversation
         conversation_id = get_or_create_conversation(user_id, payload.receiver_id)
         
-        # Create message
-        message_data = {
-            "conversation_id": conversation_id,
-            "sender_id": user_id,
-            "content": payload.content,
-            "is_read": False
-        }
-        
-        message = supabase.table("messages").insert(message_data).execute()
-        
-        # Get sender info
-        sender = supabase.table("users").select("id, username, first_name, last_name, avatar_url").eq("id", user_id).single().execute()
-        message.data[0]["sender"] = sender.data
+        message = insert_message(conversation_id, user_id, payload.content)
         
         # TODO: Create notification for receiver
         # TODO: Emit real-time event for receiver
         
-        return {"message": "Message sent", "data": message.data[0]}
+        return {"message": "Message sent", "data": message}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -97,27 +122,8 @@ def send_message(payload: MessageCreate, user_id: str = Depends(require_auth)):
 def send_message_to_conversation(payload: MessageSend, user_id: str = Depends(require_auth)):
     """Send message to existing conversation"""
     try:
-        # Verify user is participant
-        participant = supabase.table("conversation_participants").select("*").eq("conversation_id", payload.conversation_id).eq("user_id", user_id).execute()
-        
-        if not participant.data:
-            raise HTTPException(status_code=403, detail="Not a participant in this conversation")
-        
-        # Create message
-        message_data = {
-            "conversation_id": payload.conversation_id,
-            "sender_id": user_id,
-            "content": payload.content,
-            "is_read": False
-        }
-        
-        message = supabase.table("messages").insert(message_data).execute()
-        
-        # Get sender info
-        sender = supabase.table("users").select("id, username, first_name, last_name, avatar_url").eq("id", user_id).single().execute()
-        message.data[0]["sender"] = sender.data
-        
-        return {"message": "Message sent", "data": message.data[0]}
+        message = insert_message(payload.conversation_id, user_id, payload.content)
+        return {"message": "Message sent", "data": message}
     except HTTPException:
         raise
     except Exception as e:
@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import RedirectResponse
 from app.lib.supabase import supabase
+from app.lib.auth_helpers import mark_user_known
+from app.lib.search_backends import on_user_saved
+from app.lib.profile_cache import invalidate_profile
 import os
 
 router = APIRouter(prefix="/auth/oauth", tags=["OAuth"])
@@ -48,7 +51,7 @@ def oauth_callback(request: Request):
 
         user = session.user
 
-        supabase.table("users").upsert({
+        profile = supabase.table("users").upsert({
             "id": user.id,
             "email": user.email,
             "first_name": user.user_metadata.get("full_name", "").split(" ")[0],
@@ -56,6 +59,10 @@ def oauth_callback(request: Request):
             "avatar_url": user.user_metadata.get("avatar_url"),
             "is_active": True
         }).execute()
+        invalidate_profile(user.id)
+        mark_user_known(user.id)
+        if profile.data:
+            on_user_saved(profile.data[0])
 
         return RedirectResponse(
             f"{FRONTEND_URL}/auth/callback"
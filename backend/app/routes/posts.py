@@ -1,12 +1,19 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from app.lib.supabase import supabase
+from fastapi import APIRouter, HTTPException, Depends, Query, BackgroundTasks, Response
+from app.lib.supabase import supabase, is_missing_rpc
 from app.middleware.auth import require_auth
+from app.lib.auth_helpers import is_known_user, mark_user_known
+from app.lib.search_backends import on_user_saved, on_post_saved, on_post_deleted
+from app.lib.identifiers import resolve_user_id
+from app.lib.cursors import encode_cursor, decode_cursor
+from app.lib.unfurl import unfurl_post_links
+from app.routes.search import to_utc_naive
 from app.models.post import (
     PostCreate, PostUpdate, PostResponse,
     CommentCreate, CommentUpdate, CommentResponse,
-    PollVote
+    PollVote, MediaType
 )
 from typing import List, Optional
+from uuid import UUID
 
 router = APIRouter(prefix="/posts", tags=["Posts"])
 
@@ -14,9 +21,12 @@ router = APIRouter(prefix="/posts", tags=["Posts"])
 # This handles accounts created before the frontend was fixed to call /auth/signup.
 def ensure_user_exists(user_id: str):
     """Ensure a row exists in the users table for this auth user."""
+    if is_known_user(user_id):
+        return
     try:
         check = supabase.table("users").select("id").eq("id", user_id).execute()
         if check.data:
+            mark_user_known(user_id)
             return  # Already exists
 
         # Fetch real email from Supabase Auth (service-role bypasses RLS)
@@ -39,6 +49,8 @@ def ensure_user_exists(user_id: str):
             "last_name": last_name,
             "is_verified": False,
         }).execute()
+        mark_user_known(user_id)
+        on_user_saved({"id": user_id, "username": username, "first_name": first_name, "last_name": last_name})
     except Exception as e:
         print(f"ensure_user_exists error for {user_id}: {e}")
 
@@ -52,7 +64,7 @@ def enrich_post(post: dict, user_id: Optional[str] = None):
 
         # 1) Author via join (no separate query)
         author_resp = supabase.table("users") \
-            .select("id, username, first_name, last_name, avatar_url, headline") \
+            .select("id, username, first_name, last_name, avatar_url, avatar_variants, headline") \
             .eq("id", post["author_id"]).single().execute()
         post["author"] = author_resp.data if author_resp.data else None
 
@@ -122,7 +134,7 @@ def bulk_enrich_posts(posts: list, user_id: Optional[str] = None) -> list:
 
     # 1) Authors
     authors_resp = supabase.table("users") \
-        .select("id, username, first_name, last_name, avatar_url, headline") \
+        .select("id, username, first_name, last_name, avatar_url, avatar_variants, headline") \
         .in_("id", author_ids).execute()
     authors_map = {a["id"]: a for a in (authors_resp.data or [])}
 
@@ -196,7 +208,7 @@ def bulk_enrich_posts(posts: list, user_id: Optional[str] = None) -> list:
 # ==================== POST CRUD ====================
 
 @router.post("", status_code=201)
-def create_post(payload: PostCreate, user_id: str = Depends(require_auth)):
+def create_post(payload: PostCreate, background_tasks: BackgroundTasks, user_id: str = Depends(require_auth)):
     """Create a new post"""
     ensure_user_exists(user_id)
     try:
@@ -206,7 +218,7 @@ def create_post(payload: PostCreate, user_id: str = Depends(require_auth)):
             "content": payload.content,
             "post_type": payload.post_type.value,
             "visibility": payload.visibility.value,
-            "scheduled_at": payload.scheduled_at.isoformat() if payload.scheduled_at else None,
+            "scheduled_at": to_utc_naive(payload.scheduled_at) if payload.scheduled_at else None,
             "is_draft": payload.is_draft,
             "is_published": not payload.is_draft and not payload.scheduled_at
         }
@@ -223,6 +235,9 @@ def create_post(payload: PostCreate, user_id: str = Depends(require_auth)):
                 "thumbnail_url": m.thumbnail_url
             } for m in payload.media]
             supabase.table("post_media").insert(media_data).execute()
+            links = [m for m in media_data if m["media_type"] == MediaType.LINK.value]
+            if links:
+                background_tasks.add_task(unfurl_post_links, post["id"], links)
         
         # Add poll if provided
         if payload.poll:
@@ -243,6 +258,9 @@ def create_post(payload: PostCreate, user_id: str = Depends(require_auth)):
             } for opt in payload.poll.options]
             supabase.table("post_poll_options").insert(options_data).execute()
         
+        # Topic and search indexes are updated after the response is sent
+        background_tasks.add_task(on_post_saved, dict(post))
+        
         # Return enriched post
         enriched = enrich_post(post, user_id)
         return {"message": "Post created", "data": enriched}
@@ -307,19 +325,10 @@ def get_user_posts(
     offset: int = Query(0, ge=0)
 ):
     """Get posts by a specific user (accepts username or UUID)"""
-    import re
-    uuid_pattern = re.compile(
-        r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$',
-        re.IGNORECASE
-    )
     try:
-        if uuid_pattern.match(identifier):
-            author_id = identifier
-        else:
-            user = supabase.table("users").select("id").eq("username", identifier).single().execute()
-            if not user.data:
-                raise HTTPException(status_code=404, detail="User not found")
-            author_id = user.data["id"]
+        author_id = resolve_user_id(identifier)
+        if not author_id:
+            raise HTTPException(status_code=404, detail="User not found")
 
         # Get user's posts
         posts = supabase.table("posts").select("*").eq("author_id", author_id).eq("is_published", True).eq("is_draft", False).order("created_at", desc=True).range(offset, offset + limit - 1).execute()
@@ -331,7 +340,7 @@ def get_user_posts(
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.put("/{post_id}")
-def update_post(post_id: str, payload: PostUpdate, user_id: str = Depends(require_auth)):
+def update_post(post_id: str, payload: PostUpdate, background_tasks: BackgroundTasks, user_id: str = Depends(require_auth)):
     """Update a post"""
     try:
         # Verify ownership
@@ -370,6 +379,12 @@ def update_post(post_id: str, payload: PostUpdate, user_id: str = Depends(requir
                     "thumbnail_url": m.thumbnail_url,
                 } for m in media_payload]
                 supabase.table("post_media").insert(media_data).execute()
+                links = [m for m in media_data if m["media_type"] == MediaType.LINK.value]
+                if links:
+                    background_tasks.add_task(unfurl_post_links, post_id, links)
+
+        if update_data:
+            background_tasks.add_task(on_post_saved, dict(post_row))
 
         enriched = enrich_post(post_row, user_id)
         return {"message": "Post updated", "data": enriched}
@@ -388,6 +403,7 @@ def delete_post(post_id: str, user_id: str = Depends(require_auth)):
             raise HTTPException(status_code=403, detail="Not authorized")
         
         supabase.table("posts").delete().eq("id", post_id).execute()
+        on_post_deleted(post_id)
         return {"message": "Post deleted"}
     except HTTPException:
         raise
@@ -485,26 +501,58 @@ def unsave_post(post_id: str, user_id: str = Depends(require_auth)):
 
 @router.get("/saved/all", response_model=List[PostResponse])
 def get_saved_posts(
+    response: Response,
     user_id: str = Depends(require_auth),
     limit: int = Query(20, ge=1, le=100),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, max_length=200),
 ):
-    """Get user's saved posts"""
-    try:
-        saved = supabase.table("saved_posts").select("post_id").eq("user_id", user_id).order("created_at", desc=True).range(offset, offset + limit - 1).execute()
-        
-        if not saved.data:
-            return []
-        
-        post_ids = [s["post_id"] for s in saved.data]
-        posts = supabase.table("posts").select("*").in_("id", post_ids).execute()
+    """Get user's saved posts, most recently saved first.
 
-        return bulk_enrich_posts(posts.data, user_id)
+    Posts come from one saved_posts -> posts join, so the page keeps saved order and
+    is never short. Pass the X-Next-Cursor response header back as `cursor` for the
+    next page; `offset` still works for older clients.
+    """
+    try:
+        query = supabase.table("saved_posts").select("created_at, post:posts!inner(*)").eq("user_id", user_id)
+        if cursor:
+            saved_at, post_id = decode_cursor(cursor, 2)
+            UUID(str(post_id))
+            query = query.or_(f"created_at.lt.{saved_at},and(created_at.eq.{saved_at},post_id.lt.{post_id})")
+        query = query.order("created_at", desc=True).order("post_id", desc=True)
+        saved = (query.limit(limit) if cursor else query.range(offset, offset + limit - 1)).execute().data or []
+
+        if len(saved) == limit:
+            response.headers["X-Next-Cursor"] = encode_cursor(saved[-1]["created_at"], saved[-1]["post"]["id"])
+        return bulk_enrich_posts([s["post"] for s in saved], user_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # ==================== COMMENTS ====================
 
+COMMENT_SELECT = "*, author:author_id(id, username, first_name, last_name, avatar_url)"
+REPLY_FALLBACK_SAMPLE = 1000  # replies read in one query when get_comment_tree isn't deployed
+
+def select_comments(user_id: Optional[str], count: Optional[str] = None):
+    """comments query with the author and the viewer's own like embedded.
+
+    The like embed is filtered to the viewer, so is_liked costs no extra query;
+    like_count is kept on the row by triggers (migration 23).
+    """
+    if not user_id:
+        return supabase.table("comments").select(COMMENT_SELECT, count=count)
+    return supabase.table("comments") \
+        .select(COMMENT_SELECT + ", viewer_like:comment_likes(user_id)", count=count) \
+        .eq("viewer_like.user_id", user_id)
+
+def fold_liked(comments: list) -> list:
+    """Turn the embedded viewer_like rows from select_comments into is_liked."""
+    for comment in comments:
+        comment["is_liked"] = bool(comment.pop("viewer_like", None))
+    return comments
+
 @router.get("/{post_id}/comments", response_model=List[CommentResponse])
 def get_comments(
     post_id: str,
@@ -512,42 +560,144 @@ def get_comments(
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0)
 ):
-    """Get comments for a post. Optimised: author join + batch likes in 2 queries total."""
+    """Get comments for a post. Author, like_count and is_liked all come back in one query."""
     try:
-        # 1) Comments with author joined — eliminates N author round-trips
-        comments = supabase.table("comments") \
-            .select("*, author:author_id(id, username, first_name, last_name, avatar_url)") \
+        comments = select_comments(user_id) \
             .eq("post_id", post_id) \
             .is_("parent_comment_id", "null") \
             .order("created_at", desc=True) \
             .range(offset, offset + limit - 1) \
             .execute()
+        return fold_liked(comments.data or [])
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        if not comments.data:
-            return []
+def load_comment_tree(post_id: str, viewer_id: Optional[str], limit: int, reply_limit: int, cursor: Optional[str] = None):
+    """Top-level comments with their first `reply_limit` replies and reply_count (get_comment_tree RPC, migration 22).
 
-        # 2) Batch-check which comments the current user liked — 1 query for all
-        if user_id:
-            comment_ids = [c["id"] for c in comments.data]
-            liked_resp = supabase.table("comment_likes") \
-                .select("comment_id") \
-                .eq("user_id", user_id) \
-                .in_("comment_id", comment_ids) \
-                .execute()
-            liked_set = {r["comment_id"] for r in (liked_resp.data or [])}
-            for comment in comments.data:
-                comment["is_liked"] = comment["id"] in liked_set
-        else:
-            for comment in comments.data:
-                comment["is_liked"] = False
+    Returns (comments, next_cursor). Without the RPC, falls back to one query for the
+    page and one for its replies.
+    """
+    params = {
+        "target_post_id": post_id,
+        "viewer_id": viewer_id,
+        "result_limit": limit,
+        "reply_limit": reply_limit,
+    }
+    if cursor:
+        params["cursor_created_at"], params["cursor_id"] = decode_cursor(cursor, 2)
+        UUID(str(params["cursor_id"]))
+    try:
+        comments = supabase.rpc("get_comment_tree", params).execute().data or []
+    except Exception as e:
+        if not is_missing_rpc(e):
+            raise
+        print(f"get_comment_tree RPC missing, falling back to two queries: {e}")
+        comments = load_comment_tree_fallback(post_id, viewer_id, limit, reply_limit, params)
+    next_cursor = encode_cursor(comments[-1]["created_at"], comments[-1]["id"]) if len(comments) == limit else None
+    return comments, next_cursor
+
+def load_comment_tree_fallback(post_id: str, viewer_id: Optional[str], limit: int, reply_limit: int, params: dict) -> list:
+    query = select_comments(viewer_id).eq("post_id", post_id).is_("parent_comment_id", "null")
+    if params.get("cursor_created_at"):
+        c, cid = params["cursor_created_at"], params["cursor_id"]
+        query = query.or_(f"created_at.lt.{c},and(created_at.eq.{c},id.lt.{cid})")
+    comments = query.order("created_at", desc=True).order("id", desc=True).limit(limit).execute().data or []
+    if not comments:
+        return []
+    replies = select_comments(viewer_id) \
+        .in_("parent_comment_id", [c["id"] for c in comments]) \
+        .order("created_at").order("id") \
+        .limit(REPLY_FALLBACK_SAMPLE).execute().data or []
+    if len(replies) < REPLY_FALLBACK_SAMPLE:
+        by_parent = {}
+        for reply in replies:
+            by_parent.setdefault(reply["parent_comment_id"], []).append(reply)
+        for comment in comments:
+            thread = by_parent.get(comment["id"], [])
+            comment["reply_count"] = len(thread)
+            comment["replies"] = thread[:reply_limit]
+    else:
+        # The sample was cut off, so a busy thread may have crowded out the others'
+        # replies: read each thread's preview and exact count separately.
+        replies = []
+        for comment in comments:
+            thread = select_comments(viewer_id, count="exact").eq("parent_comment_id", comment["id"]) \
+                .order("created_at").order("id").limit(reply_limit).execute()
+            comment["reply_count"] = thread.count or 0
+            comment["replies"] = thread.data or []
+            replies += comment["replies"]
+    fold_liked(comments + replies)
+    return comments
+
+@router.get("/{post_id}/comments/tree")
+def get_comment_tree(
+    post_id: str,
+    user_id: Optional[str] = Depends(require_auth),
+    limit: int = Query(20, ge=1, le=100),
+    replies: int = Query(3, ge=0, le=20),
+    cursor: Optional[str] = Query(None, max_length=200),
+):
+    """Top-level comments newest first, each with its first `replies` replies and a reply_count.
 
-        return comments.data
+    Page with `next_cursor`; load more of a thread from /posts/comments/{id}/replies.
+    """
+    try:
+        comments, next_cursor = load_comment_tree(post_id, user_id, limit, replies, cursor)
+        return {"comments": comments, "next_cursor": next_cursor}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/comments/{comment_id}/replies")
+def get_comment_replies(
+    comment_id: str,
+    user_id: Optional[str] = Depends(require_auth),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, max_length=200),
+):
+    """Replies to a comment oldest first, keyset-paginated with `next_cursor`.
+
+    Pass the tree's last shown reply as the cursor to continue after the preview.
+    """
+    try:
+        query = select_comments(user_id).eq("parent_comment_id", comment_id)
+        if cursor:
+            c, cid = decode_cursor(cursor, 2)
+            UUID(str(cid))
+            query = query.or_(f"created_at.gt.{c},and(created_at.eq.{c},id.gt.{cid})")
+        replies = query.order("created_at").order("id").limit(limit).execute().data or []
+        fold_liked(replies)
+        next_cursor = encode_cursor(replies[-1]["created_at"], replies[-1]["id"]) if len(replies) == limit else None
+        return {"replies": replies, "next_cursor": next_cursor}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/{post_id}/comments")
 def create_comment(post_id: str, payload: CommentCreate, user_id: str = Depends(require_auth)):
     """Add a comment to a post"""
+    try:
+        # One call: ensures the users row, inserts, bumps comment_count, returns the author card
+        comment = supabase.rpc("create_comment", {
+            "target_post_id": post_id,
+            "author": user_id,
+            "body": payload.content,
+            "parent_id": payload.parent_comment_id,
+        }).execute().data
+    except Exception as e:
+        if not is_missing_rpc(e):
+            raise HTTPException(status_code=400, detail=str(e))
+        print(f"create_comment RPC missing, falling back to separate queries: {e}")
+        comment = create_comment_fallback(post_id, payload, user_id)
+    mark_user_known(user_id)
+    if comment.pop("user_created", False) and comment.get("author"):
+        on_user_saved(comment["author"])
+    return {"message": "Comment added", "data": comment}
+
+def create_comment_fallback(post_id: str, payload: CommentCreate, user_id: str) -> dict:
     ensure_user_exists(user_id)
     try:
         comment_data = {
@@ -566,7 +716,7 @@ def create_comment(post_id: str, payload: CommentCreate, user_id: str = Depends(
         author = supabase.table("users").select("id, username, first_name, last_name, avatar_url").eq("id", user_id).single().execute()
         comment.data[0]["author"] = author.data
         
-        return {"message": "Comment added", "data": comment.data[0]}
+        return comment.data[0]
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -606,6 +756,35 @@ def delete_comment(comment_id: str, user_id: str = Depends(require_auth)):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/comments/{comment_id}/like")
+def like_comment(comment_id: str, user_id: str = Depends(require_auth)):
+    """Like a comment"""
+    ensure_user_exists(user_id)
+    try:
+        supabase.table("comment_likes").insert({"comment_id": comment_id, "user_id": user_id}).execute()
+    except Exception as e:
+        if "duplicate" in str(e).lower() or "unique" in str(e).lower():
+            raise HTTPException(status_code=409, detail="Already liked")
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Comment liked", "like_count": comment_like_count(comment_id)}
+
+@router.delete("/comments/{comment_id}/like")
+def unlike_comment(comment_id: str, user_id: str = Depends(require_auth)):
+    """Unlike a comment"""
+    try:
+        supabase.table("comment_likes").delete().eq("comment_id", comment_id).eq("user_id", user_id).execute()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Comment unliked", "like_count": comment_like_count(comment_id)}
+
+def comment_like_count(comment_id: str) -> Optional[int]:
+    """like_count as updated by the comment_likes triggers; None if it can't be read."""
+    try:
+        rows = supabase.table("comments").select("like_count").eq("id", comment_id).limit(1).execute().data
+        return rows[0]["like_count"] if rows else None
+    except Exception:
+        return None
+
 # ==================== POLLS ====================
 
 @router.post("/{post_id}/poll/vote")
@@ -1,12 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Request, Response, BackgroundTasks
 from app.lib.supabase import supabase
 from app.lib.auth_helpers import check_username_availability
+from app.lib.search_backends import on_user_saved
+from app.lib.autocomplete import count_skill
+from app.lib.profile_cache import cached_profile_bundle, etag_matches, invalidate_profile
+from app.lib.identifiers import is_uuid, peek_user_id, remember_username, forget_username
+from app.lib.images import (
+    ImageTooLarge, read_limited, make_variants, content_path, has_variants, put_immutable, publish_profile_image
+)
 from app.middleware.auth import require_auth
 from app.models.profile import (
     ProfileUpdateRequest, ProfileResponse, PrivacySettingsUpdate,
     WorkExperienceCreate, WorkExperienceUpdate, WorkExperienceResponse,
     EducationCreate, EducationUpdate, EducationResponse,
-    SkillCreate, SkillResponse
+    SkillCreate, SkillResponse,
+    WorkExperienceBulk, EducationBulk, SkillsBulk, ProfileBulkChanges
 )
 from typing import List
 
@@ -14,50 +23,69 @@ router = APIRouter(prefix="/profile", tags=["Profile"])
 
 # ==================== PROFILE CRUD ====================
 
+PROFILE_BUNDLE_SELECT = "*, work_experience(*), education(*), skills:user_skills(*)"
+
+def load_profile_bundle(user_id: str = None, username: str = None):
+    """Users row with nested work experience, education and skills, or None if there is no such user.
+
+    One round-trip: the collections are embedded resources of the users row.
+    """
+    column, value = ("id", user_id) if user_id else ("username", username)
+    response = supabase.table("users").select(PROFILE_BUNDLE_SELECT).eq(column, value) \
+        .order("start_date", desc=True, foreign_table="work_experience") \
+        .order("start_date", desc=True, foreign_table="education") \
+        .limit(1).execute()
+    if not response.data:
+        return None
+    profile_data = response.data[0]
+    for collection in ("work_experience", "education", "skills"):
+        profile_data[collection] = profile_data.get(collection) or []
+    return profile_data
+
+def load_profile_collection(identifier: str, collection: str, order_by: str = None) -> list:
+    """One embedded users -> collection query by username or UUID; 404 if the user doesn't exist."""
+    query = supabase.table("users").select(f"id, {collection}(*)").eq("id" if is_uuid(identifier) else "username", identifier)
+    if order_by:
+        query = query.order(order_by, desc=True, foreign_table=collection)
+    rows = query.limit(1).execute().data
+    if not rows:
+        raise HTTPException(status_code=404, detail="User not found")
+    return rows[0].get(collection) or []
+
+def profile_bundle_response(user_id: str, request: Request, response: Response, not_found: str, cache_control: str, loader=None):
+    """Serve a cached profile bundle with an ETag; 304 when the client already has it."""
+    bundle, etag = cached_profile_bundle(user_id, loader or (lambda: load_profile_bundle(user_id=user_id)))
+    if bundle is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return bundle
+
 @router.get("/me")
-def get_my_profile(user_id: str = Depends(require_auth)):
+def get_my_profile(request: Request, response: Response, user_id: str = Depends(require_auth)):
     """Get current user's profile with nested work experience, education, and skills"""
     try:
-        response = supabase.table("users").select("*").eq("id", user_id).single().execute()
-        if not response.data:
-            raise HTTPException(status_code=404, detail="Profile not found")
-        profile_data = response.data
-        work_exp = supabase.table("work_experience").select("*").eq("user_id", user_id).order("start_date", desc=True).execute()
-        education = supabase.table("education").select("*").eq("user_id", user_id).order("start_date", desc=True).execute()
-        skills = supabase.table("user_skills").select("*").eq("user_id", user_id).execute()
-        profile_data["work_experience"] = work_exp.data or []
-        profile_data["education"] = education.data or []
-        profile_data["skills"] = skills.data or []
-        return profile_data
+        return profile_bundle_response(user_id, request, response, "Profile not found", "private, no-cache")
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=404, detail="Profile not found")
 
 @router.get("/{identifier}")
-def get_profile_by_username(identifier: str):
+def get_profile_by_username(identifier: str, request: Request, response: Response):
     """Get user profile by username or user UUID (public), with nested work experience, education, and skills"""
-    import re
-    uuid_pattern = re.compile(
-        r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$',
-        re.IGNORECASE
-    )
     try:
-        if uuid_pattern.match(identifier):
-            response = supabase.table("users").select("*").eq("id", identifier).single().execute()
-        else:
-            response = supabase.table("users").select("*").eq("username", identifier).single().execute()
-        if not response.data:
+        profile_user_id = peek_user_id(identifier)
+        if profile_user_id:
+            return profile_bundle_response(profile_user_id, request, response, "User not found", "public, no-cache")
+        # Unknown username: fetch the bundle by username in one query and learn the id from it
+        bundle = load_profile_bundle(username=identifier)
+        if not bundle:
             raise HTTPException(status_code=404, detail="User not found")
-        profile_data = response.data
-        profile_user_id = profile_data["id"]
-        work_exp = supabase.table("work_experience").select("*").eq("user_id", profile_user_id).order("start_date", desc=True).execute()
-        education = supabase.table("education").select("*").eq("user_id", profile_user_id).order("start_date", desc=True).execute()
-        skills = supabase.table("user_skills").select("*").eq("user_id", profile_user_id).execute()
-        profile_data["work_experience"] = work_exp.data or []
-        profile_data["education"] = education.data or []
-        profile_data["skills"] = skills.data or []
-        return profile_data
+        remember_username(identifier, bundle["id"])
+        return profile_bundle_response(bundle["id"], request, response, "User not found", "public, no-cache", loader=lambda: bundle)
     except HTTPException:
         raise
     except Exception as e:
@@ -101,6 +129,10 @@ def update_my_profile(payload: ProfileUpdateRequest, user_id: str = Depends(requ
         if not response.data:
             raise HTTPException(status_code=404, detail="Profile not found")
         
+        invalidate_profile(user_id)
+        if response.data[0].get("username") != current_username:
+            forget_username(current_username)
+        on_user_saved(response.data[0])
         return {"message": "Profile updated successfully", "data": response.data[0]}
     except HTTPException:
         raise
@@ -117,53 +149,48 @@ def update_my_profile(payload: ProfileUpdateRequest, user_id: str = Depends(requ
 ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif"}
 MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5 MB
 
-@router.post("/upload-avatar")
-async def upload_avatar(file: UploadFile = File(...), user_id: str = Depends(require_auth)):
-    """Upload a profile avatar image to Supabase Storage and update the user's avatar_url"""
+async def store_profile_image(file: UploadFile, user_id: str, kind: str, background_tasks: BackgroundTasks) -> dict:
+    """Stream an avatar/cover upload into Storage under a content-addressed key, with its WebP variants.
+
+    Writes {kind}_url and {kind}_variants ({size: url}) on the user row and returns them.
+    Storage and table calls are blocking, so they run in a thread; only the resizing
+    itself is awaited on the loop (it runs in the image worker pool).
+    """
     if file.content_type not in ALLOWED_IMAGE_TYPES:
         raise HTTPException(status_code=400, detail="Only JPEG, PNG, WebP and GIF images are allowed")
-    contents = await file.read()
-    if len(contents) > MAX_IMAGE_SIZE:
+    try:
+        contents = await read_limited(file, MAX_IMAGE_SIZE)
+    except ImageTooLarge:
         raise HTTPException(status_code=400, detail="Image must be smaller than 5 MB")
     ext = file.filename.rsplit(".", 1)[-1].lower() if file.filename and "." in file.filename else "jpg"
-    path = f"{user_id}/avatar.{ext}"
+    path = content_path(user_id, contents, ext)
+    storage = supabase.storage.from_(f"{kind}s")
+    try:
+        # Identical bytes were already validated and resized by an earlier upload
+        cached = await asyncio.to_thread(has_variants, storage, path, kind)
+        variants = None if cached else await make_variants(contents, kind)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="File is not a readable image")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not process image: {str(e)}")
     try:
-        # upsert=True replaces existing file
-        supabase.storage.from_("avatars").upload(path, contents, {"content-type": file.content_type, "upsert": "true"})
+        await asyncio.to_thread(put_immutable, storage, path, contents, file.content_type)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Storage upload failed: {str(e)}")
-    public_url = supabase.storage.from_("avatars").get_public_url(path)
-    # append cache-bust so the browser refreshes the image
-    import time
-    public_url = f"{public_url}?t={int(time.time())}"
     try:
-        supabase.table("users").update({"avatar_url": public_url}).eq("id", user_id).execute()
+        return await asyncio.to_thread(publish_profile_image, user_id, kind, path, variants, background_tasks)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save avatar URL: {str(e)}")
-    return {"avatar_url": public_url}
+        raise HTTPException(status_code=500, detail=f"Failed to save {kind} URL: {str(e)}")
+
+@router.post("/upload-avatar")
+async def upload_avatar(background_tasks: BackgroundTasks, file: UploadFile = File(...), user_id: str = Depends(require_auth)):
+    """Upload a profile avatar image to Supabase Storage and update the user's avatar_url"""
+    return await store_profile_image(file, user_id, "avatar", background_tasks)
 
 @router.post("/upload-cover")
-async def upload_cover(file: UploadFile = File(...), user_id: str = Depends(require_auth)):
+async def upload_cover(background_tasks: BackgroundTasks, file: UploadFile = File(...), user_id: str = Depends(require_auth)):
     """Upload a cover image to Supabase Storage and update the user's cover_url"""
-    if file.content_type not in ALLOWED_IMAGE_TYPES:
-        raise HTTPException(status_code=400, detail="Only JPEG, PNG, WebP and GIF images are allowed")
-    contents = await file.read()
-    if len(contents) > MAX_IMAGE_SIZE:
-        raise HTTPException(status_code=400, detail="Image must be smaller than 5 MB")
-    ext = file.filename.rsplit(".", 1)[-1].lower() if file.filename and "." in file.filename else "jpg"
-    path = f"{user_id}/cover.{ext}"
-    try:
-        supabase.storage.from_("covers").upload(path, contents, {"content-type": file.content_type, "upsert": "true"})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Storage upload failed: {str(e)}")
-    public_url = supabase.storage.from_("covers").get_public_url(path)
-    import time
-    public_url = f"{public_url}?t={int(time.time())}"
-    try:
-        supabase.table("users").update({"cover_url": public_url}).eq("id", user_id).execute()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save cover URL: {str(e)}")
-    return {"cover_url": public_url}
+    return await store_profile_image(file, user_id, "cover", background_tasks)
 
 @router.put("/privacy")
 def update_privacy_settings(payload: PrivacySettingsUpdate, user_id: str = Depends(require_auth)):
@@ -175,6 +202,7 @@ def update_privacy_settings(payload: PrivacySettingsUpdate, user_id: str = Depen
             raise HTTPException(status_code=400, detail="No settings to update")
         
         response = supabase.table("users").update(update_data).eq("id", user_id).execute()
+        invalidate_profile(user_id)
         
         return {"message": "Privacy settings updated", "data": response.data[0]}
     except Exception as e:
@@ -195,13 +223,9 @@ def get_work_experience(user_id: str = Depends(require_auth)):
 def get_user_work_experience(username: str):
     """Get work experience for a specific user by username"""
     try:
-        # First get user_id from username
-        user_response = supabase.table("users").select("id").eq("username", username).single().execute()
-        if not user_response.data:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        response = supabase.table("work_experience").select("*").eq("user_id", user_response.data["id"]).order("start_date", desc=True).execute()
-        return response.data
+        return load_profile_collection(username, "work_experience", "start_date")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -217,6 +241,7 @@ def create_work_experience(payload: WorkExperienceCreate, user_id: str = Depends
                 data[field] = data[field].isoformat()
         
         response = supabase.table("work_experience").insert(data).execute()
+        invalidate_profile(user_id)
         return {"message": "Work experience added", "data": response.data[0]}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -244,6 +269,7 @@ def update_work_experience(experience_id: str, payload: WorkExperienceUpdate, us
             raise HTTPException(status_code=403, detail="Not authorized")
         
         response = supabase.table("work_experience").update(update_data).eq("id", experience_id).execute()
+        invalidate_profile(user_id)
         return {"message": "Work experience updated", "data": response.data[0]}
     except HTTPException:
         raise
@@ -260,6 +286,7 @@ def delete_work_experience(experience_id: str, user_id: str = Depends(require_au
             raise HTTPException(status_code=403, detail="Not authorized")
         
         supabase.table("work_experience").delete().eq("id", experience_id).execute()
+        invalidate_profile(user_id)
         return {"message": "Work experience deleted"}
     except HTTPException:
         raise
@@ -281,13 +308,9 @@ def get_education(user_id: str = Depends(require_auth)):
 def get_user_education(username: str):
     """Get education for a specific user by username"""
     try:
-        # First get user_id from username
-        user_response = supabase.table("users").select("id").eq("username", username).single().execute()
-        if not user_response.data:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        response = supabase.table("education").select("*").eq("user_id", user_response.data["id"]).order("start_date", desc=True).execute()
-        return response.data
+        return load_profile_collection(username, "education", "start_date")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -303,6 +326,7 @@ def create_education(payload: EducationCreate, user_id: str = Depends(require_au
                 data[field] = data[field].isoformat()
         
         response = supabase.table("education").insert(data).execute()
+        invalidate_profile(user_id)
         return {"message": "Education added", "data": response.data[0]}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -330,6 +354,7 @@ def update_education(education_id: str, payload: EducationUpdate, user_id: str =
             raise HTTPException(status_code=403, detail="Not authorized")
         
         response = supabase.table("education").update(update_data).eq("id", education_id).execute()
+        invalidate_profile(user_id)
         return {"message": "Education updated", "data": response.data[0]}
     except HTTPException:
         raise
@@ -346,6 +371,7 @@ def delete_education(education_id: str, user_id: str = Depends(require_auth)):
             raise HTTPException(status_code=403, detail="Not authorized")
         
         supabase.table("education").delete().eq("id", education_id).execute()
+        invalidate_profile(user_id)
         return {"message": "Education deleted"}
     except HTTPException:
         raise
@@ -367,13 +393,9 @@ def get_skills(user_id: str = Depends(require_auth)):
 def get_user_skills(username: str):
     """Get skills for a specific user by username"""
     try:
-        # First get user_id from username
-        user_response = supabase.table("users").select("id").eq("username", username).single().execute()
-        if not user_response.data:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        response = supabase.table("user_skills").select("*").eq("user_id", user_response.data["id"]).execute()
-        return response.data
+        return load_profile_collection(username, "user_skills")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -388,6 +410,8 @@ def add_skill(payload: SkillCreate, user_id: str = Depends(require_auth)):
         }
         
         response = supabase.table("user_skills").insert(data).execute()
+        invalidate_profile(user_id)
+        count_skill(data["skill"], 1)
         return {"message": "Skill added", "data": response.data[0]}
     except Exception as e:
         # Check for unique constraint violation
@@ -400,13 +424,115 @@ def delete_skill(skill_id: str, user_id: str = Depends(require_auth)):
     """Delete a skill"""
     try:
         # Verify ownership
-        check = supabase.table("user_skills").select("user_id").eq("id", skill_id).single().execute()
+        check = supabase.table("user_skills").select("user_id, skill").eq("id", skill_id).single().execute()
         if not check.data or check.data["user_id"] != user_id:
             raise HTTPException(status_code=403, detail="Not authorized")
         
         supabase.table("user_skills").delete().eq("id", skill_id).execute()
+        invalidate_profile(user_id)
+        count_skill(check.data.get("skill"), -1)
         return {"message": "Skill deleted"}
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+# ==================== BULK CHANGES ====================
+
+def _iso_dates(data: dict) -> dict:
+    from datetime import date as date_type
+    for field in ("start_date", "end_date"):
+        if isinstance(data.get(field), date_type):
+            data[field] = data[field].isoformat()
+    return data
+
+def _bulk_update_item(item) -> dict:
+    """Same rules as the single-item PUTs: drop unset fields, clear end_date when is_current."""
+    data = {k: v for k, v in item.dict().items() if v is not None}
+    if item.is_current:
+        data["end_date"] = None
+    return _iso_dates(data)
+
+def _dated_collection_changes(bulk) -> dict:
+    return {
+        "create": [_iso_dates(item.dict()) for item in bulk.create],
+        "update": [_bulk_update_item(item) for item in bulk.update],
+        "delete": bulk.delete,
+    }
+
+def _skills_changes(bulk: SkillsBulk) -> dict:
+    return {"create": [item.skill.lower().strip() for item in bulk.create], "delete": bulk.delete}
+
+def apply_profile_changes(user_id: str, changes: dict) -> dict:
+    """Apply a batch of collection changes in one transaction (apply_profile_changes RPC, migration 18).
+
+    Returns the user's work_experience, education and skills after the batch.
+    """
+    if not any(any(ops.values()) for ops in changes.values()):
+        raise HTTPException(status_code=400, detail="No changes to apply")
+    try:
+        result = supabase.rpc("apply_profile_changes", {"target_user_id": user_id, "changes": changes}).execute().data or {}
+    except Exception as e:
+        if "not authorized" in str(e).lower():
+            raise HTTPException(status_code=403, detail="Not authorized")
+        raise
+    invalidate_profile(user_id)
+    for skill in result.get("added_skills") or []:
+        count_skill(skill, 1)
+    for skill in result.get("removed_skills") or []:
+        count_skill(skill, -1)
+    return result
+
+@router.post("/bulk")
+def apply_bulk_profile_changes(payload: ProfileBulkChanges, user_id: str = Depends(require_auth)):
+    """Create, update and delete work experience, education and skills in one request"""
+    try:
+        changes = {}
+        if payload.work_experience:
+            changes["work_experience"] = _dated_collection_changes(payload.work_experience)
+        if payload.education:
+            changes["education"] = _dated_collection_changes(payload.education)
+        if payload.skills:
+            changes["skills"] = _skills_changes(payload.skills)
+        result = apply_profile_changes(user_id, changes)
+        return {
+            "message": "Profile changes applied",
+            "data": {k: result.get(k) or [] for k in ("work_experience", "education", "skills")},
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/work-experience/bulk")
+def bulk_work_experience(payload: WorkExperienceBulk, user_id: str = Depends(require_auth)):
+    """Create, update and delete work experience entries in one request"""
+    try:
+        result = apply_profile_changes(user_id, {"work_experience": _dated_collection_changes(payload)})
+        return {"message": "Work experience updated", "data": result.get("work_experience") or []}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/education/bulk")
+def bulk_education(payload: EducationBulk, user_id: str = Depends(require_auth)):
+    """Create, update and delete education entries in one request"""
+    try:
+        result = apply_profile_changes(user_id, {"education": _dated_collection_changes(payload)})
+        return {"message": "Education updated", "data": result.get("education") or []}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/skills/bulk")
+def bulk_skills(payload: SkillsBulk, user_id: str = Depends(require_auth)):
+    """Add and delete skills in one request"""
+    try:
+        result = apply_profile_changes(user_id, {"skills": _skills_changes(payload)})
+        return {"message": "Skills updated", "data": result.get("skills") or []}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,50 +1,259 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
 from app.lib.supabase import supabase
 from app.middleware.auth import require_auth
+from app.lib.cursors import encode_cursor, decode_cursor
+from app.lib.autocomplete import user_suggestions, skill_suggestions
+from app.lib.cache import TTLCache
+from app.lib.tags import normalize_tag
+from app.lib.search_backends import search_backend
+from app.lib.identifiers import resolve_user_id
+from app.models.post import PostType
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from collections import Counter
+import asyncio
+import logging
+import os
 from typing import List, Optional
+from uuid import UUID
 
 router = APIRouter(prefix="/search", tags=["Search"])
 
+AUTHOR_FIELDS = "id, username, first_name, last_name, avatar_url"
+
+# Shared pool for running independent search legs concurrently
+_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="search")
+
+# Popular queries repeat constantly; results are viewer-agnostic so one entry serves everyone.
+search_cache = TTLCache(
+    maxsize=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "30")),
+)
+
+# Trending is global and changes slowly: one entry holding the top TRENDING_MAX posts
+# serves every `limit`, and keep_trending_fresh() rewrites it before it expires.
+TRENDING_MAX = 20
+TRENDING_REFRESH_SECONDS = int(os.getenv("TRENDING_REFRESH_SECONDS", "60"))
+TRENDING_PRUNE_EVERY = 60  # refresh cycles between prune_post_trending() calls
+
+# Search cache hit ratios are logged once per trending refresh cycle. uvicorn's logger
+# has an INFO handler by default; the root logger (which logging.info uses) does not.
+stats_logger = logging.getLogger("uvicorn.error")
+trending_cache = TTLCache(maxsize=64, ttl=TRENDING_REFRESH_SECONDS * 2)
+
+def normalize_query(q: str) -> str:
+    """Lowercase and collapse whitespace so "Jane  Doe" and "jane doe" share a cache entry."""
+    return " ".join(q.lower().split())
+
+def attach_authors(posts: list) -> list:
+    """Set post["author"] for every post using a single `users ... in_(ids)` query."""
+    author_ids = list({p["author_id"] for p in posts if p.get("author_id")})
+    if not author_ids:
+        return posts
+    authors = supabase.table("users").select(AUTHOR_FIELDS).in_("id", author_ids).execute()
+    authors_map = {a["id"]: a for a in (authors.data or [])}
+    for post in posts:
+        post["author"] = authors_map.get(post.get("author_id"))
+    return posts
+
+def load_trending_posts() -> list:
+    """Top posts by decayed engagement score (get_trending_posts RPC, migration 13).
+
+    Falls back to all-time like_count when the RPC is missing or nothing has been
+    engaged with in the window, so the trending panel is never empty.
+    """
+    try:
+        posts = supabase.rpc("get_trending_posts", {"days_ago": 7, "result_limit": TRENDING_MAX}).execute().data or []
+    except Exception as e:
+        print(f"get_trending_posts RPC failed, falling back to like_count: {e}")
+        posts = []
+    if not posts:
+        posts = supabase.table("posts").select("*").eq("is_published", True).eq("is_draft", False).eq("visibility", "public").order("like_count", desc=True).order("comment_count", desc=True).limit(TRENDING_MAX).execute().data or []
+    return attach_authors(posts)
+
+async def keep_trending_fresh(interval: int = TRENDING_REFRESH_SECONDS):
+    """Refresh the trending cache ahead of expiry, periodically prune stale scores and
+    log this worker's search cache stats."""
+    cycle = 0
+    while True:
+        try:
+            trending_cache.set("posts", await asyncio.to_thread(load_trending_posts))
+            if cycle % TRENDING_PRUNE_EVERY == 0:
+                await asyncio.to_thread(lambda: supabase.rpc("prune_post_trending", {}).execute())
+        except Exception as e:
+            logging.warning(f"Failed to refresh trending posts (non-fatal): {e}")
+        stats_logger.info(f"search cache (pid {os.getpid()}, {search_backend.name}): {search_cache.stats()}")
+        cycle += 1
+        await asyncio.sleep(interval)
+
+def cached_user_search(q: str, limit: int) -> list:
+    q = normalize_query(q)
+    return search_cache.get_or_set(("users", q, limit), lambda: search_backend.search_users(q, limit))
+
+def cached_post_search(q: str, limit: int, cursor: Optional[str] = None):
+    """Post search with authors attached, cached per (normalized query, limit, cursor)."""
+    q = normalize_query(q)
+
+    def load():
+        posts, next_cursor = search_backend.search_posts(q, limit, cursor)
+        return attach_authors(posts), next_cursor
+
+    return search_cache.get_or_set(("posts", q, limit, cursor), load)
+
+FACET_FILTERS = ("industry", "company", "position", "skill")
+FACET_LIMIT = 10
+FACET_FALLBACK_SAMPLE = 500
+
+def search_users_faceted(q: str, filters: dict, limit: int, cursor: Optional[str] = None) -> dict:
+    """Filtered people search plus facet counts in one round-trip (search_users_faceted RPC, migration 15).
+
+    Returns {"results", "total", "facets", "next_cursor"}. If the RPC isn't deployed, falls
+    back to a filtered ilike query over a bounded sample; facets and total then only
+    describe that sample and there is no next page.
+    """
+    params = {
+        "search_query": q or None,
+        "industry_filter": filters.get("industry"),
+        "company_filter": filters.get("company"),
+        "position_filter": filters.get("position"),
+        "skill_filter": filters.get("skill"),
+        "result_limit": limit,
+        "facet_limit": FACET_LIMIT,
+    }
+    if cursor:
+        params["cursor_score"], params["cursor_id"] = decode_cursor(cursor, 2)
+    try:
+        data = supabase.rpc("search_users_faceted", params).execute().data or {}
+        results = data.get("results") or []
+        next_cursor = encode_cursor(results[-1]["score"], results[-1]["id"]) if len(results) == limit else None
+        return {"results": results, "total": data.get("total", len(results)), "facets": data.get("facets") or {"industry": [], "company": []}, "next_cursor": next_cursor}
+    except Exception as e:
+        print(f"search_users_faceted RPC failed, falling back to ilike: {e}")
+    if cursor:
+        return {"results": [], "total": 0, "facets": {"industry": [], "company": []}, "next_cursor": None}
+
+    fields = "id, username, first_name, last_name, avatar_url, headline, current_position, current_company, industry"
+    query = supabase.table("users").select(fields + (", user_skills!inner(skill)" if filters.get("skill") else "")).eq("is_active", True)
+    if q:
+        search_term = f"%{q}%"
+        query = query.or_(f"username.ilike.{search_term},first_name.ilike.{search_term},last_name.ilike.{search_term},headline.ilike.{search_term}")
+    if filters.get("industry"):
+        query = query.ilike("industry", filters["industry"])
+    if filters.get("company"):
+        query = query.ilike("current_company", filters["company"])
+    if filters.get("position"):
+        query = query.ilike("current_position", f"%{filters['position']}%")
+    if filters.get("skill"):
+        query = query.eq("user_skills.skill", filters["skill"])
+    rows = query.limit(FACET_FALLBACK_SAMPLE).execute().data or []
+    for row in rows:
+        row.pop("user_skills", None)
+
+    def facet(field):
+        # Same buckets as the RPC: case/space variants count together under one spelling
+        values = [r[field].strip() for r in rows if (r.get(field) or "").strip()]
+        counts = Counter(v.lower() for v in values)
+        display = {}
+        for v in values:
+            display[v.lower()] = min(display.get(v.lower(), v), v)
+        buckets = sorted(((display[k], c) for k, c in counts.items()), key=lambda vc: (-vc[1], vc[0]))
+        return [{"value": v, "count": c} for v, c in buckets[:FACET_LIMIT]]
+
+    return {"results": rows[:limit], "total": len(rows), "facets": {"industry": facet("industry"), "company": facet("current_company")}, "next_cursor": None}
+
 @router.get("/users")
 def search_users(
-    q: str = Query(..., min_length=1, max_length=100),
+    q: Optional[str] = Query(None, min_length=1, max_length=100),
     user_id: Optional[str] = Depends(require_auth),
-    limit: int = Query(20, ge=1, le=50)
+    limit: int = Query(20, ge=1, le=50),
+    industry: Optional[str] = Query(None, max_length=100),
+    company: Optional[str] = Query(None, max_length=100),
+    position: Optional[str] = Query(None, max_length=100),
+    skill: Optional[str] = Query(None, max_length=100),
+    facets: bool = False,
+    cursor: Optional[str] = Query(None, max_length=200)
 ):
-    """Search for users by name, username, or headline"""
+    """Search for users by name, username, or headline (fuzzy, ranked by similarity).
+
+    Any of industry/company/position/skill (or facets=true) switches to faceted search:
+    matches are filtered server-side and the response adds `total`, `facets` (top
+    industries and companies among all matches) and a keyset `next_cursor`.
+    """
+    filters = {name: " ".join(value.lower().split()) for name, value in
+               zip(FACET_FILTERS, (industry, company, position, skill)) if value and value.strip()}
     try:
-        # Search in multiple fields
-        search_term = f"%{q}%"
-        
-        # Use ilike for case-insensitive search
-        results = supabase.table("users").select(
-            "id, username, first_name, last_name, avatar_url, headline, current_position, current_company, industry"
-        ).or_(
-            f"username.ilike.{search_term},first_name.ilike.{search_term},last_name.ilike.{search_term},headline.ilike.{search_term}"
-        ).eq("is_active", True).limit(limit).execute()
-        
-        return {"results": results.data, "count": len(results.data)}
+        if filters or facets or cursor:
+            q = normalize_query(q or "")
+            if not q and not filters:
+                raise HTTPException(status_code=400, detail="Provide a query or at least one filter")
+            key = ("users_faceted", q, tuple(sorted(filters.items())), limit, cursor)
+            result = search_cache.get_or_set(key, lambda: search_users_faceted(q, filters, limit, cursor))
+            return {**result, "count": len(result["results"])}
+        if not q or not q.strip():
+            raise HTTPException(status_code=400, detail="Provide a query or at least one filter")
+        results = cached_user_search(q, limit)
+        return {"results": results, "count": len(results)}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def cached_filtered_post_search(q: str, limit: int, cursor: Optional[str], filters: dict):
+    """Filtered post search with authors attached; returns (posts, next_cursor, type_counts)."""
+    q = normalize_query(q)
+
+    def load():
+        posts, next_cursor, type_counts = search_backend.search_posts_filtered(q, limit, cursor, filters)
+        return attach_authors(posts), next_cursor, type_counts
+
+    return search_cache.get_or_set(("posts_filtered", q, limit, cursor, tuple(sorted(filters.items()))), load)
+
+def to_utc_naive(value: datetime) -> str:
+    """posts.created_at / scheduled_at are naive UTC TIMESTAMPs; compare like with like."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
 @router.get("/posts")
 def search_posts(
     q: str = Query(..., min_length=1, max_length=100),
     user_id: Optional[str] = Depends(require_auth),
-    limit: int = Query(20, ge=1, le=50)
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None, max_length=200),
+    post_type: Optional[PostType] = None,
+    author: Optional[str] = Query(None, min_length=1, max_length=100),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    has_media: Optional[bool] = None
 ):
-    """Search for posts by content"""
+    """Search for posts by content (ranked full-text search, keyset-paginated via `cursor`).
+
+    Optional filters: post_type, author (username or user id), since/until (created_at
+    range) and has_media. When any is set the response adds `type_counts`: matches per
+    post type with every filter except post_type applied.
+    """
     try:
-        search_term = f"%{q}%"
-        
-        results = supabase.table("posts").select("*").ilike("content", search_term).eq("is_published", True).eq("is_draft", False).eq("visibility", "public").order("created_at", desc=True).limit(limit).execute()
-        
-        # Enrich with author info
-        for post in results.data:
-            author = supabase.table("users").select("id, username, first_name, last_name, avatar_url").eq("id", post["author_id"]).single().execute()
-            post["author"] = author.data if author.data else None
-        
-        return {"results": results.data, "count": len(results.data)}
+        filters = {}
+        if post_type:
+            filters["post_type"] = post_type.value
+        if author:
+            filters["author_id"] = resolve_user_id(author.strip().lstrip("@"))
+            if not filters["author_id"]:
+                raise HTTPException(status_code=404, detail="Author not found")
+        if since:
+            filters["since"] = to_utc_naive(since)
+        if until:
+            filters["until"] = to_utc_naive(until)
+        if has_media is not None:
+            filters["has_media"] = has_media
+
+        if filters:
+            posts, next_cursor, type_counts = cached_filtered_post_search(q, limit, cursor, filters)
+            return {"results": posts, "count": len(posts), "next_cursor": next_cursor, "type_counts": type_counts}
+        posts, next_cursor = cached_post_search(q, limit, cursor)
+        return {"results": posts, "count": len(posts), "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -57,26 +266,18 @@ def search_all(
 ):
     """Search across users and posts"""
     try:
-        search_term = f"%{q}%"
+        # Users and posts legs are independent — run the users leg on the pool
+        # while this thread searches posts and hydrates their authors.
+        # Each leg shares cache entries with /search/users and /search/posts.
+        users_future = _search_pool.submit(cached_user_search, q, users_limit)
         
-        # Search users
-        users = supabase.table("users").select(
-            "id, username, first_name, last_name, avatar_url, headline, current_position, current_company"
-        ).or_(
-            f"username.ilike.{search_term},first_name.ilike.{search_term},last_name.ilike.{search_term},headline.ilike.{search_term}"
-        ).eq("is_active", True).limit(users_limit).execute()
+        posts, posts_cursor = cached_post_search(q, posts_limit)
         
-        # Search posts
-        posts = supabase.table("posts").select("*").ilike("content", search_term).eq("is_published", True).eq("is_draft", False).eq("visibility", "public").order("created_at", desc=True).limit(posts_limit).execute()
-        
-        # Enrich posts with author info
-        for post in posts.data:
-            author = supabase.table("users").select("id, username, first_name, last_name, avatar_url").eq("id", post["author_id"]).single().execute()
-            post["author"] = author.data if author.data else None
+        users = users_future.result()
         
         return {
-            "users": {"results": users.data, "count": len(users.data)},
-            "posts": {"results": posts.data, "count": len(posts.data)}
+            "users": {"results": users, "count": len(users)},
+            "posts": {"results": posts, "count": len(posts), "next_cursor": posts_cursor}
         }
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -87,6 +288,9 @@ def get_search_suggestions(
     limit: int = Query(5, ge=1, le=10)
 ):
     """Get search suggestions (autocomplete)"""
+    # Served from the in-memory prefix index once it has been built at startup
+    if user_suggestions.ready:
+        return {"suggestions": user_suggestions.search(q, limit)}
     try:
         search_term = f"{q}%"  # Prefix search for autocomplete
         
@@ -109,31 +313,110 @@ def get_search_suggestions(
 
 @router.get("/trending")
 def get_trending(limit: int = Query(10, ge=1, le=20)):
-    """Get trending topics/posts (simplified version)"""
+    """Get trending topics/posts, ranked by time-decayed engagement"""
     try:
-        # Get posts with most engagement in last 7 days
-        # Simple version: most likes + comments + reposts
-        posts = supabase.rpc("get_trending_posts", {"days_ago": 7, "result_limit": limit}).execute()
-        
-        # If RPC doesn't exist, fallback to simple query
-        if not posts.data:
-            posts = supabase.table("posts").select("*").eq("is_published", True).eq("is_draft", False).eq("visibility", "public").order("like_count", desc=True).order("comment_count", desc=True).limit(limit).execute()
-        
-        # Enrich with author info
-        for post in posts.data:
-            author = supabase.table("users").select("id, username, first_name, last_name, avatar_url").eq("id", post["author_id"]).single().execute()
-            post["author"] = author.data if author.data else None
-        
-        return {"trending": posts.data}
+        posts = trending_cache.get_or_set("posts", load_trending_posts)
     except Exception as e:
-        # Fallback if RPC doesn't exist
+        raise HTTPException(status_code=400, detail="Error fetching trending posts")
+    try:
+        topics = load_top_tags(24, limit)
+    except Exception as e:
+        print(f"Warning: trending topics unavailable: {e}")
+        topics = []
+    return {"trending": posts[:limit], "topics": topics}
+
+def load_top_tags(hours: int, limit: int, kind: str = "hashtag") -> list:
+    """Top tags over a sliding window, summed from hourly buckets (get_top_tags RPC, migration 14)."""
+    return trending_cache.get_or_set(
+        ("tags", kind, hours, limit),
+        lambda: supabase.rpc("get_top_tags", {"window_hours": hours, "result_limit": limit, "tag_kind": kind}).execute().data or []
+    )
+
+@router.get("/tags/trending")
+def get_trending_tags(
+    hours: int = Query(24, ge=1, le=168),
+    limit: int = Query(10, ge=1, le=50),
+    kind: str = Query("hashtag", pattern="^(hashtag|mention)$")
+):
+    """Most used hashtags (or mentions) over the last `hours` hours"""
+    try:
+        return {"tags": load_top_tags(hours, limit, kind), "hours": hours}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/tags/{tag}/posts")
+def get_posts_by_tag(
+    tag: str,
+    user_id: Optional[str] = Depends(require_auth),
+    kind: str = Query("hashtag", pattern="^(hashtag|mention)$"),
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None, max_length=200)
+):
+    """Public posts carrying a hashtag or mention, newest first (keyset-paginated via `cursor`)"""
+    tag = normalize_tag(tag)
+    if not tag:
+        raise HTTPException(status_code=400, detail="Tag cannot be empty")
+    params = {"search_tag": tag, "tag_kind": kind, "result_limit": limit}
+    if cursor:
         try:
-            posts = supabase.table("posts").select("*").eq("is_published", True).eq("is_draft", False).eq("visibility", "public").order("like_count", desc=True).limit(limit).execute()
-            
-            for post in posts.data:
-                author = supabase.table("users").select("id, username, first_name, last_name, avatar_url").eq("id", post["author_id"]).single().execute()
-                post["author"] = author.data if author.data else None
-            
-            return {"trending": posts.data}
-        except:
-            raise HTTPException(status_code=400, detail="Error fetching trending posts")
+            params["cursor_created_at"], params["cursor_id"] = decode_cursor(cursor, 2)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        posts = supabase.rpc("get_posts_by_tag", params).execute().data or []
+        attach_authors(posts)
+        next_cursor = encode_cursor(posts[-1]["tagged_at"], posts[-1]["id"]) if len(posts) == limit else None
+        return {"tag": tag, "results": posts, "count": len(posts), "next_cursor": next_cursor}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ==================== SKILL DIRECTORY ====================
+
+SKILL_USER_FIELDS = "id, username, first_name, last_name, avatar_url, headline, current_position, current_company"
+
+@router.get("/skills")
+def get_skill_suggestions(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=20)
+):
+    """Skill-name autocomplete with the number of people listing each skill"""
+    if skill_suggestions.ready:
+        return {"suggestions": skill_suggestions.search(q, limit)}
+    try:
+        rows = supabase.table("skills").select("skill, user_count").ilike("skill", f"{q.lower().strip()}%") \
+            .order("user_count", desc=True).limit(limit).execute().data or []
+        return {"suggestions": [{"type": "skill", "text": r["skill"], "user_count": r["user_count"]} for r in rows]}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/skills/{skill}/users")
+def get_users_by_skill(
+    skill: str,
+    user_id: Optional[str] = Depends(require_auth),
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None, max_length=200)
+):
+    """Active users listing a skill, most endorsed first (keyset-paginated via `cursor`)"""
+    skill = skill.lower().strip()
+    if not skill:
+        raise HTTPException(status_code=400, detail="Skill cannot be empty")
+    try:
+        # One range scan of idx_user_skills_skill_endorsements (migration 16) with the user embedded
+        query = supabase.table("user_skills").select(f"user_id, endorsement_count, user:users!inner({SKILL_USER_FIELDS})") \
+            .eq("skill", skill).eq("user.is_active", True)
+        if cursor:
+            try:
+                last_count, last_user_id = decode_cursor(cursor, 2)
+                last_count, last_user_id = int(last_count), str(UUID(str(last_user_id)))
+            except (ValueError, TypeError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            query = query.or_(f"endorsement_count.lt.{last_count},and(endorsement_count.eq.{last_count},user_id.gt.{last_user_id})")
+        rows = query.order("endorsement_count", desc=True).order("user_id").limit(limit).execute().data or []
+
+        results = [{**row["user"], "endorsement_count": row.get("endorsement_count") or 0} for row in rows if row.get("user")]
+        next_cursor = encode_cursor(rows[-1].get("endorsement_count") or 0, rows[-1]["user_id"]) if len(rows) == limit else None
+        return {"skill": skill, "results": results, "count": len(results), "next_cursor": next_cursor}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
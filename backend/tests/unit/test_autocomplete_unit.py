@@ -0,0 +1,64 @@
+from app.lib.autocomplete import PrefixIndex, normalize_text, index_user, user_suggestions, count_skill, skill_suggestions
+
+
+def test_normalize_text_strips_accents_and_whitespace():
+    assert normalize_text("  José   Díaz ") == "jose diaz"
+    assert normalize_text(None) == ""
+
+
+def test_prefix_search_orders_by_weight():
+    index = PrefixIndex()
+    index.bulk_load([
+        ("u1", ["janedoe", "Jane Doe"], {"username": "janedoe"}, 3),
+        ("u2", ["janet", "Janet Smith"], {"username": "janet"}, 10),
+        ("u3", ["bob", "Bob Jones"], {"username": "bob"}, 50),
+    ])
+
+    results = index.search("jan", 5)
+
+    assert [r["username"] for r in results] == ["janet", "janedoe"]
+    assert index.ready is True
+
+
+def test_prefix_search_matches_full_name_once_per_entry():
+    index = PrefixIndex()
+    index.bulk_load([("u1", ["jdoe", "Jane Doe", "Doe"], {"username": "jdoe"}, 0)])
+
+    assert [r["username"] for r in index.search("jane d", 5)] == ["jdoe"]
+    assert [r["username"] for r in index.search("doe", 5)] == ["jdoe"]
+    assert index.search("x", 5) == []
+
+
+def test_upsert_replaces_old_keys_and_remove_drops_entry():
+    index = PrefixIndex()
+    index.upsert("u1", ["oldname"], {"username": "oldname"})
+    index.upsert("u1", ["newname"], {"username": "newname"})
+
+    assert index.search("old", 5) == []
+    assert [r["username"] for r in index.search("new", 5)] == ["newname"]
+
+    index.remove("u1")
+    assert index.search("new", 5) == []
+    assert len(index) == 0
+
+
+def test_index_user_removes_inactive_users():
+    index_user({"id": "user-x", "username": "zzqtest", "first_name": "Zed", "last_name": "Q"})
+    assert [r["username"] for r in user_suggestions.search("zzq", 5)] == ["zzqtest"]
+
+    index_user({"id": "user-x", "username": "zzqtest", "is_active": False})
+    assert user_suggestions.search("zzq", 5) == []
+
+
+def test_count_skill_tracks_user_counts():
+    skill_suggestions.bulk_load([("zzpython", ["zzpython"], {"type": "skill", "text": "zzpython", "user_count": 2}, 2)])
+
+    count_skill("zzpython", 1)
+    count_skill("zzpytorch", 1)
+    assert skill_suggestions.search("zzpy", 5) == [
+        {"type": "skill", "text": "zzpython", "user_count": 3},
+        {"type": "skill", "text": "zzpytorch", "user_count": 1},
+    ]
+
+    count_skill("zzpytorch", -1)
+    assert [r["text"] for r in skill_suggestions.search("zzpy", 5)] == ["zzpython"]
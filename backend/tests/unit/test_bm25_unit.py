@@ -0,0 +1,58 @@
+from app.lib.bm25 import BM25Index, tokenize
+
+DOCS = {
+    "p1": "Raising a seed round for our climate startup",
+    "p2": "Climate tech investors: what they look for in a seed deck",
+    "p3": "Hiring a backend engineer (Python, Postgres)",
+    "p4": "Notes from the café: résumé tips for engineers",
+}
+
+def build():
+    index = BM25Index()
+    for key, text in DOCS.items():
+        index.add(key, text, {"author_id": key.upper()})
+    return index
+
+def test_tokenize_folds_case_accents_and_stopwords():
+    assert tokenize("The Café, a RÉSUMÉ!") == ["cafe", "resume"]
+
+def test_search_ranks_by_bm25_and_pages_with_keyset():
+    index = build()
+
+    hits = index.search("climate seed", limit=10)
+    assert [key for _, key, _ in hits][:2] in (["p1", "p2"], ["p2", "p1"])
+    assert hits[0][0] >= hits[1][0]
+    assert index.search("resume", limit=10)[0][1:] == ("p4", {"author_id": "P4"})
+
+    first = index.search("climate seed", limit=1)
+    second = index.search("climate seed", limit=1, after=(first[0][0], first[0][1]))
+    assert {first[0][1], second[0][1]} == {"p1", "p2"}
+
+def test_update_and_remove_tombstone_old_postings():
+    index = build()
+
+    index.add("p3", "Hiring a designer")
+    index.remove("p1")
+
+    assert index.search("python postgres", limit=10) == []
+    assert [key for _, key, _ in index.search("climate", limit=10)] == ["p2"]
+    assert len(index) == 3
+    index.compact()
+    assert index.dead_ratio == 0
+    assert [key for _, key, _ in index.search("designer", limit=10)] == ["p3"]
+
+def test_snapshot_round_trip_is_mmapped_and_still_writable(tmp_path):
+    index = build()
+    index.remove("p3")
+    path = str(tmp_path / "posts.bm25")
+    index.snapshot(path, taken_at="2026-10-19T12:00:00")
+
+    loaded = BM25Index.load(path)
+
+    assert loaded.ready and loaded.taken_at == "2026-10-19T12:00:00"
+    assert len(loaded) == 3 and "p3" not in loaded
+    assert loaded.search("climate seed", limit=10) == index.search("climate seed", limit=10)
+    # Postings are served from the mapped file until a term is written again
+    assert isinstance(loaded._postings["climate"][0], memoryview)
+    loaded.add("p5", "Climate policy roundup")
+    assert "p5" in [key for _, key, _ in loaded.search("climate", limit=10)]
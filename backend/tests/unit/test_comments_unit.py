@@ -0,0 +1,173 @@
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock
+from app.main import app
+from app.middleware.auth import require_auth
+from app.lib.cursors import encode_cursor, decode_cursor
+
+USER_ID = "00000000-0000-0000-0000-0000000000aa"
+POST_ID = "00000000-0000-0000-0000-0000000000f1"
+
+def comment(cid, created_at, parent=None):
+    return {"id": cid, "post_id": POST_ID, "author_id": USER_ID, "parent_comment_id": parent,
+            "content": "hi", "like_count": 0, "created_at": created_at}
+
+@pytest.fixture
+def mock_supabase(mocker):
+    mock = MagicMock()
+    mocker.patch("app.routes.posts.supabase", mock)
+    app.dependency_overrides[require_auth] = lambda: USER_ID
+    yield mock
+    app.dependency_overrides.clear()
+
+def test_comment_tree_is_one_rpc_with_keyset_cursor(mock_supabase):
+    tree = [dict(comment("c2", "2026-10-19T10:00:00"), reply_count=5, replies=[comment("r1", "2026-10-19T10:01:00", "c2")]),
+            dict(comment("c1", "2026-10-19T09:00:00"), reply_count=0, replies=[])]
+    mock_supabase.rpc.return_value.execute.return_value.data = tree
+    client = TestClient(app)
+
+    response = client.get(f"/posts/{POST_ID}/comments/tree", params={"limit": 2, "replies": 1})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["comments"][0]["reply_count"] == 5
+    assert decode_cursor(body["next_cursor"], 2) == ["2026-10-19T09:00:00", "c1"]
+    name, params = mock_supabase.rpc.call_args[0]
+    assert name == "get_comment_tree"
+    assert params == {"target_post_id": POST_ID, "viewer_id": USER_ID, "result_limit": 2, "reply_limit": 1}
+    mock_supabase.table.assert_not_called()
+
+def test_comment_tree_rpc_errors_are_not_masked_by_the_fallback(mock_supabase):
+    mock_supabase.rpc.return_value.execute.side_effect = Exception("invalid input syntax for type uuid")
+    client = TestClient(app)
+
+    response = client.get("/posts/not-a-uuid/comments/tree")
+
+    assert response.status_code == 400
+    mock_supabase.table.assert_not_called()
+
+def test_comment_tree_falls_back_to_two_queries(mock_supabase):
+    mock_supabase.rpc.return_value.execute.side_effect = Exception("Could not find the function public.get_comment_tree")
+    top, replies = MagicMock(), MagicMock()
+    top.select.return_value.eq.return_value.eq.return_value.is_.return_value.order.return_value.order.return_value \
+        .limit.return_value.execute.return_value.data = [comment("c1", "2026-10-19T09:00:00")]
+    rows = [comment(f"r{i}", f"2026-10-19T09:0{i}:00", "c1") for i in range(4)]
+    rows[0]["viewer_like"] = [{"user_id": USER_ID}]
+    replies.select.return_value.eq.return_value.in_.return_value.order.return_value.order.return_value \
+        .limit.return_value.execute.return_value.data = rows
+    tables = iter([top, replies])
+    mock_supabase.table.side_effect = lambda name: next(tables)
+    client = TestClient(app)
+
+    body = client.get(f"/posts/{POST_ID}/comments/tree", params={"replies": 2}).json()
+
+    thread = body["comments"][0]
+    assert thread["reply_count"] == 4
+    assert [r["id"] for r in thread["replies"]] == ["r0", "r1"]
+    assert thread["replies"][0]["is_liked"] is True
+    assert body["next_cursor"] is None
+
+def test_comment_tree_fallback_reads_threads_separately_when_sample_is_cut_off(mock_supabase, mocker):
+    mocker.patch("app.routes.posts.REPLY_FALLBACK_SAMPLE", 3)
+    mock_supabase.rpc.return_value.execute.side_effect = Exception("PGRST202")
+    top, sample, busy, quiet = MagicMock(), MagicMock(), MagicMock(), MagicMock()
+    top.select.return_value.eq.return_value.eq.return_value.is_.return_value.order.return_value.order.return_value \
+        .limit.return_value.execute.return_value.data = [comment("c2", "2026-10-19T10:00:00"), comment("c1", "2026-10-19T09:00:00")]
+    sample.select.return_value.eq.return_value.in_.return_value.order.return_value.order.return_value \
+        .limit.return_value.execute.return_value.data = [comment(f"r{i}", f"2026-10-19T10:0{i}:00", "c2") for i in range(3)]
+    for table, rows, total in ((busy, [comment("r0", "2026-10-19T10:00:00", "c2")], 40), (quiet, [comment("q0", "2026-10-19T09:01:00", "c1")], 1)):
+        table.select.return_value.eq.return_value.eq.return_value.order.return_value.order.return_value \
+            .limit.return_value.execute.return_value = MagicMock(data=rows, count=total)
+    tables = iter([top, sample, busy, quiet])
+    mock_supabase.table.side_effect = lambda name: next(tables)
+    client = TestClient(app)
+
+    body = client.get(f"/posts/{POST_ID}/comments/tree", params={"replies": 1}).json()
+
+    assert [(c["id"], c["reply_count"], [r["id"] for r in c["replies"]]) for c in body["comments"]] == [
+        ("c2", 40, ["r0"]), ("c1", 1, ["q0"])
+    ]
+    assert busy.select.call_args[1]["count"] == "exact"
+
+def test_replies_page_after_cursor(mock_supabase):
+    query = mock_supabase.table.return_value.select.return_value.eq.return_value.eq.return_value
+    query.or_.return_value.order.return_value.order.return_value.limit.return_value.execute.return_value.data = [
+        comment("r4", "2026-10-19T09:04:00", "c1")
+    ]
+    client = TestClient(app)
+    cursor = encode_cursor("2026-10-19T09:03:00", "00000000-0000-0000-0000-000000000003")
+
+    response = client.get("/posts/comments/c1/replies", params={"cursor": cursor, "limit": 5})
+
+    assert response.status_code == 200
+    assert [r["id"] for r in response.json()["replies"]] == ["r4"]
+    assert response.json()["next_cursor"] is None
+    query.or_.assert_called_once_with(
+        "created_at.gt.2026-10-19T09:03:00,and(created_at.eq.2026-10-19T09:03:00,id.gt.00000000-0000-0000-0000-000000000003)"
+    )
+    assert client.get("/posts/comments/c1/replies", params={"cursor": encode_cursor("x", "not-a-uuid")}).status_code == 400
+
+def test_comments_fold_viewer_like_into_one_query(mock_supabase):
+    comments = mock_supabase.table.return_value
+    comments.select.return_value.eq.return_value.eq.return_value.is_.return_value.order.return_value \
+        .range.return_value.execute.return_value.data = [
+            dict(comment("c1", "2026-10-19T09:00:00"), like_count=3, viewer_like=[{"user_id": USER_ID}]),
+            dict(comment("c2", "2026-10-19T08:00:00"), viewer_like=[]),
+        ]
+    client = TestClient(app)
+
+    body = client.get(f"/posts/{POST_ID}/comments").json()
+
+    assert [(c["like_count"], c["is_liked"]) for c in body] == [(3, True), (0, False)]
+    comments.select.assert_called_once_with(
+        "*, author:author_id(id, username, first_name, last_name, avatar_url), viewer_like:comment_likes(user_id)", count=None
+    )
+    comments.select.return_value.eq.assert_called_once_with("viewer_like.user_id", USER_ID)
+    assert mock_supabase.table.call_count == 1
+
+def test_like_comment_returns_trigger_count(mock_supabase, mocker):
+    mocker.patch("app.routes.posts.ensure_user_exists")
+    table = mock_supabase.table.return_value
+    table.select.return_value.eq.return_value.limit.return_value.execute.return_value.data = [{"like_count": 4}]
+    client = TestClient(app)
+
+    assert client.post("/posts/comments/c1/like").json() == {"message": "Comment liked", "like_count": 4}
+    table.insert.assert_called_once_with({"comment_id": "c1", "user_id": USER_ID})
+
+    table.insert.return_value.execute.side_effect = Exception("duplicate key value violates unique constraint")
+    assert client.post("/posts/comments/c1/like").status_code == 409
+
+def test_create_comment_is_one_rpc(mock_supabase, mocker):
+    on_user_saved = mocker.patch("app.routes.posts.on_user_saved")
+    author = {"id": USER_ID, "username": "user_00000000"}
+    mock_supabase.rpc.return_value.execute.return_value.data = dict(
+        comment("c9", "2026-10-19T09:00:00"), author=author, user_created=True
+    )
+    client = TestClient(app)
+
+    response = client.post(f"/posts/{POST_ID}/comments", json={"content": "hi"})
+
+    assert response.status_code == 200
+    assert response.json()["data"]["author"] == author
+    assert "user_created" not in response.json()["data"]
+    mock_supabase.rpc.assert_called_once_with("create_comment", {
+        "target_post_id": POST_ID, "author": USER_ID, "body": "hi", "parent_id": None,
+    })
+    mock_supabase.table.assert_not_called()
+    on_user_saved.assert_called_once_with(author)
+
+def test_create_comment_falls_back_when_rpc_is_missing(mock_supabase, mocker):
+    ensure_user_exists = mocker.patch("app.routes.posts.ensure_user_exists")
+    mock_supabase.rpc.return_value.execute.side_effect = [
+        Exception("{'code': 'PGRST202', 'message': 'Could not find the function public.create_comment'}"),
+        None,
+    ]
+    table = mock_supabase.table.return_value
+    table.insert.return_value.execute.return_value.data = [comment("c9", "2026-10-19T09:00:00")]
+    client = TestClient(app)
+
+    response = client.post(f"/posts/{POST_ID}/comments", json={"content": "hi"})
+
+    assert response.status_code == 200
+    ensure_user_exists.assert_called_once_with(USER_ID)
+    assert mock_supabase.rpc.call_args[0][0] == "increment_post_comments"
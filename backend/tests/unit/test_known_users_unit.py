@@ -0,0 +1,27 @@
+from unittest.mock import MagicMock
+from app.lib import auth_helpers
+from app.routes.posts import ensure_user_exists
+
+USER_ID = "00000000-0000-0000-0000-0000000000aa"
+
+def test_ensure_user_exists_checks_once_per_process(mocker):
+    mocker.patch.object(auth_helpers, "_known_users", set())
+    mock = MagicMock()
+    mock.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [{"id": USER_ID}]
+    mocker.patch("app.routes.posts.supabase", mock)
+
+    ensure_user_exists(USER_ID)
+    ensure_user_exists(USER_ID)
+
+    assert mock.table.call_count == 1
+    assert auth_helpers.is_known_user(USER_ID)
+
+def test_known_users_set_is_bounded(mocker):
+    mocker.patch.object(auth_helpers, "_known_users", set())
+    mocker.patch.object(auth_helpers, "KNOWN_USERS_MAX", 2)
+
+    for user_id in ("a", "b", "c"):
+        auth_helpers.mark_user_known(user_id)
+
+    assert auth_helpers.is_known_user("c")
+    assert not auth_helpers.is_known_user("a")
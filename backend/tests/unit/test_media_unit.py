@@ -0,0 +1,59 @@
+import hashlib
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock
+from app.main import app
+from app.middleware.auth import require_auth
+
+USER_ID = "00000000-0000-0000-0000-0000000000aa"
+OBJECT = f"{USER_ID}/0f8fad5b-d9cb-469f-a165-70867728950e.png"
+
+@pytest.fixture
+def mock_supabase(mocker):
+    mock = MagicMock()
+    storage = mock.storage.from_.return_value
+    storage.create_signed_upload_url.return_value = {"signed_url": "https://storage/sign?token=t", "token": "t", "path": "p"}
+    storage.get_public_url.side_effect = lambda path: f"https://cdn/{path}"
+    mocker.patch("app.routes.media.supabase", mock)
+    mocker.patch("app.lib.images.supabase", mock)
+    app.dependency_overrides[require_auth] = lambda: USER_ID
+    yield mock
+    app.dependency_overrides.clear()
+
+def test_upload_url_is_scoped_to_the_user(mock_supabase):
+    client = TestClient(app)
+
+    response = client.post("/media/upload-url", json={"kind": "avatar", "content_type": "image/png", "size": 1024})
+
+    assert response.status_code == 200
+    assert response.json()["bucket"] == "avatars"
+    assert response.json()["path"].startswith(f"{USER_ID}/")
+    assert client.post("/media/upload-url", json={"kind": "avatar", "content_type": "image/png", "size": 50 * 1024 * 1024}).status_code == 400
+    assert client.post("/media/upload-url", json={"kind": "cover", "content_type": "video/mp4", "size": 1024}).status_code == 400
+
+def test_finalize_avatar_builds_variants(mock_supabase, mocker):
+    async def fake_variants(data, kind):
+        return {64: b"s"}
+    mocker.patch("app.routes.media.make_variants", side_effect=fake_variants)
+    storage = mock_supabase.storage.from_.return_value
+    storage.info.return_value = {"size": 2048, "content_type": "image/png"}
+    storage.download.return_value = b"png-bytes"
+    storage.exists.return_value = False
+    client = TestClient(app)
+
+    response = client.post("/media/finalize", json={"kind": "avatar", "path": OBJECT})
+
+    assert response.status_code == 200
+    assert response.json()["avatar_url"] == f"https://cdn/{USER_ID}/{hashlib.sha256(b'png-bytes').hexdigest()}.png"
+    storage.remove.assert_called_once_with([OBJECT])
+    mock_supabase.table("users").update.assert_called_once()
+
+def test_finalize_rejects_foreign_paths_and_bad_objects(mock_supabase):
+    storage = mock_supabase.storage.from_.return_value
+    storage.info.return_value = {"size": 2048, "content_type": "application/pdf"}
+    client = TestClient(app)
+
+    other = OBJECT.replace(USER_ID, "00000000-0000-0000-0000-0000000000bb")
+    assert client.post("/media/finalize", json={"kind": "post", "path": other}).status_code == 400
+    assert client.post("/media/finalize", json={"kind": "post", "path": OBJECT}).status_code == 400
+    storage.remove.assert_called_once_with([OBJECT])
@@ -0,0 +1,38 @@
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock
+from app.main import app
+from app.middleware.auth import require_auth
+
+USER_ID = "00000000-0000-0000-0000-0000000000aa"
+CONVERSATION_ID = "00000000-0000-0000-0000-0000000000cc"
+
+@pytest.fixture
+def mock_supabase(mocker):
+    mock = MagicMock()
+    mocker.patch("app.routes.messages.supabase", mock)
+    app.dependency_overrides[require_auth] = lambda: USER_ID
+    yield mock
+    app.dependency_overrides.clear()
+
+def test_send_to_conversation_is_one_rpc(mock_supabase):
+    sender = {"id": USER_ID, "username": "alice"}
+    mock_supabase.rpc.return_value.execute.return_value.data = {"id": "m1", "content": "hi", "sender": sender}
+    client = TestClient(app)
+
+    response = client.post("/messages/send", json={"conversation_id": CONVERSATION_ID, "content": "hi"})
+
+    assert response.status_code == 200
+    assert response.json()["data"]["sender"] == sender
+    mock_supabase.rpc.assert_called_once_with("send_message", {
+        "target_conversation_id": CONVERSATION_ID, "sender": USER_ID, "body": "hi",
+    })
+    mock_supabase.table.assert_not_called()
+
+def test_non_participant_gets_403(mock_supabase):
+    mock_supabase.rpc.return_value.execute.side_effect = Exception("Not a participant in this conversation")
+    client = TestClient(app)
+
+    response = client.post("/messages/send", json={"conversation_id": CONVERSATION_ID, "content": "hi"})
+
+    assert response.status_code == 403
@@ -0,0 +1,204 @@
+import hashlib
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock
+from app.main import app
+from app.middleware.auth import require_auth
+from app.lib.profile_cache import profile_cache
+from app.lib.identifiers import username_cache
+
+USER_ID = "00000000-0000-0000-0000-0000000000aa"
+USER = {"id": USER_ID, "username": "alice", "first_name": "Alice"}
+SKILL = {"id": "s1", "user_id": USER_ID, "skill": "python", "endorsement_count": 0}
+BUNDLE = {**USER, "work_experience": [], "education": None, "skills": [SKILL]}
+
+@pytest.fixture
+def mock_supabase(mocker):
+    mock = MagicMock()
+    users = MagicMock()
+    mock.table.side_effect = lambda name: users if name == "users" else MagicMock()
+    # Bundle: select(...).eq().order(work_experience).order(education).limit(1)
+    users.select.return_value.eq.return_value.order.return_value.order.return_value \
+        .limit.return_value.execute.return_value.data = [dict(BUNDLE)]
+    # Skills by username: select("id, user_skills(*)").eq().limit(1)
+    users.select.return_value.eq.return_value.limit.return_value.execute.return_value.data = [{"id": USER_ID, "user_skills": [SKILL]}]
+    users.update.return_value.eq.return_value.execute.return_value.data = [dict(USER)]
+    mocker.patch("app.routes.profile.supabase", mock)
+    mocker.patch("app.lib.identifiers.supabase", mock)
+    mocker.patch("app.lib.images.supabase", mock)
+    profile_cache.clear()
+    username_cache.clear()
+    app.dependency_overrides[require_auth] = lambda: USER_ID
+    yield mock
+    app.dependency_overrides.clear()
+
+def test_profile_bundle_is_one_query_cached_and_revalidates_with_etag(mock_supabase):
+    client = TestClient(app)
+
+    first = client.get("/profile/me")
+    second = client.get(f"/profile/{USER_ID}", headers={"If-None-Match": first.headers["etag"]})
+
+    assert first.status_code == 200
+    assert first.json()["skills"] == [SKILL]
+    assert first.json()["education"] == []
+    assert second.status_code == 304
+    assert second.headers["etag"] == first.headers["etag"]
+    mock_supabase.table.assert_called_once_with("users")
+    mock_supabase.table("users").select.assert_called_once_with("*, work_experience(*), education(*), skills:user_skills(*)")
+
+def test_profile_write_invalidates_bundle(mock_supabase):
+    client = TestClient(app)
+    client.get("/profile/me")
+    calls_before = mock_supabase.table.call_count
+
+    client.put("/profile/me", json={"headline": "Founder"})
+    client.get("/profile/me")
+
+    # update (2 users calls) + a fresh bundle query
+    assert mock_supabase.table.call_count == calls_before + 3
+
+def test_cold_username_view_learns_the_id(mock_supabase, mocker):
+    client = TestClient(app)
+
+    assert client.get("/profile/alice").status_code == 200
+    assert client.get("/profile/alice").status_code == 200
+    assert mock_supabase.table.call_count == 1
+    assert username_cache.get("alice") == USER_ID
+
+    users = mock_supabase.table("users")
+    users.update.return_value.eq.return_value.execute.return_value.data = [dict(USER, username="alice2")]
+    users.select.return_value.eq.return_value.single.return_value.execute.return_value.data = {"username": "alice", "email": None}
+    mocker.patch("app.routes.profile.check_username_availability", return_value=True)
+    client.put("/profile/me", json={"username": "alice2"})
+    assert username_cache.get("alice") is None
+
+def test_collection_by_username_is_one_embedded_query(mock_supabase):
+    client = TestClient(app)
+
+    assert client.get("/profile/skills/alice").json() == [SKILL]
+    mock_supabase.table("users").select.assert_called_once_with("id, user_skills(*)")
+
+def test_bulk_changes_are_one_rpc_and_invalidate_the_bundle(mock_supabase):
+    mock_supabase.rpc.return_value.execute.return_value.data = {
+        "work_experience": [], "education": [], "skills": [SKILL], "added_skills": ["python"], "removed_skills": [],
+    }
+    client = TestClient(app)
+    client.get("/profile/me")
+
+    response = client.post("/profile/bulk", json={
+        "work_experience": {
+            "create": [{"title": "CTO", "company": "Acme", "start_date": "2024-01-01"}],
+            "update": [{"id": "w1", "is_current": True}],
+        },
+        "skills": {"create": [{"skill": " Python "}], "delete": ["s0"]},
+    })
+
+    assert response.status_code == 200
+    assert response.json()["data"]["skills"] == [SKILL]
+    name, params = mock_supabase.rpc.call_args[0]
+    assert name == "apply_profile_changes"
+    changes = params["changes"]
+    assert changes["work_experience"]["create"][0]["start_date"] == "2024-01-01"
+    assert changes["work_experience"]["update"] == [{"id": "w1", "is_current": True, "end_date": None}]
+    assert changes["skills"] == {"create": ["python"], "delete": ["s0"]}
+    assert profile_cache.get(USER_ID) is None
+
+def test_bulk_changes_map_ownership_failure_to_403(mock_supabase):
+    mock_supabase.rpc.return_value.execute.side_effect = Exception("Not authorized")
+    client = TestClient(app)
+
+    assert client.post("/profile/skills/bulk", json={"delete": ["s9"]}).status_code == 403
+    assert client.post("/profile/education/bulk", json={}).status_code == 400
+
+def test_avatar_upload_is_content_addressed_and_replaces_the_old_one(mock_supabase, mocker):
+    async def fake_variants(data, kind):
+        return {64: b"s", 128: b"m", 256: b"l"}
+    mocker.patch("app.routes.profile.make_variants", side_effect=fake_variants)
+    storage = mock_supabase.storage.from_.return_value
+    storage.exists.return_value = False
+    storage.get_public_url.side_effect = lambda path: f"https://x/storage/v1/object/public/avatars/{path}"
+    old_url = f"https://x/storage/v1/object/public/avatars/{USER_ID}/avatar.png?t=1"
+    # Read before the update, then re-read by the background delete
+    mock_supabase.table("users").select.return_value.eq.return_value.execute.side_effect = [
+        MagicMock(data=[{"avatar_url": old_url, "avatar_variants": None}]),
+        MagicMock(data=[{"avatar_url": "https://x/new.png", "avatar_variants": None}]),
+    ]
+    client = TestClient(app)
+
+    response = client.post("/profile/upload-avatar", files={"file": ("me.png", b"png-bytes", "image/png")})
+
+    assert response.status_code == 200
+    digest = hashlib.sha256(b"png-bytes").hexdigest()
+    assert response.json()["avatar_url"].endswith(f"/{USER_ID}/{digest}.png")
+    variants = response.json()["avatar_variants"]
+    assert variants["64"].endswith(f"/{USER_ID}/{digest}_64.webp")
+    assert storage.upload.call_count == 4
+    assert storage.upload.call_args[0][2]["cache-control"] == "31536000"
+    assert storage.upload.call_args[0][2]["upsert"] == "true"
+    assert mock_supabase.table("users").update.call_args[0][0]["avatar_variants"] == variants
+    storage.remove.assert_called_once_with([f"{USER_ID}/avatar.png"])
+
+def test_identical_reupload_is_deduplicated(mock_supabase, mocker):
+    make_variants = mocker.patch("app.routes.profile.make_variants")
+    storage = mock_supabase.storage.from_.return_value
+    storage.exists.return_value = True
+    storage.get_public_url.side_effect = lambda path: f"https://cdn/{path}"
+    client = TestClient(app)
+
+    response = client.post("/profile/upload-avatar", files={"file": ("me.png", b"png-bytes", "image/png")})
+
+    assert response.status_code == 200
+    make_variants.assert_not_called()
+    storage.upload.assert_not_called()
+
+def test_oversized_upload_is_rejected_before_processing(mock_supabase, mocker):
+    mocker.patch("app.routes.profile.MAX_IMAGE_SIZE", 100 * 1024)
+    make_variants = mocker.patch("app.routes.profile.make_variants")
+    client = TestClient(app)
+
+    response = client.post("/profile/upload-cover", files={"file": ("big.jpg", b"x" * (200 * 1024), "image/jpeg")})
+
+    assert response.status_code == 400
+    make_variants.assert_not_called()
+    mock_supabase.storage.from_.return_value.upload.assert_not_called()
+
+def test_broken_image_pool_is_replaced(mock_supabase, mocker):
+    from concurrent.futures.process import BrokenProcessPool
+    from app.lib import images
+    broken = MagicMock()
+    broken.submit.side_effect = BrokenProcessPool("worker died")
+    mocker.patch.object(images, "_pool", broken)
+    mock_supabase.storage.from_.return_value.exists.return_value = False
+    client = TestClient(app)
+
+    response = client.post("/profile/upload-avatar", files={"file": ("me.png", b"png-bytes", "image/png")})
+
+    assert response.status_code == 500
+    broken.shutdown.assert_called_once()
+    assert images._pool is None
+
+def test_old_image_is_kept_if_the_row_points_at_it_again(mock_supabase, mocker):
+    from app.lib.images import delete_unreferenced
+    old_path = f"{USER_ID}/{'a' * 64}.png"
+    mock_supabase.table("users").select.return_value.eq.return_value.execute.return_value.data = [{
+        "avatar_url": f"https://x/storage/v1/object/public/avatars/{old_path}",
+        "avatar_variants": {"64": f"https://x/storage/v1/object/public/avatars/{USER_ID}/{'a' * 64}_64.webp"},
+    }]
+    storage = mock_supabase.storage.from_.return_value
+
+    delete_unreferenced(USER_ID, "avatar", [old_path, f"{USER_ID}/{'a' * 64}_64.webp", f"{USER_ID}/other.png"])
+
+    storage.remove.assert_called_once_with([f"{USER_ID}/other.png"])
+
+def test_removing_a_connection_invalidates_both_profiles(mock_supabase, mocker):
+    connections = MagicMock()
+    connections.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value.data = {
+        "id": "c1", "requester_id": USER_ID, "receiver_id": "other-user"
+    }
+    mocker.patch("app.routes.connections.supabase", connections)
+    profile_cache.set(USER_ID, ("bundle", "etag", 0))
+    profile_cache.set("other-user", ("bundle", "etag", 0))
+    client = TestClient(app)
+
+    assert client.delete("/connections/c1").status_code == 200
+    assert profile_cache.get(USER_ID) is None and profile_cache.get("other-user") is None
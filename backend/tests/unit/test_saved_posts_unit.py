@@ -0,0 +1,58 @@
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock
+from app.main import app
+from app.middleware.auth import require_auth
+from app.lib.cursors import encode_cursor, decode_cursor
+
+USER_ID = "00000000-0000-0000-0000-0000000000aa"
+
+def post(pid):
+    return {"id": pid, "author_id": USER_ID, "content": "x", "post_type": "text", "visibility": "public",
+            "scheduled_at": None, "is_published": True, "is_draft": False, "like_count": 0, "comment_count": 0,
+            "repost_count": 0, "share_count": 0, "created_at": "2026-10-01T00:00:00", "edited_at": None}
+
+P1 = "00000000-0000-0000-0000-000000000001"
+P2 = "00000000-0000-0000-0000-000000000002"
+
+@pytest.fixture
+def mock_supabase(mocker):
+    mock = MagicMock()
+    mocker.patch("app.routes.posts.supabase", mock)
+    enrich = mocker.patch("app.routes.posts.bulk_enrich_posts", side_effect=lambda posts, user_id: posts)
+    app.dependency_overrides[require_auth] = lambda: USER_ID
+    yield mock, enrich
+    app.dependency_overrides.clear()
+
+def test_saved_posts_keep_saved_order_and_return_a_cursor(mock_supabase):
+    mock, enrich = mock_supabase
+    saved = mock.table.return_value
+    saved.select.return_value.eq.return_value.order.return_value.order.return_value.range.return_value \
+        .execute.return_value.data = [
+            {"created_at": "2026-10-19T10:00:00", "post": post(P2)},
+            {"created_at": "2026-10-18T10:00:00", "post": post(P1)},
+        ]
+    client = TestClient(app)
+
+    response = client.get("/posts/saved/all", params={"limit": 2})
+
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == [P2, P1]
+    assert decode_cursor(response.headers["x-next-cursor"], 2) == ["2026-10-18T10:00:00", P1]
+    mock.table.assert_called_once_with("saved_posts")
+    saved.select.assert_called_once_with("created_at, post:posts!inner(*)")
+    assert [p["id"] for p in enrich.call_args[0][0]] == [P2, P1]
+
+def test_saved_posts_cursor_uses_keyset(mock_supabase):
+    mock, _ = mock_supabase
+    query = mock.table.return_value.select.return_value.eq.return_value
+    query.or_.return_value.order.return_value.order.return_value.limit.return_value.execute.return_value.data = []
+    client = TestClient(app)
+
+    response = client.get("/posts/saved/all", params={"cursor": encode_cursor("2026-10-18T10:00:00", P1)})
+
+    assert response.status_code == 200
+    assert response.json() == []
+    assert "x-next-cursor" not in response.headers
+    query.or_.assert_called_once_with(f"created_at.lt.2026-10-18T10:00:00,and(created_at.eq.2026-10-18T10:00:00,post_id.lt.{P1})")
+    assert client.get("/posts/saved/all", params={"cursor": "garbage"}).status_code == 400
@@ -0,0 +1,33 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+from app.lib import scheduled_posts
+
+@pytest.fixture
+def mock_supabase(mocker):
+    mock = MagicMock()
+    mocker.patch("app.lib.scheduled_posts.supabase", mock)
+    return mock
+
+def test_publishes_a_batch_and_indexes_each_post(mock_supabase, mocker):
+    on_post_saved = mocker.patch("app.lib.scheduled_posts.on_post_saved")
+    mock_supabase.rpc.return_value.execute.return_value.data = [{"id": "p1"}, {"id": "p2"}]
+
+    published = scheduled_posts.publish_due_posts(50)
+
+    assert [p["id"] for p in published] == ["p1", "p2"]
+    mock_supabase.rpc.assert_called_once_with("publish_due_posts", {"batch_size": 50})
+    assert on_post_saved.call_count == 2
+
+def test_loop_drains_full_batches_before_sleeping(mock_supabase, mocker):
+    mocker.patch("app.lib.scheduled_posts.PUBLISH_BATCH_SIZE", 2)
+    batches = iter([[{"id": "a"}, {"id": "b"}], [{"id": "c"}], []])
+    publish = mocker.patch("app.lib.scheduled_posts.publish_due_posts", side_effect=lambda: next(batches))
+
+    async def run_once():
+        task = asyncio.create_task(scheduled_posts.keep_publishing_scheduled_posts(interval=60))
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(run_once())
+    assert publish.call_count == 2
@@ -0,0 +1,179 @@
+import asyncio
+import copy
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock
+from app.main import app
+from app.middleware.auth import require_auth
+from app.routes.search import search_cache, trending_cache, keep_trending_fresh
+
+POSTS = [
+    {"id": "p1", "author_id": "a1", "content": "hello world", "rank": 0.5},
+    {"id": "p2", "author_id": "a1", "content": "hello again", "rank": 0.4},
+    {"id": "p3", "author_id": "a2", "content": "hello there", "rank": 0.3},
+]
+USERS = [{"id": "a1", "username": "alice"}]
+FACETED = {
+    "results": [{"id": "a1", "username": "alice", "industry": "Fintech", "score": 0.9}],
+    "total": 1,
+    "facets": {"industry": [{"value": "Fintech", "count": 1}], "company": []},
+}
+AUTHORS = [{"id": "a1", "username": "alice"}, {"id": "a2", "username": "bob"}]
+
+@pytest.fixture
+def mock_supabase(mocker):
+    mock = MagicMock()
+    rpc_results = {
+        "search_posts_fts": POSTS,
+        "search_posts_filtered": {"results": POSTS[:1], "type_counts": {"hiring": 1, "insight": 4}},
+        "search_users_fuzzy": USERS,
+        "search_users_faceted": FACETED,
+        "get_trending_posts": POSTS,
+        "get_top_tags": [{"tag": "hiring", "post_count": 3}],
+        "prune_post_trending": None,
+    }
+
+    def rpc(name, params):
+        call = MagicMock()
+        call.execute.return_value.data = copy.deepcopy(rpc_results[name])
+        return call
+
+    mock.rpc.side_effect = rpc
+    mock.table.return_value.select.return_value.in_.return_value.execute.return_value.data = AUTHORS
+    mocker.patch("app.routes.search.supabase", mock)
+    mocker.patch("app.lib.search_backends.supabase", mock)
+    search_cache.clear()
+    trending_cache.clear()
+    app.dependency_overrides[require_auth] = lambda: "viewer-1"
+    yield mock
+    app.dependency_overrides.clear()
+
+def test_search_all_hydrates_authors_in_one_query(mock_supabase):
+    client = TestClient(app)
+
+    response = client.get("/search/all", params={"q": "hello", "posts_limit": 3})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["users"]["results"] == USERS
+    assert [p["author"]["username"] for p in body["posts"]["results"]] == ["alice", "alice", "bob"]
+    # One batched author lookup, no per-post .single() calls
+    mock_supabase.table.assert_called_once_with("users")
+    assert body["posts"]["next_cursor"] is not None
+
+def test_search_posts_rejects_bad_cursor(mock_supabase):
+    client = TestClient(app)
+
+    response = client.get("/search/posts", params={"q": "hello", "cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
+
+def test_search_cache_shares_normalized_queries(mock_supabase):
+    client = TestClient(app)
+    hits_before = search_cache.hits
+
+    first = client.get("/search/users", params={"q": "Jane  Doe"})
+    second = client.get("/search/users", params={"q": "  jane doe"})
+
+    assert first.json() == second.json()
+    assert mock_supabase.rpc.call_count == 1
+    mock_supabase.rpc.assert_called_once_with("search_users_fuzzy", {"search_query": "jane doe", "result_limit": 20})
+    assert search_cache.hits == hits_before + 1
+
+def test_search_users_filters_use_faceted_rpc(mock_supabase):
+    client = TestClient(app)
+
+    response = client.get("/search/users", params={"q": "Alice", "industry": " FinTech ", "skill": "Python", "limit": 1})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["facets"]["industry"] == [{"value": "Fintech", "count": 1}]
+    assert body["total"] == 1 and body["count"] == 1 and body["next_cursor"] is not None
+    params = mock_supabase.rpc.call_args[0][1]
+    assert (params["search_query"], params["industry_filter"], params["skill_filter"]) == ("alice", "fintech", "python")
+
+def test_search_users_requires_query_or_filter(mock_supabase):
+    client = TestClient(app)
+
+    assert client.get("/search/users").status_code == 400
+    assert client.get("/search/users", params={"company": "Acme"}).status_code == 200
+
+def test_users_by_skill_pages_on_endorsements(mock_supabase):
+    rows = [
+        {"user_id": "00000000-0000-0000-0000-00000000000a", "endorsement_count": 5, "user": {"id": "a", "username": "alice"}},
+        {"user_id": "00000000-0000-0000-0000-00000000000b", "endorsement_count": 3, "user": {"id": "b", "username": "bob"}},
+    ]
+    query = mock_supabase.table.return_value.select.return_value.eq.return_value.eq.return_value
+    query.order.return_value.order.return_value.limit.return_value.execute.return_value.data = rows
+    client = TestClient(app)
+
+    first = client.get("/search/skills/ Python /users", params={"limit": 2}).json()
+
+    assert first["skill"] == "python"
+    assert [(r["username"], r["endorsement_count"]) for r in first["results"]] == [("alice", 5), ("bob", 3)]
+    query.or_.return_value.order.return_value.order.return_value.limit.return_value.execute.return_value.data = []
+    client.get("/search/skills/python/users", params={"limit": 2, "cursor": first["next_cursor"]})
+    query.or_.assert_called_once_with(
+        "endorsement_count.lt.3,and(endorsement_count.eq.3,user_id.gt.00000000-0000-0000-0000-00000000000b)"
+    )
+
+def test_search_posts_filters_run_in_one_rpc(mock_supabase):
+    client = TestClient(app)
+
+    response = client.get("/search/posts", params={
+        "q": "Backend", "post_type": "hiring", "author": "00000000-0000-0000-0000-00000000000a",
+        "since": "2026-10-12T00:00:00+02:00", "has_media": "false",
+    })
+
+    assert response.status_code == 200
+    assert response.json()["type_counts"] == {"hiring": 1, "insight": 4}
+    name, params = mock_supabase.rpc.call_args[0]
+    assert name == "search_posts_filtered"
+    assert params["post_type_filter"] == "hiring"
+    assert params["author_filter"] == "00000000-0000-0000-0000-00000000000a"
+    assert params["since_ts"] == "2026-10-11T22:00:00"
+    assert params["has_media"] is False
+    assert client.get("/search/posts", params={"q": "x", "post_type": "nope"}).status_code == 422
+
+def test_faceted_fallback_buckets_case_variants_together(mock_supabase):
+    rpc = mock_supabase.rpc.side_effect
+    mock_supabase.rpc.side_effect = lambda name, params: MagicMock(execute=MagicMock(side_effect=Exception("PGRST202"))) \
+        if name == "search_users_faceted" else rpc(name, params)
+    rows = [{"id": str(i), "username": f"u{i}", "current_company": company, "industry": None}
+            for i, company in enumerate(["Google", "google ", "Acme"])]
+    mock_supabase.table.return_value.select.return_value.eq.return_value.or_.return_value \
+        .limit.return_value.execute.return_value.data = rows
+    client = TestClient(app)
+
+    body = client.get("/search/users", params={"q": "u", "facets": "true"}).json()
+
+    assert body["facets"]["company"] == [{"value": "Google", "count": 2}, {"value": "Acme", "count": 1}]
+    assert body["facets"]["industry"] == []
+
+def rpc_names(mock_supabase):
+    return [c[0][0] for c in mock_supabase.rpc.call_args_list]
+
+def test_trending_posts_are_hydrated_and_cached(mock_supabase):
+    client = TestClient(app)
+
+    first = client.get("/search/trending", params={"limit": 2}).json()
+    second = client.get("/search/trending", params={"limit": 3}).json()
+
+    assert [p["id"] for p in first["trending"]] == ["p1", "p2"]
+    assert first["trending"][0]["author"] == {"id": "a1", "username": "alice"}
+    assert [p["id"] for p in second["trending"]] == ["p1", "p2", "p3"]
+    assert first["topics"] == [{"tag": "hiring", "post_count": 3}]
+    assert rpc_names(mock_supabase).count("get_trending_posts") == 1
+    assert mock_supabase.table.call_count == 1
+
+def test_trending_refresh_replaces_cache_entry_and_prunes(mock_supabase, mocker):
+    trending_cache.set("posts", [{"id": "stale"}])
+    mocker.patch("app.routes.search.asyncio.sleep", side_effect=asyncio.CancelledError)
+    stats_logger = mocker.patch("app.routes.search.stats_logger")
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(keep_trending_fresh(interval=0))
+
+    assert [p["id"] for p in trending_cache.get("posts")] == ["p1", "p2", "p3"]
+    assert rpc_names(mock_supabase) == ["get_trending_posts", "prune_post_trending"]
+    assert "hit_ratio" in stats_logger.info.call_args[0][0]
@@ -0,0 +1,20 @@
+from app.lib.tags import extract_tags, normalize_tag
+
+
+def test_extract_tags_lowercases_and_dedupes():
+    hashtags, mentions = extract_tags("Raising our seed #Fundraising with @Jane_Doe. #fundraising #AI2026 cc @jane_doe")
+
+    assert hashtags == ["fundraising", "ai2026"]
+    assert mentions == ["jane_doe"]
+
+
+def test_extract_tags_ignores_numbers_anchors_and_emails():
+    hashtags, mentions = extract_tags("Issue #42, see docs.html#setup or mail me@example.com ##double")
+
+    assert hashtags == []
+    assert mentions == []
+
+
+def test_normalize_tag_strips_prefix():
+    assert normalize_tag(" #Startups ") == "startups"
+    assert normalize_tag("@Jane") == "jane"
@@ -0,0 +1,135 @@
+import asyncio
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import httpcore
+from app.lib.unfurl import PublicOnlyBackend, Unfurler, normalize_url
+
+PAGE = b"""<html><head>
+<title>Fallback title</title>
+<meta property="og:title" content="Hiring: Backend Engineer">
+<meta property="og:description" content="Join the platform team">
+<meta property="og:image" content="/img/card.png">
+</head><body>ignored</body></html>"""
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    hits = {}
+    hosts = {}
+
+    def do_GET(self):
+        StubHandler.hits[self.path] = StubHandler.hits.get(self.path, 0) + 1
+        StubHandler.hosts[self.path] = self.headers.get("Host")
+        if self.path.startswith("/page"):
+            self._send(200, "text/html; charset=utf-8", PAGE)
+        elif self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/page")
+            self.end_headers()
+        elif self.path == "/huge":
+            # No </head> within the byte cap: the tags after it must never be read
+            self._send(200, "text/html", b"<html><head>" + b" " * 600_000 + b'<meta property="og:title" content="late">')
+        elif self.path == "/slow":
+            time.sleep(1)
+            self._send(200, "text/html", PAGE)
+        elif self.path == "/image":
+            self._send(200, "image/png", b"\x89PNG")
+        else:
+            self._send(404, "text/plain", b"missing")
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def unfurl(unfurler, url):
+    async def run():
+        try:
+            return await unfurler.unfurl(url)
+        finally:
+            await unfurler.aclose()
+    return asyncio.run(run())
+
+
+def test_normalize_url_drops_tracking_and_fragment():
+    assert normalize_url("HTTPS://Example.com:443/a?utm_source=x&id=3#top") == "https://example.com/a?id=3"
+
+
+def test_unfurls_open_graph_and_caches_by_normalized_url(stub_server):
+    unfurler = Unfurler(allow_private=True)
+
+    preview = unfurl(unfurler, f"{stub_server}/page?utm_campaign=a")
+    again = unfurl(unfurler, f"{stub_server}/page#section")
+
+    assert preview["title"] == "Hiring: Backend Engineer"
+    assert preview["description"] == "Join the platform team"
+    assert preview["image"] == f"{stub_server}/img/card.png"
+    assert again == preview
+    assert StubHandler.hits["/page"] == 1
+
+
+def test_follows_redirects_and_skips_non_html(stub_server):
+    unfurler = Unfurler(allow_private=True)
+
+    assert unfurl(unfurler, f"{stub_server}/redirect")["title"] == "Hiring: Backend Engineer"
+    assert unfurl(unfurler, f"{stub_server}/image") is None
+    assert unfurl(unfurler, f"{stub_server}/missing") is None
+
+
+def test_byte_cap_and_timeout(stub_server, mocker):
+    mocker.patch("app.lib.unfurl.UNFURL_TIMEOUT_SECONDS", 0.2)
+    unfurler = Unfurler(allow_private=True)
+
+    assert unfurl(unfurler, f"{stub_server}/huge") is None
+    assert unfurl(unfurler, f"{stub_server}/slow") is None
+
+
+def test_private_hosts_are_refused_by_default(stub_server):
+    unfurler = Unfurler()
+
+    assert unfurl(unfurler, f"{stub_server}/page?private") is None
+    assert "/page?private" not in StubHandler.hits
+
+
+def fake_dns(mocker, answers):
+    async def getaddrinfo(self, host, port, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (a, port or 0)) for a in answers[host]]
+    mocker.patch("asyncio.base_events.BaseEventLoop.getaddrinfo", getaddrinfo)
+
+
+def test_connects_to_the_address_it_resolved(stub_server, mocker):
+    port = stub_server.rsplit(":", 1)[1]
+    fake_dns(mocker, {"preview.test": ["127.0.0.1"]})
+    unfurler = Unfurler(allow_private=True)
+
+    assert unfurl(unfurler, f"http://preview.test:{port}/page?pinned=1")["title"] == "Hiring: Backend Engineer"
+    assert StubHandler.hosts["/page?pinned=1"] == f"preview.test:{port}"
+    assert unfurler._host_limits == {}
+
+
+@pytest.mark.parametrize("answers", [["93.184.216.34", "127.0.0.1"], ["169.254.169.254"], ["224.0.0.1"], ["0.0.0.0"]])
+def test_backend_refuses_non_public_answers(mocker, answers):
+    fake_dns(mocker, {"rebind.test": answers})
+
+    with pytest.raises(httpcore.ConnectError):
+        asyncio.run(PublicOnlyBackend().resolve("rebind.test", 80))
@@ -0,0 +1,99 @@
+-- Migration 11: Post full-text search
+-- Date: 2026-10-19
+-- Purpose: Replace the `content ILIKE '%q%'` sequential scan used by /search/posts
+--   and /search/all with a GIN-indexed tsvector search, ranked by ts_rank and
+--   paginated with a (rank, id) keyset cursor.
+--
+--   The tsvector is an expression index rather than a stored column so that the
+--   many `posts.select("*")` calls in the backend don't start shipping the
+--   vector in every feed payload. Postgres keeps the index in sync on every
+--   INSERT/UPDATE of posts.content, so no extra trigger is required.
+
+SET search_path TO public;
+
+-- ==== INDEX ====
+-- Only public, published posts are searchable, so keep the index partial.
+CREATE INDEX IF NOT EXISTS idx_posts_content_fts
+  ON posts USING GIN (to_tsvector('english', COALESCE(content, '')))
+  WHERE is_published = TRUE AND is_draft = FALSE AND visibility = 'public';
+
+-- ==== SEARCH RPC ====
+-- Returns one page of matching posts ordered by relevance.
+--   search_query : free text, parsed with websearch_to_tsquery ("quoted phrases", -exclusions, OR)
+--   result_limit : page size
+--   cursor_rank / cursor_id : rank and id of the last row of the previous page (NULL for page 1)
+-- The snippet is computed only for the rows on the page, after the LIMIT.
+CREATE OR REPLACE FUNCTION search_posts_fts(
+  search_query TEXT,
+  result_limit INTEGER DEFAULT 20,
+  cursor_rank REAL DEFAULT NULL,
+  cursor_id UUID DEFAULT NULL
+)
+RETURNS TABLE (
+  id UUID,
+  author_id UUID,
+  content TEXT,
+  post_type TEXT,
+  visibility TEXT,
+  scheduled_at TIMESTAMP,
+  is_published BOOLEAN,
+  is_draft BOOLEAN,
+  like_count INTEGER,
+  comment_count INTEGER,
+  repost_count INTEGER,
+  share_count INTEGER,
+  created_at TIMESTAMP,
+  edited_at TIMESTAMP,
+  rank REAL,
+  snippet TEXT
+)
+LANGUAGE sql STABLE AS $$
+  WITH query AS (
+    SELECT websearch_to_tsquery('english', search_query) AS tsq
+  ),
+  page AS (
+    SELECT p.*, ts_rank(to_tsvector('english', COALESCE(p.content, '')), query.tsq) AS rank, query.tsq
+    FROM posts p, query
+    WHERE to_tsvector('english', COALESCE(p.content, '')) @@ query.tsq
+      AND p.is_published = TRUE
+      AND p.is_draft = FALSE
+      AND p.visibility = 'public'
+  ),
+  ranked AS (
+    SELECT *
+    FROM page
+    WHERE cursor_rank IS NULL OR (page.rank, page.id) < (cursor_rank, cursor_id)
+    ORDER BY page.rank DESC, page.id DESC
+    LIMIT result_limit
+  )
+  SELECT
+    r.id,
+    r.author_id,
+    r.content,
+    r.post_type::TEXT,
+    r.visibility::TEXT,
+    r.scheduled_at,
+    r.is_published,
+    r.is_draft,
+    r.like_count,
+    r.comment_count,
+    r.repost_count,
+    r.share_count,
+    r.created_at,
+    r.edited_at,
+    r.rank,
+    ts_headline(
+      'english', COALESCE(r.content, ''), r.tsq,
+      'StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2'
+    ) AS snippet
+  FROM ranked r
+  ORDER BY r.rank DESC, r.id DESC;
+$$;
+
+GRANT EXECUTE ON FUNCTION search_posts_fts(TEXT, INTEGER, REAL, UUID) TO service_role;
+
+-- ==================================================
+-- Verification queries (run manually after applying):
+-- EXPLAIN ANALYZE SELECT * FROM search_posts_fts('product launch', 20);
+-- SELECT indexname FROM pg_indexes WHERE tablename = 'posts' AND indexname = 'idx_posts_content_fts';
+-- ==================================================
@@ -0,0 +1,90 @@
+-- Migration 12: Fuzzy people search
+-- Date: 2026-10-19
+-- Purpose: /search/users ORs four `ILIKE '%q%'` predicates, which no B-tree can
+--   serve. Add pg_trgm GIN indexes and a similarity-ranked RPC that tolerates
+--   typos and matches full names ("jane doe" across first_name + last_name).
+
+SET search_path TO public;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- ==== INDEXES ====
+-- Full name as one string so multi-word queries match across both columns.
+-- (COALESCE + || are immutable, so this is a valid index expression.)
+CREATE INDEX IF NOT EXISTS idx_users_full_name_trgm
+  ON users USING GIN ((COALESCE(first_name, '') || ' ' || COALESCE(last_name, '')) gin_trgm_ops)
+  WHERE is_active = TRUE;
+
+CREATE INDEX IF NOT EXISTS idx_users_username_trgm
+  ON users USING GIN (username gin_trgm_ops)
+  WHERE is_active = TRUE;
+
+CREATE INDEX IF NOT EXISTS idx_users_headline_trgm
+  ON users USING GIN (headline gin_trgm_ops)
+  WHERE is_active = TRUE;
+
+-- ==== SEARCH RPC ====
+-- word_similarity (<%) scores how well the query matches any run of words in the
+-- target, so "jan do" still finds "Jane Doe" and "jnae" finds "jane". Substring
+-- matches on username, full name and headline (the old ILIKE behaviour) are
+-- admitted as well, even below the word_similarity threshold; username and name
+-- fragments score at least 0.5. The trigram GIN indexes serve these predicates.
+-- Headline matches are down-weighted.
+CREATE OR REPLACE FUNCTION search_users_fuzzy(
+  search_query TEXT,
+  result_limit INTEGER DEFAULT 20
+)
+RETURNS TABLE (
+  id UUID,
+  username TEXT,
+  first_name TEXT,
+  last_name TEXT,
+  avatar_url TEXT,
+  headline TEXT,
+  current_position TEXT,
+  current_company TEXT,
+  industry TEXT,
+  score REAL
+)
+LANGUAGE sql STABLE AS $$
+  WITH q AS (
+    SELECT lower(trim(search_query)) AS term
+  ),
+  candidates AS (
+    SELECT
+      u.*,
+      GREATEST(
+        word_similarity(q.term, COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, '')),
+        word_similarity(q.term, COALESCE(u.username, '')),
+        word_similarity(q.term, COALESCE(u.headline, '')) * 0.6,
+        CASE WHEN u.username ILIKE q.term || '%' THEN 1.0 ELSE 0 END,
+        CASE WHEN u.username ILIKE '%' || q.term || '%'
+               OR (COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, '')) ILIKE '%' || q.term || '%'
+             THEN 0.5 ELSE 0 END
+      )::REAL AS score
+    FROM users u, q
+    WHERE u.is_active = TRUE
+      AND (
+        q.term <% (COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, ''))
+        OR q.term <% u.username
+        OR q.term <% u.headline
+        OR u.username ILIKE '%' || q.term || '%'
+        OR (COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, '')) ILIKE '%' || q.term || '%'
+        OR u.headline ILIKE '%' || q.term || '%'
+      )
+  )
+  SELECT
+    c.id, c.username, c.first_name, c.last_name, c.avatar_url, c.headline,
+    c.current_position, c.current_company, c.industry, c.score
+  FROM candidates c
+  ORDER BY c.score DESC, c.username
+  LIMIT result_limit;
+$$;
+
+GRANT EXECUTE ON FUNCTION search_users_fuzzy(TEXT, INTEGER) TO service_role;
+
+-- ==================================================
+-- Verification queries (run manually after applying):
+-- EXPLAIN ANALYZE SELECT * FROM search_users_fuzzy('jane doe', 20);
+-- SELECT * FROM search_users_fuzzy('jnae', 5);
+-- ==================================================
@@ -0,0 +1,175 @@
+-- Migration 13: Time-decayed trending scores
+-- Date: 2026-10-19
+-- Purpose: /search/trending calls get_trending_posts(), which never existed, so it
+--   always fell back to all-time like_count. Keep an exponentially decayed
+--   engagement score per post, updated incrementally by triggers on likes,
+--   comments and reposts, and serve trending from that small table.
+--
+--   Score model: every engagement adds a weight (like 1, comment 2, repost 3) and
+--   the whole score halves every 12 hours. Only (score, updated_at) is stored; the
+--   current value is score * 2^(-(now - updated_at) / 12h), so an update only needs
+--   to decay the stored value to "now" before adding the new weight.
+
+SET search_path TO public;
+
+-- ==== TABLE ====
+CREATE TABLE IF NOT EXISTS post_trending (
+    post_id     UUID PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,
+    score       DOUBLE PRECISION NOT NULL DEFAULT 0,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_post_trending_updated
+  ON post_trending (updated_at DESC);
+
+ALTER TABLE post_trending ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS post_trending_service_all ON post_trending;
+CREATE POLICY post_trending_service_all
+  ON post_trending
+  USING (auth.role() = 'service_role')
+  WITH CHECK (auth.role() = 'service_role');
+
+-- ==== DECAY ====
+-- Decayed value of a stored score at the current time (12 hour half-life).
+CREATE OR REPLACE FUNCTION trending_decay(score DOUBLE PRECISION, since TIMESTAMPTZ)
+RETURNS DOUBLE PRECISION
+LANGUAGE sql STABLE AS $$
+  SELECT score * power(0.5, EXTRACT(EPOCH FROM (NOW() - since)) / 43200.0);
+$$;
+
+-- Add `weight` (may be negative) to a post's trending score.
+-- Negative weights only touch existing rows: on a cascading post delete the
+-- post row is already gone, and inserting would violate the foreign key.
+CREATE OR REPLACE FUNCTION bump_post_trending(target_post_id UUID, weight DOUBLE PRECISION)
+RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF weight > 0 THEN
+    INSERT INTO post_trending AS t (post_id, score, updated_at)
+    VALUES (target_post_id, weight, NOW())
+    ON CONFLICT (post_id) DO UPDATE
+      SET score = trending_decay(t.score, t.updated_at) + weight,
+          updated_at = NOW();
+  ELSE
+    UPDATE post_trending t
+      SET score = GREATEST(trending_decay(t.score, t.updated_at) + weight, 0),
+          updated_at = NOW()
+      WHERE t.post_id = target_post_id;
+  END IF;
+END;
+$$;
+
+-- ==== TRIGGERS ====
+-- TG_ARGV[0] is the engagement weight for the table the trigger is attached to.
+CREATE OR REPLACE FUNCTION post_trending_on_engagement()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM bump_post_trending(NEW.post_id, TG_ARGV[0]::DOUBLE PRECISION);
+    RETURN NEW;
+  END IF;
+  PERFORM bump_post_trending(OLD.post_id, -TG_ARGV[0]::DOUBLE PRECISION);
+  RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS post_likes_trending ON post_likes;
+CREATE TRIGGER post_likes_trending
+  AFTER INSERT OR DELETE ON post_likes
+  FOR EACH ROW EXECUTE FUNCTION post_trending_on_engagement('1');
+
+DROP TRIGGER IF EXISTS comments_trending ON comments;
+CREATE TRIGGER comments_trending
+  AFTER INSERT OR DELETE ON comments
+  FOR EACH ROW EXECUTE FUNCTION post_trending_on_engagement('2');
+
+DROP TRIGGER IF EXISTS reposts_trending ON reposts;
+CREATE TRIGGER reposts_trending
+  AFTER INSERT OR DELETE ON reposts
+  FOR EACH ROW EXECUTE FUNCTION post_trending_on_engagement('3');
+
+-- ==== BACKFILL ====
+-- Seed recent posts from their counters, decayed from their creation time.
+INSERT INTO post_trending (post_id, score, updated_at)
+SELECT
+  p.id,
+  (COALESCE(p.like_count, 0) + 2 * COALESCE(p.comment_count, 0) + 3 * COALESCE(p.repost_count, 0))
+    * power(0.5, EXTRACT(EPOCH FROM (NOW() - p.created_at::TIMESTAMPTZ)) / 43200.0),
+  NOW()
+FROM posts p
+WHERE p.created_at >= NOW() - INTERVAL '7 days'
+  AND (COALESCE(p.like_count, 0) + COALESCE(p.comment_count, 0) + COALESCE(p.repost_count, 0)) > 0
+ON CONFLICT (post_id) DO NOTHING;
+
+-- ==== READ RPC ====
+-- Called by GET /search/trending. Ranks by the score decayed to now.
+CREATE OR REPLACE FUNCTION get_trending_posts(days_ago INTEGER DEFAULT 7, result_limit INTEGER DEFAULT 10)
+RETURNS TABLE (
+  id UUID,
+  author_id UUID,
+  content TEXT,
+  post_type TEXT,
+  visibility TEXT,
+  scheduled_at TIMESTAMP,
+  is_published BOOLEAN,
+  is_draft BOOLEAN,
+  like_count INTEGER,
+  comment_count INTEGER,
+  repost_count INTEGER,
+  share_count INTEGER,
+  created_at TIMESTAMP,
+  edited_at TIMESTAMP,
+  trending_score DOUBLE PRECISION
+)
+LANGUAGE sql STABLE AS $$
+  SELECT
+    p.id, p.author_id, p.content, p.post_type::TEXT, p.visibility::TEXT, p.scheduled_at,
+    p.is_published, p.is_draft, p.like_count, p.comment_count, p.repost_count,
+    p.share_count, p.created_at, p.edited_at,
+    trending_decay(t.score, t.updated_at) AS trending_score
+  FROM post_trending t
+  JOIN posts p ON p.id = t.post_id
+  WHERE t.updated_at >= NOW() - make_interval(days => days_ago)
+    AND p.created_at >= NOW() - make_interval(days => days_ago)
+    AND p.is_published = TRUE
+    AND p.is_draft = FALSE
+    AND p.visibility = 'public'
+  ORDER BY trending_score DESC, p.created_at DESC
+  LIMIT result_limit;
+$$;
+
+-- ==== PRUNING ====
+-- Keeps post_trending small: drops rows that have decayed to noise or gone quiet.
+CREATE OR REPLACE FUNCTION prune_post_trending(min_score DOUBLE PRECISION DEFAULT 0.05)
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+  removed INTEGER;
+BEGIN
+  DELETE FROM post_trending
+  WHERE updated_at < NOW() - INTERVAL '7 days'
+     OR trending_decay(score, updated_at) < min_score;
+  GET DIAGNOSTICS removed = ROW_COUNT;
+  RETURN removed;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION get_trending_posts(INTEGER, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION prune_post_trending(DOUBLE PRECISION) TO service_role;
+
+-- Schedule pruning hourly when pg_cron is available (Supabase: Database → Extensions).
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('prune-post-trending', '17 * * * *', 'SELECT prune_post_trending()');
+  END IF;
+END$$;
+
+-- ==================================================
+-- Verification queries (run manually after applying):
+-- SELECT * FROM get_trending_posts(7, 10);
+-- SELECT count(*) FROM post_trending;
+-- SELECT prune_post_trending();
+-- ==================================================
@@ -0,0 +1,198 @@
+-- Migration 14: Hashtag / mention inverted index and hourly topic counters
+-- Date: 2026-10-19
+-- Purpose: The backend extracts #hashtags and @mentions from public posts on
+--   create/update and syncs them into post_tags. A trigger keeps per-tag hourly
+--   counters in tag_hourly_counts so "top tags in the last N hours" is a sum over
+--   a handful of pre-aggregated buckets instead of a scan of posts.content.
+
+SET search_path TO public;
+
+-- ==== INVERTED INDEX ====
+-- created_at is when the tag was first attached to the post; it decides the
+-- hourly bucket and the order of posts-by-tag pages.
+CREATE TABLE IF NOT EXISTS post_tags (
+    post_id     UUID NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+    kind        TEXT NOT NULL CHECK (kind IN ('hashtag', 'mention')),
+    tag         TEXT NOT NULL,
+    created_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (post_id, kind, tag)
+);
+
+-- posts-by-tag: WHERE kind = ? AND tag = ? ORDER BY created_at DESC, post_id DESC (keyset)
+CREATE INDEX IF NOT EXISTS idx_post_tags_lookup
+  ON post_tags (kind, tag, created_at DESC, post_id DESC);
+
+-- ==== HOURLY COUNTERS ====
+CREATE TABLE IF NOT EXISTS tag_hourly_counts (
+    kind        TEXT NOT NULL,
+    tag         TEXT NOT NULL,
+    bucket      TIMESTAMPTZ NOT NULL,
+    post_count  INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, tag, bucket)
+);
+
+-- top tags: WHERE kind = ? AND bucket >= ? GROUP BY tag
+CREATE INDEX IF NOT EXISTS idx_tag_hourly_counts_bucket
+  ON tag_hourly_counts (kind, bucket DESC);
+
+ALTER TABLE post_tags         ENABLE ROW LEVEL SECURITY;
+ALTER TABLE tag_hourly_counts ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS post_tags_service_all ON post_tags;
+DROP POLICY IF EXISTS post_tags_select ON post_tags;
+DROP POLICY IF EXISTS tag_hourly_counts_service_all ON tag_hourly_counts;
+DROP POLICY IF EXISTS tag_hourly_counts_select ON tag_hourly_counts;
+
+CREATE POLICY post_tags_service_all ON post_tags
+  USING (auth.role() = 'service_role') WITH CHECK (auth.role() = 'service_role');
+CREATE POLICY post_tags_select ON post_tags FOR SELECT USING (TRUE);
+CREATE POLICY tag_hourly_counts_service_all ON tag_hourly_counts
+  USING (auth.role() = 'service_role') WITH CHECK (auth.role() = 'service_role');
+CREATE POLICY tag_hourly_counts_select ON tag_hourly_counts FOR SELECT USING (TRUE);
+
+CREATE OR REPLACE FUNCTION post_tags_count_trigger()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO tag_hourly_counts AS c (kind, tag, bucket, post_count)
+    VALUES (NEW.kind, NEW.tag, date_trunc('hour', NEW.created_at), 1)
+    ON CONFLICT (kind, tag, bucket) DO UPDATE SET post_count = c.post_count + 1;
+    RETURN NEW;
+  END IF;
+  UPDATE tag_hourly_counts
+    SET post_count = GREATEST(post_count - 1, 0)
+    WHERE kind = OLD.kind AND tag = OLD.tag AND bucket = date_trunc('hour', OLD.created_at);
+  RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS post_tags_counts ON post_tags;
+CREATE TRIGGER post_tags_counts
+  AFTER INSERT OR DELETE ON post_tags
+  FOR EACH ROW EXECUTE FUNCTION post_tags_count_trigger();
+
+-- ==== WRITE RPC ====
+-- Make a post's tags exactly (hashtags, mentions) in one round-trip. Unchanged tags
+-- keep their original row (and bucket), so editing a post doesn't re-count them.
+CREATE OR REPLACE FUNCTION sync_post_tags(target_post_id UUID, hashtags TEXT[], mentions TEXT[])
+RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+  DELETE FROM post_tags t
+  WHERE t.post_id = target_post_id
+    AND NOT (
+      (t.kind = 'hashtag' AND t.tag = ANY(COALESCE(hashtags, '{}')))
+      OR (t.kind = 'mention' AND t.tag = ANY(COALESCE(mentions, '{}')))
+    );
+
+  INSERT INTO post_tags (post_id, kind, tag)
+  SELECT target_post_id, 'hashtag', h FROM unnest(COALESCE(hashtags, '{}')) AS h
+  UNION
+  SELECT target_post_id, 'mention', m FROM unnest(COALESCE(mentions, '{}')) AS m
+  ON CONFLICT (post_id, kind, tag) DO NOTHING;
+END;
+$$;
+
+-- ==== READ RPCs ====
+-- One page of public posts carrying a tag, newest first.
+CREATE OR REPLACE FUNCTION get_posts_by_tag(
+  search_tag TEXT,
+  tag_kind TEXT DEFAULT 'hashtag',
+  result_limit INTEGER DEFAULT 20,
+  cursor_created_at TIMESTAMPTZ DEFAULT NULL,
+  cursor_id UUID DEFAULT NULL
+)
+RETURNS TABLE (
+  id UUID,
+  author_id UUID,
+  content TEXT,
+  post_type TEXT,
+  visibility TEXT,
+  scheduled_at TIMESTAMP,
+  is_published BOOLEAN,
+  is_draft BOOLEAN,
+  like_count INTEGER,
+  comment_count INTEGER,
+  repost_count INTEGER,
+  share_count INTEGER,
+  created_at TIMESTAMP,
+  edited_at TIMESTAMP,
+  tagged_at TIMESTAMPTZ
+)
+LANGUAGE sql STABLE AS $$
+  SELECT
+    p.id, p.author_id, p.content, p.post_type::TEXT, p.visibility::TEXT, p.scheduled_at,
+    p.is_published, p.is_draft, p.like_count, p.comment_count, p.repost_count,
+    p.share_count, p.created_at, p.edited_at,
+    t.created_at AS tagged_at
+  FROM post_tags t
+  JOIN posts p ON p.id = t.post_id
+  WHERE t.kind = tag_kind
+    AND t.tag = search_tag
+    AND (cursor_created_at IS NULL OR (t.created_at, t.post_id) < (cursor_created_at, cursor_id))
+    AND p.is_published = TRUE
+    AND p.is_draft = FALSE
+    AND p.visibility = 'public'
+  ORDER BY t.created_at DESC, t.post_id DESC
+  LIMIT result_limit;
+$$;
+
+-- Most used tags over the last `window_hours` hours, from the hourly buckets.
+CREATE OR REPLACE FUNCTION get_top_tags(
+  window_hours INTEGER DEFAULT 24,
+  result_limit INTEGER DEFAULT 10,
+  tag_kind TEXT DEFAULT 'hashtag'
+)
+RETURNS TABLE (tag TEXT, post_count BIGINT)
+LANGUAGE sql STABLE AS $$
+  SELECT c.tag, SUM(c.post_count) AS post_count
+  FROM tag_hourly_counts c
+  WHERE c.kind = tag_kind
+    AND c.bucket >= date_trunc('hour', NOW()) - make_interval(hours => window_hours - 1)
+  GROUP BY c.tag
+  HAVING SUM(c.post_count) > 0
+  ORDER BY post_count DESC, c.tag
+  LIMIT result_limit;
+$$;
+
+GRANT EXECUTE ON FUNCTION sync_post_tags(UUID, TEXT[], TEXT[]) TO service_role;
+GRANT EXECUTE ON FUNCTION get_posts_by_tag(TEXT, TEXT, INTEGER, TIMESTAMPTZ, UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION get_top_tags(INTEGER, INTEGER, TEXT) TO service_role;
+
+-- Old buckets are only useful for the sliding window; drop them after 30 days.
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule(
+      'prune-tag-hourly-counts', '23 3 * * *',
+      $cron$DELETE FROM tag_hourly_counts WHERE bucket < NOW() - INTERVAL '30 days'$cron$
+    );
+  END IF;
+END$$;
+
+-- ==== BACKFILL ====
+-- Index posts that existed before this migration (new ones go through
+-- sync_post_tags). Same patterns as app/lib/tags.py in Postgres regex syntax:
+-- [[:alnum:]_] for \w and [[:alpha:]] for "contains a letter". Tags keep the
+-- post's own created_at (naive UTC), so old posts keep their order and fall into
+-- their original hourly buckets instead of the current one.
+INSERT INTO post_tags (post_id, kind, tag, created_at)
+SELECT p.id, 'hashtag', lower(m[1]), p.created_at AT TIME ZONE 'UTC'
+FROM posts p,
+  regexp_matches(p.content, '(?<![[:alnum:]_#])#([[:alnum:]_]*[[:alpha:]][[:alnum:]_]*)', 'g') AS m
+WHERE p.is_published = TRUE AND p.is_draft = FALSE AND p.visibility = 'public'
+  AND length(m[1]) <= 50
+UNION
+SELECT p.id, 'mention', lower(m[1]), p.created_at AT TIME ZONE 'UTC'
+FROM posts p,
+  regexp_matches(p.content, '(?<![[:alnum:]_@])@([A-Za-z0-9_-]{3,30})(?![[:alnum:]_-])', 'g') AS m
+WHERE p.is_published = TRUE AND p.is_draft = FALSE AND p.visibility = 'public'
+ON CONFLICT (post_id, kind, tag) DO NOTHING;
+
+-- ==================================================
+-- Verification queries (run manually after applying):
+-- SELECT * FROM get_top_tags(24, 10);
+-- SELECT * FROM get_posts_by_tag('fundraising', 'hashtag', 20);
+-- SELECT kind, count(*) FROM post_tags GROUP BY kind;
+-- ==================================================
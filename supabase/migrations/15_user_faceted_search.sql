@@ -0,0 +1,126 @@
+-- Migration 15: Faceted people search
+-- Date: 2026-10-19
+-- Purpose: Let /search/users narrow by industry, company, position and skill on
+--   the server, and return facet counts (top companies / industries among the
+--   matches) from the same query, so clients stop paging through broad ilike
+--   results to filter locally.
+--
+--   Filter semantics:
+--     industry, company  case-insensitive exact match, ignoring surrounding spaces
+--                        (values come from the facets, which group the same way)
+--     position           case-insensitive substring ("engineer" matches "Staff Engineer")
+--     skill              exact match on the normalized user_skills.skill
+
+SET search_path TO public;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- ==== INDEXES ====
+CREATE INDEX IF NOT EXISTS idx_users_industry_lower
+  ON users (lower(trim(industry)))
+  WHERE is_active = TRUE;
+
+CREATE INDEX IF NOT EXISTS idx_users_company_lower
+  ON users (lower(trim(current_company)))
+  WHERE is_active = TRUE;
+
+CREATE INDEX IF NOT EXISTS idx_users_position_trgm
+  ON users USING GIN (current_position gin_trgm_ops)
+  WHERE is_active = TRUE;
+
+-- skill filter: EXISTS (... WHERE skill = ? AND user_id = u.id)
+CREATE INDEX IF NOT EXISTS idx_user_skills_skill_user
+  ON user_skills (skill, user_id);
+
+-- ==== SEARCH RPC ====
+-- Returns one JSON document:
+--   {"results": [...user cards + score...], "total": N,
+--    "facets": {"industry": [{"value", "count"}], "company": [...]}}
+-- search_query is optional: with only filters the matches are ordered by connections.
+-- Results page on (score, id) keyset; facets and total always cover every match.
+CREATE OR REPLACE FUNCTION search_users_faceted(
+  search_query TEXT DEFAULT NULL,
+  industry_filter TEXT DEFAULT NULL,
+  company_filter TEXT DEFAULT NULL,
+  position_filter TEXT DEFAULT NULL,
+  skill_filter TEXT DEFAULT NULL,
+  result_limit INTEGER DEFAULT 20,
+  facet_limit INTEGER DEFAULT 10,
+  cursor_score REAL DEFAULT NULL,
+  cursor_id UUID DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE sql STABLE AS $$
+  WITH q AS (
+    SELECT NULLIF(lower(trim(search_query)), '') AS term
+  ),
+  matches AS (
+    SELECT
+      u.id, u.username, u.first_name, u.last_name, u.avatar_url, u.headline,
+      u.current_position, u.current_company, u.industry,
+      (CASE
+        WHEN q.term IS NULL THEN COALESCE(u.connections_count, 0)::REAL
+        ELSE GREATEST(
+          word_similarity(q.term, COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, '')),
+          word_similarity(q.term, COALESCE(u.username, '')),
+          word_similarity(q.term, COALESCE(u.headline, '')) * 0.6,
+          CASE WHEN u.username ILIKE q.term || '%' THEN 1.0 ELSE 0 END,
+          CASE WHEN u.username ILIKE '%' || q.term || '%'
+                 OR (COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, '')) ILIKE '%' || q.term || '%'
+               THEN 0.5 ELSE 0 END
+        )
+      END)::REAL AS score
+    FROM users u, q
+    WHERE u.is_active = TRUE
+      AND (
+        q.term IS NULL
+        OR q.term <% (COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, ''))
+        OR q.term <% u.username
+        OR q.term <% u.headline
+        OR u.username ILIKE '%' || q.term || '%'
+        OR (COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, '')) ILIKE '%' || q.term || '%'
+        OR u.headline ILIKE '%' || q.term || '%'
+      )
+      AND (industry_filter IS NULL OR lower(trim(u.industry)) = lower(trim(industry_filter)))
+      AND (company_filter IS NULL OR lower(trim(u.current_company)) = lower(trim(company_filter)))
+      AND (position_filter IS NULL OR u.current_position ILIKE '%' || position_filter || '%')
+      AND (skill_filter IS NULL OR EXISTS (
+        SELECT 1 FROM user_skills s
+        WHERE s.skill = lower(trim(skill_filter)) AND s.user_id = u.id
+      ))
+  ),
+  page AS (
+    SELECT * FROM matches m
+    WHERE cursor_score IS NULL OR (m.score, m.id) < (cursor_score, cursor_id)
+    ORDER BY m.score DESC, m.id DESC
+    LIMIT result_limit
+  ),
+  -- Buckets use the filters' normalization ("Google" and "google " are one bucket),
+  -- so a facet's count is what picking it returns; min() picks one display spelling.
+  industry_facet AS (
+    SELECT min(trim(industry)) AS value, count(*) AS count
+    FROM matches WHERE trim(COALESCE(industry, '')) <> ''
+    GROUP BY lower(trim(industry)) ORDER BY count(*) DESC, value LIMIT facet_limit
+  ),
+  company_facet AS (
+    SELECT min(trim(current_company)) AS value, count(*) AS count
+    FROM matches WHERE trim(COALESCE(current_company, '')) <> ''
+    GROUP BY lower(trim(current_company)) ORDER BY count(*) DESC, value LIMIT facet_limit
+  )
+  SELECT jsonb_build_object(
+    'results', COALESCE((SELECT jsonb_agg(to_jsonb(p) ORDER BY p.score DESC, p.id DESC) FROM page p), '[]'::jsonb),
+    'total', (SELECT count(*) FROM matches),
+    'facets', jsonb_build_object(
+      'industry', COALESCE((SELECT jsonb_agg(to_jsonb(f) ORDER BY f.count DESC, f.value) FROM industry_facet f), '[]'::jsonb),
+      'company', COALESCE((SELECT jsonb_agg(to_jsonb(f) ORDER BY f.count DESC, f.value) FROM company_facet f), '[]'::jsonb)
+    )
+  );
+$$;
+
+GRANT EXECUTE ON FUNCTION search_users_faceted(TEXT, TEXT, TEXT, TEXT, TEXT, INTEGER, INTEGER, REAL, UUID) TO service_role;
+
+-- ==================================================
+-- Verification queries (run manually after applying):
+-- SELECT search_users_faceted('engineer', industry_filter => 'Fintech');
+-- SELECT search_users_faceted(NULL, skill_filter => 'python', result_limit => 5);
+-- ==================================================
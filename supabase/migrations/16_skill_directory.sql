@@ -0,0 +1,93 @@
+-- Migration 16: Skill directory
+-- Date: 2026-10-19
+-- Purpose: user_skills can only be read per user. Keep a skill -> user count table
+--   up to date from a trigger (feeds skill autocomplete and "how many people have
+--   X"), and index user_skills so "people with skill X, most endorsed first" is a
+--   single index range scan with keyset pagination.
+
+SET search_path TO public;
+
+-- ==== COUNTS ====
+CREATE TABLE IF NOT EXISTS skills (
+    skill       TEXT PRIMARY KEY,
+    user_count  INTEGER NOT NULL DEFAULT 0,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- autocomplete reload / "top skills": ORDER BY user_count DESC
+CREATE INDEX IF NOT EXISTS idx_skills_user_count
+  ON skills (user_count DESC);
+
+ALTER TABLE skills ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS skills_service_all ON skills;
+DROP POLICY IF EXISTS skills_select ON skills;
+
+CREATE POLICY skills_service_all ON skills
+  USING (auth.role() = 'service_role') WITH CHECK (auth.role() = 'service_role');
+CREATE POLICY skills_select ON skills FOR SELECT USING (TRUE);
+
+-- Adds `delta` to a skill's count; rows that reach zero are removed.
+CREATE OR REPLACE FUNCTION bump_skill_count(target_skill TEXT, delta INTEGER)
+RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF target_skill IS NULL OR target_skill = '' THEN
+    RETURN;
+  END IF;
+  IF delta > 0 THEN
+    INSERT INTO skills AS s (skill, user_count, updated_at)
+    VALUES (target_skill, delta, NOW())
+    ON CONFLICT (skill) DO UPDATE
+      SET user_count = s.user_count + delta, updated_at = NOW();
+  ELSE
+    UPDATE skills SET user_count = user_count + delta, updated_at = NOW()
+      WHERE skill = target_skill;
+    DELETE FROM skills WHERE skill = target_skill AND user_count <= 0;
+  END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION user_skills_count_trigger()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM bump_skill_count(OLD.skill, -1);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM bump_skill_count(NEW.skill, 1);
+    RETURN NEW;
+  END IF;
+  RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS user_skills_counts ON user_skills;
+CREATE TRIGGER user_skills_counts
+  AFTER INSERT OR DELETE OR UPDATE OF skill ON user_skills
+  FOR EACH ROW EXECUTE FUNCTION user_skills_count_trigger();
+
+-- ==== BACKFILL ====
+INSERT INTO skills (skill, user_count)
+SELECT skill, count(*) FROM user_skills
+WHERE COALESCE(skill, '') <> ''
+GROUP BY skill
+ON CONFLICT (skill) DO UPDATE SET user_count = EXCLUDED.user_count, updated_at = NOW();
+
+-- ==== DIRECTORY INDEX ====
+-- Keyset pagination compares endorsement_count, so it must not be NULL.
+UPDATE user_skills SET endorsement_count = 0 WHERE endorsement_count IS NULL;
+
+-- people with a skill: WHERE skill = ? ORDER BY endorsement_count DESC, user_id (keyset)
+CREATE INDEX IF NOT EXISTS idx_user_skills_skill_endorsements
+  ON user_skills (skill, endorsement_count DESC, user_id);
+
+GRANT EXECUTE ON FUNCTION bump_skill_count(TEXT, INTEGER) TO service_role;
+
+-- ==================================================
+-- Verification queries (run manually after applying):
+-- SELECT * FROM skills ORDER BY user_count DESC LIMIT 20;
+-- EXPLAIN ANALYZE SELECT user_id FROM user_skills
+--   WHERE skill = 'python' ORDER BY endorsement_count DESC, user_id LIMIT 20;
+-- ==================================================
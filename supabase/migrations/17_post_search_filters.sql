@@ -0,0 +1,93 @@
+-- Migration 17: Filtered post search with per-type counts
+-- Date: 2026-10-19
+-- Purpose: /search/posts only took `q`, so "hiring posts from the last 7 days
+--   matching X" meant pulling broad result sets and filtering on the client.
+--   search_posts_filtered() applies post_type / author / date range / has-media
+--   filters inside the same FTS query as migration 11 and returns per-type counts
+--   for the matches alongside the page.
+
+SET search_path TO public;
+
+-- ==== INDEX ====
+-- type + recency filters on searchable posts; the planner can BitmapAnd this with
+-- idx_posts_content_fts, or use it alone for narrow type/date windows.
+CREATE INDEX IF NOT EXISTS idx_posts_type_created
+  ON posts (post_type, created_at DESC)
+  WHERE is_published = TRUE AND is_draft = FALSE AND visibility = 'public';
+
+-- ==== SEARCH RPC ====
+-- Returns one JSON document:
+--   {"results": [...posts + rank + snippet...], "type_counts": {"hiring": N, ...}}
+-- Filters are optional (NULL = not applied):
+--   post_type_filter : posts.post_type
+--   author_filter    : posts.author_id
+--   since_ts/until_ts: created_at range, inclusive
+--   has_media        : TRUE = with attachments, FALSE = text only
+-- type_counts apply every filter except post_type_filter, so a client can show the
+-- count for each type next to the one that is selected.
+CREATE OR REPLACE FUNCTION search_posts_filtered(
+  search_query TEXT,
+  result_limit INTEGER DEFAULT 20,
+  cursor_rank REAL DEFAULT NULL,
+  cursor_id UUID DEFAULT NULL,
+  post_type_filter TEXT DEFAULT NULL,
+  author_filter UUID DEFAULT NULL,
+  since_ts TIMESTAMP DEFAULT NULL,
+  until_ts TIMESTAMP DEFAULT NULL,
+  has_media BOOLEAN DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE sql STABLE AS $$
+  WITH query AS (
+    SELECT websearch_to_tsquery('english', search_query) AS tsq
+  ),
+  matches AS (
+    SELECT p.*, ts_rank(to_tsvector('english', COALESCE(p.content, '')), query.tsq) AS rank, query.tsq
+    FROM posts p, query
+    WHERE to_tsvector('english', COALESCE(p.content, '')) @@ query.tsq
+      AND p.is_published = TRUE
+      AND p.is_draft = FALSE
+      AND p.visibility = 'public'
+      AND (author_filter IS NULL OR p.author_id = author_filter)
+      AND (since_ts IS NULL OR p.created_at >= since_ts)
+      AND (until_ts IS NULL OR p.created_at <= until_ts)
+      AND (has_media IS NULL OR has_media = EXISTS (SELECT 1 FROM post_media m WHERE m.post_id = p.id))
+  ),
+  ranked AS (
+    SELECT *
+    FROM matches m
+    WHERE (post_type_filter IS NULL OR m.post_type::TEXT = post_type_filter)
+      AND (cursor_rank IS NULL OR (m.rank, m.id) < (cursor_rank, cursor_id))
+    ORDER BY m.rank DESC, m.id DESC
+    LIMIT result_limit
+  ),
+  page AS (
+    SELECT
+      r.id, r.author_id, r.content, r.post_type::TEXT AS post_type, r.visibility::TEXT AS visibility,
+      r.scheduled_at, r.is_published, r.is_draft, r.like_count, r.comment_count,
+      r.repost_count, r.share_count, r.created_at, r.edited_at, r.rank,
+      ts_headline(
+        'english', COALESCE(r.content, ''), r.tsq,
+        'StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2'
+      ) AS snippet
+    FROM ranked r
+  ),
+  type_counts AS (
+    SELECT post_type::TEXT AS post_type, count(*) AS n
+    FROM matches
+    WHERE post_type IS NOT NULL
+    GROUP BY post_type
+  )
+  SELECT jsonb_build_object(
+    'results', COALESCE((SELECT jsonb_agg(to_jsonb(p) ORDER BY p.rank DESC, p.id DESC) FROM page p), '[]'::jsonb),
+    'type_counts', COALESCE((SELECT jsonb_object_agg(t.post_type, t.n) FROM type_counts t), '{}'::jsonb)
+  );
+$$;
+
+GRANT EXECUTE ON FUNCTION search_posts_filtered(TEXT, INTEGER, REAL, UUID, TEXT, UUID, TIMESTAMP, TIMESTAMP, BOOLEAN) TO service_role;
+
+-- ==================================================
+-- Verification queries (run manually after applying):
+-- EXPLAIN ANALYZE SELECT search_posts_filtered('backend engineer', 20,
+--   post_type_filter => 'hiring', since_ts => (NOW() - INTERVAL '7 days')::TIMESTAMP);
+-- ==================================================
@@ -0,0 +1,145 @@
+-- Migration 18: Bulk profile writes
+-- Date: 2026-10-19
+-- Purpose: Onboarding fills in work experience, education and skills one POST per
+--   item, and every PUT/DELETE does its own ownership SELECT first. This RPC applies
+--   a whole batch of creates / updates / deletes for one user in a single call:
+--   one ownership check across all referenced ids, then every change, inside the
+--   function's transaction (all or nothing).
+--
+--   changes JSONB shape (every key optional):
+--   {
+--     "work_experience": {"create": [{...}], "update": [{"id": ..., ...}], "delete": [id, ...]},
+--     "education":       {"create": [{...}], "update": [{"id": ..., ...}], "delete": [id, ...]},
+--     "skills":          {"create": ["python", ...], "delete": [id, ...]}
+--   }
+--   Update objects only change the keys they contain. The backend validates and
+--   normalizes items with the same models as the single-item endpoints.
+
+SET search_path TO public;
+
+CREATE OR REPLACE FUNCTION apply_profile_changes(target_user_id UUID, changes JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql AS $$
+DECLARE
+  unowned INTEGER;
+  added_skills TEXT[];
+  removed_skills TEXT[];
+BEGIN
+  -- ==== OWNERSHIP (one check for every id referenced by an update or delete) ====
+  WITH requested AS (
+    SELECT 'work_experience' AS tbl, (e->>'id')::UUID AS id
+      FROM jsonb_array_elements(COALESCE(changes #> '{work_experience,update}', '[]')) e
+    UNION SELECT 'work_experience', v::UUID
+      FROM jsonb_array_elements_text(COALESCE(changes #> '{work_experience,delete}', '[]')) v
+    UNION SELECT 'education', (e->>'id')::UUID
+      FROM jsonb_array_elements(COALESCE(changes #> '{education,update}', '[]')) e
+    UNION SELECT 'education', v::UUID
+      FROM jsonb_array_elements_text(COALESCE(changes #> '{education,delete}', '[]')) v
+    UNION SELECT 'skills', v::UUID
+      FROM jsonb_array_elements_text(COALESCE(changes #> '{skills,delete}', '[]')) v
+  )
+  SELECT count(*) INTO unowned
+  FROM requested r
+  WHERE NOT CASE r.tbl
+    WHEN 'work_experience' THEN EXISTS (SELECT 1 FROM work_experience t WHERE t.id = r.id AND t.user_id = target_user_id)
+    WHEN 'education'       THEN EXISTS (SELECT 1 FROM education t WHERE t.id = r.id AND t.user_id = target_user_id)
+    ELSE                        EXISTS (SELECT 1 FROM user_skills t WHERE t.id = r.id AND t.user_id = target_user_id)
+  END;
+
+  IF unowned > 0 THEN
+    RAISE EXCEPTION 'Not authorized' USING ERRCODE = '42501';
+  END IF;
+
+  -- ==== WORK EXPERIENCE ====
+  DELETE FROM work_experience
+  WHERE user_id = target_user_id
+    AND id IN (SELECT v::UUID FROM jsonb_array_elements_text(COALESCE(changes #> '{work_experience,delete}', '[]')) v);
+
+  UPDATE work_experience t SET
+    title       = CASE WHEN e ? 'title'       THEN e->>'title'                  ELSE t.title END,
+    company     = CASE WHEN e ? 'company'     THEN e->>'company'                ELSE t.company END,
+    location    = CASE WHEN e ? 'location'    THEN e->>'location'               ELSE t.location END,
+    start_date  = CASE WHEN e ? 'start_date'  THEN (e->>'start_date')::DATE     ELSE t.start_date END,
+    end_date    = CASE WHEN e ? 'end_date'    THEN (e->>'end_date')::DATE       ELSE t.end_date END,
+    is_current  = CASE WHEN e ? 'is_current'  THEN (e->>'is_current')::BOOLEAN  ELSE t.is_current END,
+    is_remote   = CASE WHEN e ? 'is_remote'   THEN (e->>'is_remote')::BOOLEAN   ELSE t.is_remote END,
+    description = CASE WHEN e ? 'description' THEN e->>'description'            ELSE t.description END,
+    updated_at  = NOW()
+  FROM jsonb_array_elements(COALESCE(changes #> '{work_experience,update}', '[]')) e
+  WHERE t.id = (e->>'id')::UUID AND t.user_id = target_user_id;
+
+  INSERT INTO work_experience (user_id, title, company, location, start_date, end_date, is_current, is_remote, description)
+  SELECT
+    target_user_id, e->>'title', e->>'company', e->>'location',
+    (e->>'start_date')::DATE, (e->>'end_date')::DATE,
+    COALESCE((e->>'is_current')::BOOLEAN, FALSE), COALESCE((e->>'is_remote')::BOOLEAN, FALSE),
+    e->>'description'
+  FROM jsonb_array_elements(COALESCE(changes #> '{work_experience,create}', '[]')) e;
+
+  -- ==== EDUCATION ====
+  DELETE FROM education
+  WHERE user_id = target_user_id
+    AND id IN (SELECT v::UUID FROM jsonb_array_elements_text(COALESCE(changes #> '{education,delete}', '[]')) v);
+
+  UPDATE education t SET
+    institution    = CASE WHEN e ? 'institution'    THEN e->>'institution'            ELSE t.institution END,
+    degree         = CASE WHEN e ? 'degree'         THEN e->>'degree'                 ELSE t.degree END,
+    field_of_study = CASE WHEN e ? 'field_of_study' THEN e->>'field_of_study'         ELSE t.field_of_study END,
+    start_date     = CASE WHEN e ? 'start_date'     THEN (e->>'start_date')::DATE     ELSE t.start_date END,
+    end_date       = CASE WHEN e ? 'end_date'       THEN (e->>'end_date')::DATE       ELSE t.end_date END,
+    is_current     = CASE WHEN e ? 'is_current'     THEN (e->>'is_current')::BOOLEAN  ELSE t.is_current END,
+    grade          = CASE WHEN e ? 'grade'          THEN e->>'grade'                  ELSE t.grade END,
+    description    = CASE WHEN e ? 'description'    THEN e->>'description'            ELSE t.description END,
+    updated_at     = NOW()
+  FROM jsonb_array_elements(COALESCE(changes #> '{education,update}', '[]')) e
+  WHERE t.id = (e->>'id')::UUID AND t.user_id = target_user_id;
+
+  INSERT INTO education (user_id, institution, degree, field_of_study, start_date, end_date, is_current, grade, description)
+  SELECT
+    target_user_id, e->>'institution', e->>'degree', e->>'field_of_study',
+    (e->>'start_date')::DATE, (e->>'end_date')::DATE,
+    COALESCE((e->>'is_current')::BOOLEAN, FALSE), e->>'grade', e->>'description'
+  FROM jsonb_array_elements(COALESCE(changes #> '{education,create}', '[]')) e;
+
+  -- ==== SKILLS ====
+  -- Skills the user already has are skipped rather than failing the batch.
+  WITH removed AS (
+    DELETE FROM user_skills
+    WHERE user_id = target_user_id
+      AND id IN (SELECT v::UUID FROM jsonb_array_elements_text(COALESCE(changes #> '{skills,delete}', '[]')) v)
+    RETURNING skill
+  )
+  SELECT COALESCE(array_agg(skill), '{}') INTO removed_skills FROM removed;
+
+  WITH added AS (
+    INSERT INTO user_skills (user_id, skill, endorsement_count)
+    SELECT DISTINCT target_user_id, v, 0
+    FROM jsonb_array_elements_text(COALESCE(changes #> '{skills,create}', '[]')) v
+    WHERE v <> ''
+      AND NOT EXISTS (SELECT 1 FROM user_skills s WHERE s.user_id = target_user_id AND s.skill = v)
+    RETURNING skill
+  )
+  SELECT COALESCE(array_agg(skill), '{}') INTO added_skills FROM added;
+
+  -- ==== RESULT: the collections as they now stand ====
+  RETURN jsonb_build_object(
+    'work_experience', COALESCE((
+      SELECT jsonb_agg(to_jsonb(w) ORDER BY w.start_date DESC NULLS FIRST)
+      FROM work_experience w WHERE w.user_id = target_user_id), '[]'::jsonb),
+    'education', COALESCE((
+      SELECT jsonb_agg(to_jsonb(ed) ORDER BY ed.start_date DESC NULLS FIRST)
+      FROM education ed WHERE ed.user_id = target_user_id), '[]'::jsonb),
+    'skills', COALESCE((
+      SELECT jsonb_agg(to_jsonb(s)) FROM user_skills s WHERE s.user_id = target_user_id), '[]'::jsonb),
+    'added_skills', to_jsonb(added_skills),
+    'removed_skills', to_jsonb(removed_skills)
+  );
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION apply_profile_changes(UUID, JSONB) TO service_role;
+
+-- ==================================================
+-- Verification queries (run manually after applying):
+-- SELECT apply_profile_changes('<user uuid>', '{"skills": {"create": ["python", "sql"]}}');
+-- ==================================================
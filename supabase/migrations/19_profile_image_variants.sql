@@ -0,0 +1,19 @@
+-- Migration 19: Resized WebP variants for avatars and covers
+-- Date: 2026-10-19
+-- Purpose: Uploads were stored and served as the original bytes, so feeds pulled
+--   multi-megabyte images to draw 40px avatars. The upload endpoints now also write
+--   WebP variants next to the original and record their public URLs here:
+--     avatar_variants: {"64": url, "128": url, "256": url}
+--     cover_variants:  {"640": url, "1280": url}
+--   NULL means the image predates this migration; clients fall back to avatar_url /
+--   cover_url.
+
+SET search_path TO public;
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS avatar_variants JSONB;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS cover_variants JSONB;
+
+-- ==================================================
+-- Verification queries (run manually after applying):
+-- SELECT id, avatar_url, avatar_variants FROM users WHERE avatar_variants IS NOT NULL LIMIT 5;
+-- ==================================================
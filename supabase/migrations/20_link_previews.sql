@@ -0,0 +1,17 @@
+-- Migration 20: Server-side link previews
+-- Date: 2026-10-19
+-- Purpose: Link media (media_type = 'link') was stored as a bare URL and every
+--   client fetched the page itself to render a preview. The backend now unfurls
+--   OpenGraph metadata once, after the post is saved, and stores it on the
+--   post_media row: the og:image goes in thumbnail_url (unless the client sent
+--   one), plus the title and description below.
+
+SET search_path TO public;
+
+ALTER TABLE post_media ADD COLUMN IF NOT EXISTS title TEXT;
+ALTER TABLE post_media ADD COLUMN IF NOT EXISTS description TEXT;
+
+-- ==================================================
+-- Verification queries (run manually after applying):
+-- SELECT url, title, description, thumbnail_url FROM post_media WHERE media_type = 'link' LIMIT 5;
+-- ==================================================
@@ -0,0 +1,50 @@
+-- Migration 21: Publish scheduled posts
+-- Date: 2026-10-19
+-- Purpose: create_post stores scheduled_at with is_published = FALSE, but nothing
+--   ever flipped those posts live. publish_due_posts() claims a batch of due posts
+--   and publishes them in one UPDATE. FOR UPDATE SKIP LOCKED lets several workers
+--   call it at once without double-publishing or waiting on each other.
+
+SET search_path TO public;
+
+-- ==== INDEX ====
+-- Only unpublished scheduled posts, so the due scan stays tiny however many
+-- published posts there are.
+CREATE INDEX IF NOT EXISTS idx_posts_scheduled_due
+  ON posts (scheduled_at)
+  WHERE is_published = FALSE AND is_draft = FALSE AND scheduled_at IS NOT NULL;
+
+-- ==== PUBLISHER RPC ====
+-- scheduled_at is a UTC TIMESTAMP. created_at is moved to the scheduled time so
+-- the post lands in feeds (ordered by created_at) when it goes live, not when it
+-- was written. Returns the published rows so the backend can index them.
+CREATE OR REPLACE FUNCTION publish_due_posts(batch_size INTEGER DEFAULT 100)
+RETURNS SETOF posts
+LANGUAGE sql AS $$
+  WITH due AS (
+    SELECT id
+    FROM posts
+    WHERE is_published = FALSE
+      AND is_draft = FALSE
+      AND scheduled_at IS NOT NULL
+      AND scheduled_at <= (NOW() AT TIME ZONE 'UTC')
+    ORDER BY scheduled_at
+    LIMIT batch_size
+    FOR UPDATE SKIP LOCKED
+  )
+  UPDATE posts p
+  SET is_published = TRUE,
+      created_at = p.scheduled_at
+  FROM due
+  WHERE p.id = due.id
+  RETURNING p.*;
+$$;
+
+GRANT EXECUTE ON FUNCTION publish_due_posts(INTEGER) TO service_role;
+
+-- ==================================================
+-- Verification queries (run manually after applying):
+-- EXPLAIN SELECT id FROM posts WHERE is_published = FALSE AND is_draft = FALSE
+--   AND scheduled_at IS NOT NULL AND scheduled_at <= (NOW() AT TIME ZONE 'UTC') LIMIT 100;
+-- SELECT id, scheduled_at FROM publish_due_posts(100);
+-- ==================================================
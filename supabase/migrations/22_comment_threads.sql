@@ -0,0 +1,87 @@
+-- Migration 22: Threaded comments
+-- Date: 2026-10-19
+-- Purpose: get_comments only returned top-level comments; replies could not be
+--   listed and had no count. get_comment_tree() returns a page of top-level
+--   comments, each with its first K replies and its reply_count, in one call
+--   (window functions over the page's replies). Further replies page through
+--   GET /posts/comments/{id}/replies on the index below.
+
+SET search_path TO public;
+
+-- ==== INDEX ====
+-- replies of a comment in thread order: WHERE parent_comment_id = ? ORDER BY created_at, id
+CREATE INDEX IF NOT EXISTS idx_comments_parent_created
+  ON comments (parent_comment_id, created_at, id)
+  WHERE parent_comment_id IS NOT NULL;
+
+-- ==== COMMENT TREE RPC ====
+-- Top-level comments newest first, keyset on (created_at, id) DESC. Replies oldest
+-- first, like a conversation. Every comment carries `author` and `is_liked` for
+-- viewer_id (FALSE when NULL); top-level comments add `reply_count` and `replies`.
+CREATE OR REPLACE FUNCTION get_comment_tree(
+  target_post_id UUID,
+  viewer_id UUID DEFAULT NULL,
+  result_limit INTEGER DEFAULT 20,
+  reply_limit INTEGER DEFAULT 3,
+  cursor_created_at TIMESTAMP DEFAULT NULL,
+  cursor_id UUID DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE sql STABLE AS $$
+  WITH top AS (
+    SELECT c.id, c.created_at
+    FROM comments c
+    WHERE c.post_id = target_post_id
+      AND c.parent_comment_id IS NULL
+      AND (cursor_created_at IS NULL OR (c.created_at, c.id) < (cursor_created_at, cursor_id))
+    ORDER BY c.created_at DESC, c.id DESC
+    LIMIT result_limit
+  ),
+  replies AS (
+    SELECT
+      r.id,
+      r.parent_comment_id,
+      ROW_NUMBER() OVER (PARTITION BY r.parent_comment_id ORDER BY r.created_at, r.id) AS position,
+      COUNT(*) OVER (PARTITION BY r.parent_comment_id) AS reply_count
+    FROM comments r
+    WHERE r.parent_comment_id IN (SELECT id FROM top)
+  ),
+  shown AS (
+    SELECT * FROM replies WHERE position <= reply_limit
+  ),
+  nodes AS (
+    SELECT
+      c.id,
+      to_jsonb(c) || jsonb_build_object(
+        'author', jsonb_build_object(
+          'id', u.id, 'username', u.username, 'first_name', u.first_name,
+          'last_name', u.last_name, 'avatar_url', u.avatar_url),
+        'is_liked', viewer_id IS NOT NULL AND EXISTS (
+          SELECT 1 FROM comment_likes l WHERE l.comment_id = c.id AND l.user_id = viewer_id)
+      ) AS doc
+    FROM comments c
+    LEFT JOIN users u ON u.id = c.author_id
+    WHERE c.id IN (SELECT id FROM top UNION ALL SELECT id FROM shown)
+  )
+  SELECT COALESCE(jsonb_agg(
+    n.doc || jsonb_build_object(
+      'reply_count', COALESCE((SELECT MAX(r.reply_count) FROM replies r WHERE r.parent_comment_id = t.id), 0),
+      'replies', COALESCE((
+        SELECT jsonb_agg(rn.doc ORDER BY s.position)
+        FROM shown s JOIN nodes rn ON rn.id = s.id
+        WHERE s.parent_comment_id = t.id), '[]'::jsonb)
+    )
+    ORDER BY t.created_at DESC, t.id DESC
+  ), '[]'::jsonb)
+  FROM top t
+  JOIN nodes n ON n.id = t.id;
+$$;
+
+GRANT EXECUTE ON FUNCTION get_comment_tree(UUID, UUID, INTEGER, INTEGER, TIMESTAMP, UUID) TO service_role;
+
+-- ==================================================
+-- Verification queries (run manually after applying):
+-- SELECT get_comment_tree('<post uuid>', NULL, 20, 3);
+-- EXPLAIN ANALYZE SELECT * FROM comments WHERE parent_comment_id = '<comment uuid>'
+--   ORDER BY created_at, id LIMIT 20;
+-- ==================================================
@@ -0,0 +1,51 @@
+-- Migration 23: Comment like counters
+-- Date: 2026-10-19
+-- Purpose: comments.like_count existed but nothing maintained it. Statement-level
+--   triggers on comment_likes now keep it in sync, one UPDATE per affected comment
+--   per statement (transition tables), so a bulk delete (e.g. a user removed, cascading
+--   their likes) doesn't fire one UPDATE per row. The API reads like_count straight
+--   off the comment row and folds the viewer's like into the same query.
+
+SET search_path TO public;
+
+-- ==== TRIGGERS ====
+CREATE OR REPLACE FUNCTION comment_like_counts_on_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    UPDATE comments c SET like_count = COALESCE(c.like_count, 0) + d.n
+    FROM (SELECT comment_id, count(*) AS n FROM added GROUP BY comment_id) d
+    WHERE c.id = d.comment_id;
+  ELSE
+    UPDATE comments c SET like_count = GREATEST(COALESCE(c.like_count, 0) - d.n, 0)
+    FROM (SELECT comment_id, count(*) AS n FROM removed GROUP BY comment_id) d
+    WHERE c.id = d.comment_id;
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+-- Transition tables allow only one event per trigger, hence two triggers.
+DROP TRIGGER IF EXISTS comment_likes_count_insert ON comment_likes;
+CREATE TRIGGER comment_likes_count_insert
+  AFTER INSERT ON comment_likes
+  REFERENCING NEW TABLE AS added
+  FOR EACH STATEMENT EXECUTE FUNCTION comment_like_counts_on_change();
+
+DROP TRIGGER IF EXISTS comment_likes_count_delete ON comment_likes;
+CREATE TRIGGER comment_likes_count_delete
+  AFTER DELETE ON comment_likes
+  REFERENCING OLD TABLE AS removed
+  FOR EACH STATEMENT EXECUTE FUNCTION comment_like_counts_on_change();
+
+-- ==== BACKFILL ====
+UPDATE comments c
+SET like_count = (SELECT count(*) FROM comment_likes l WHERE l.comment_id = c.id)
+WHERE c.like_count IS DISTINCT FROM (SELECT count(*) FROM comment_likes l WHERE l.comment_id = c.id);
+
+-- ==================================================
+-- Verification queries (run manually after applying):
+-- SELECT c.id, c.like_count, (SELECT count(*) FROM comment_likes l WHERE l.comment_id = c.id) AS actual
+-- FROM comments c ORDER BY c.like_count DESC LIMIT 10;
+-- ==================================================
@@ -0,0 +1,108 @@
+-- Migration 24: Single-call comment and message writes
+-- Date: 2026-10-19
+-- Purpose: Posting a comment took 4-5 sequential round-trips: ensure_user_exists
+--   (1-2), the insert, increment_post_comments and an author lookup. Sending a
+--   message took a participant check, the insert and a sender lookup. These RPCs
+--   do each write in one call and return the row with its author/sender card,
+--   in the shape the endpoints already returned.
+
+SET search_path TO public;
+
+-- ==== COMMENTS ====
+-- Creates the users row from auth.users first if it is missing (same defaults as
+-- ensure_user_exists in the backend) and reports it via "user_created" so the
+-- backend can index the new user. SECURITY DEFINER for the auth.users read.
+CREATE OR REPLACE FUNCTION create_comment(
+  target_post_id UUID,
+  author UUID,
+  body TEXT,
+  parent_id UUID DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql SECURITY DEFINER
+SET search_path = public AS $$
+DECLARE
+  created_user BOOLEAN := FALSE;
+  new_comment comments;
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM users WHERE id = author) THEN
+    INSERT INTO users (id, email, username, first_name, last_name, is_verified)
+    SELECT
+      a.id,
+      COALESCE(a.email, left(a.id::TEXT, 8) || '@placeholder.local'),
+      'user_' || left(a.id::TEXT, 8),
+      COALESCE(a.raw_user_meta_data->>'first_name', 'User'),
+      COALESCE(a.raw_user_meta_data->>'last_name', 'user_' || left(a.id::TEXT, 8)),
+      FALSE
+    FROM auth.users a
+    WHERE a.id = author
+    ON CONFLICT (id) DO NOTHING;
+    created_user := FOUND;
+  END IF;
+
+  IF parent_id IS NOT NULL AND NOT EXISTS (
+    SELECT 1 FROM comments WHERE id = parent_id AND post_id = target_post_id
+  ) THEN
+    RAISE EXCEPTION 'Parent comment not found on this post';
+  END IF;
+
+  INSERT INTO comments (post_id, author_id, content, parent_comment_id)
+  VALUES (target_post_id, author, body, parent_id)
+  RETURNING * INTO new_comment;
+
+  UPDATE posts SET comment_count = comment_count + 1 WHERE id = target_post_id;
+
+  RETURN to_jsonb(new_comment) || jsonb_build_object(
+    'author', (
+      SELECT jsonb_build_object(
+        'id', u.id, 'username', u.username, 'first_name', u.first_name,
+        'last_name', u.last_name, 'avatar_url', u.avatar_url)
+      FROM users u WHERE u.id = author),
+    'user_created', created_user
+  );
+END;
+$$;
+
+-- ==== MESSAGES ====
+CREATE OR REPLACE FUNCTION send_message(
+  target_conversation_id UUID,
+  sender UUID,
+  body TEXT
+)
+RETURNS JSONB
+LANGUAGE plpgsql AS $$
+DECLARE
+  new_message messages;
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM conversation_participants
+    WHERE conversation_id = target_conversation_id AND user_id = sender
+  ) THEN
+    RAISE EXCEPTION 'Not a participant in this conversation' USING ERRCODE = '42501';
+  END IF;
+
+  INSERT INTO messages (conversation_id, sender_id, content, is_read)
+  VALUES (target_conversation_id, sender, body, FALSE)
+  RETURNING * INTO new_message;
+
+  RETURN to_jsonb(new_message) || jsonb_build_object(
+    'sender', (
+      SELECT jsonb_build_object(
+        'id', u.id, 'username', u.username, 'first_name', u.first_name,
+        'last_name', u.last_name, 'avatar_url', u.avatar_url)
+      FROM users u WHERE u.id = sender)
+  );
+END;
+$$;
+
+-- Both take the acting user as a parameter, so only the backend may call them.
+REVOKE EXECUTE ON FUNCTION create_comment(UUID, UUID, TEXT, UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION send_message(UUID, UUID, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION create_comment(UUID, UUID, TEXT, UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION send_message(UUID, UUID, TEXT) TO service_role;
+
+-- ==================================================
+-- Verification queries (run manually after applying):
+-- SELECT create_comment('<post uuid>', '<user uuid>', 'hello');
+-- SELECT send_message('<conversation uuid>', '<user uuid>', 'hi');
+-- ==================================================